@@ -4,59 +4,62 @@ End-to-end simulator for MICADO on the E-ELT
 """
 # turn off warnings - interesting for development, but not for runtime
 import warnings
-import logging
+import importlib
 
-from os.path import join
-
-from astropy.utils.exceptions import AstropyWarning
-
-# Import all the modules to go under simcado
-from . import utils
-
-from . import spectral
-from . import spatial
-from . import psf
-
-from . import detector
-from . import optics
-from . import commands
-from . import source
-
-#from . import optics_utils
-#from . import defaults
-from . import simulation
+from os.path import join, dirname
 
 try:
     from .version import version as __version__
 except ImportError:
     __version__ = "Version number is not available"
 
+# The modules to go under simcado are only imported when they are first used,
+# e.g. by ``simcado.source`` or ``from simcado import UserCommands``, so that
+# ``import simcado`` doesn't pay for astropy, scipy, etc.
+_SUBMODULES = ["utils", "spectral", "spatial", "psf", "detector", "optics",
+               "commands", "source", "simulation", "nghxrg"]
+
 # import specific Classes from the modules to be accessible in the global
 # namespace
-from .utils     import __pkg_dir__
-from .utils     import bug_report
-from .detector  import Detector, Chip
-from .source    import Source
-from .optics    import OpticalTrain
-from .commands  import UserCommands
+_NAMES = {"bug_report"          : "utils",
+          "get_extras"          : "utils",
+          "Detector"            : "detector",
+          "Chip"                : "detector",
+          "install_noise_cube"  : "detector",
+          "Source"              : "source",
+          "OpticalTrain"        : "optics",
+          "UserCommands"        : "commands",
+          "run"                 : "simulation",
+          "run_filters"         : "simulation"}
 
 # don't import these ones just yet
 #from .SpectralGrating  import *
-from .simulation import run
-from .utils import get_extras
-from .detector import install_noise_cube
 
+__all__ = _SUBMODULES + list(_NAMES)
+
+__pkg_dir__ = dirname(__file__)
 __data_dir__ = join(__pkg_dir__, "data")
 
 # Search path for finding files
 __search_path__ = ['./', __pkg_dir__, __data_dir__]
 
 
-logging.basicConfig(filename='simcado.log', filemode='w', level=logging.DEBUG,
-                    format='%(asctime)s %(message)s', datefmt='%m/%d/%Y %I:%M:%S %p')
-logging.info("SimCADO imported")
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module("." + name, __name__)
+
+    if name in _NAMES:
+        module = importlib.import_module("." + _NAMES[name], __name__)
+        globals()[name] = getattr(module, name)
+        return globals()[name]
+
+    raise AttributeError("module 'simcado' has no attribute '" + name + "'")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
 
 #warnings.simplefilter('ignore', UserWarning)   # user should see UserWarnings
 warnings.simplefilter('ignore', FutureWarning)
 warnings.simplefilter('ignore', RuntimeWarning)  # warnings for the developer
-warnings.simplefilter('ignore', category=AstropyWarning)
@@ -59,10 +59,11 @@
 
 import os
 import shutil
+from copy import deepcopy
 import warnings
 import logging
 
-from collections import OrderedDict
+from collections import OrderedDict, ChainMap
 
 import numpy as np
 import astropy.io.ascii as ioascii    # ascii redefines builtin ascii().
@@ -70,7 +71,8 @@ import astropy.io.ascii as ioascii    # ascii redefines builtin ascii().
 
 import simcado as sim
 from . import spectral as sc
-from .utils import __pkg_dir__, atmospheric_refraction, find_file
+from .utils import __pkg_dir__, atmospheric_refraction, find_file, \
+    read_table
 from .psf import PSFCube
 
 #__all__ = []
@@ -180,6 +182,13 @@ class UserCommands(object):
 
     Notes
     -----
+    Changed keywords are processed (file names found, derived attributes such
+    as ``lam_bin_edges`` recomputed) only once, when a keyword or attribute is
+    next read. A series of changes therefore costs one update.
+
+    ``cmds`` has two layers: the keywords as read from the config files, and
+    the changes made since. Copies made with ``deepcopy`` share the first
+    layer and the derived attributes, and only copy the changes.
 
     References
     ----------
@@ -235,7 +244,9 @@ class UserCommands(object):
         default = os.path.join(self.pkg_dir, "data", "default.config")
 
         # read in the default keywords
-        self.cmds = read_config(default)
+        self._stale = False
+        self._memo = {}
+        self._cmds = ChainMap(read_config(default))
 
         # read in the users wishes
         if filename is not None:
@@ -282,6 +293,10 @@ class UserCommands(object):
         # update the UserCommand "special" attributes
         self._update_attributes()
 
+        # freeze the processed keywords as the base layer. Changes are kept
+        # in the top layer, so that copies only need to copy the changes
+        self._cmds = ChainMap(OrderedDict(), self._cmds.maps[0])
+
         if self.verbose and filename is not None:
             print("Read in parameters from " + filename)
             logging.debug("Read in parameters from " + filename)
@@ -341,27 +356,25 @@ class UserCommands(object):
 
         if isinstance(new_dict, UserCommands):
             tmpcmds = new_dict.cmds
-        elif isinstance(new_dict, dict):
+        elif isinstance(new_dict, (dict, ChainMap)):
             tmpcmds = new_dict
         else:
             raise ValueError("Cannot update with type: "+type(new_dict))
 
         for thekey in tmpcmds:
-            if not thekey in self.cmds:
+            if not thekey in self._cmds:
                 raise KeyError("Unknown parameter " + thekey)
             else:
-                self.cmds[thekey] = tmpcmds[thekey]
+                self._cmds[thekey] = tmpcmds[thekey]
 
-        self._find_files()
-        self._default_data()
-        self._update_attributes()
+        self._invalidate()
 
 
     def keys(self):
         """
         Return the keys in the `UserCommands.cmds` dictionary
         """
-        return self.cmds.keys()
+        return self._cmds.keys()
 
 
     def values(self):
@@ -412,8 +425,10 @@ class UserCommands(object):
             "./", SIM_DATA_DIR, <pkg_dir>, <pkg_dir>/data
         """
 
-        for key in self.cmds:
-            if key == "OBS_OUTPUT_DIR":       # need not exist
+        # the base layer has been searched already
+        for key in list(self._cmds.maps[0]):
+            if key in ("OBS_OUTPUT_DIR",      # need not exist
+                       "SIM_OPT_TRAIN_CACHE_DIR"):
                 continue
 
             keyval = self.cmds[key]
@@ -498,18 +513,16 @@ class UserCommands(object):
         """
 
         if self.cmds["SCOPE_MIRROR_LIST"] is not None:
-            self.mirrors_telescope = ioascii.read(self.cmds["SCOPE_MIRROR_LIST"])
+            self.mirrors_telescope = self._memoised(
+                ("mirrors", self.cmds["SCOPE_MIRROR_LIST"]),
+                self._read_mirror_list, self.cmds["SCOPE_MIRROR_LIST"])
         else:
             raise ValueError("SCOPE_MIRROR_LIST = " + \
                                                 self.cmds["SCOPE_MIRROR_LIST"])
 
-        if self.cmds["INST_MIRROR_AO_LIST"] is not None:
-            self.mirrors_ao = ioascii.read(self.cmds["INST_MIRROR_AO_LIST"])
-        else:
-            self.mirrors_ao = ioascii.read("""
-            #Mirror     Outer   Inner   Temp
-            M0          0.     0.      -273
-            """)
+        self.mirrors_ao = self._memoised(
+            ("mirrors", self.cmds["INST_MIRROR_AO_LIST"]),
+            self._read_mirror_list, self.cmds["INST_MIRROR_AO_LIST"])
 
         i = np.where(self.mirrors_telescope["Mirror"] == "M1")[0][0]
         self.diameter = self.mirrors_telescope["Outer"][i]
@@ -544,14 +557,15 @@ class UserCommands(object):
         # wavelength boundaries where the filter is < SIM_FILTER_THRESHOLD
 
         if self.cmds["SIM_USE_FILTER_LAM"].lower() == "yes":
-            if isinstance(self.cmds["INST_FILTER_TC"], str):
-                tc_filt = sc.TransmissionCurve(filename=self.cmds['INST_FILTER_TC'])
+            tc_filt = self.cmds["INST_FILTER_TC"]
+            threshold = self.cmds["SIM_FILTER_THRESHOLD"]
+            if isinstance(tc_filt, str):
+                lam_min, lam_max = self._memoised(
+                    ("filter_range", tc_filt, threshold),
+                    lambda: _filter_range(
+                        sc.TransmissionCurve(filename=tc_filt), threshold))
             else:
-                tc_filt = self.cmds["INST_FILTER_TC"]
-            mask = np.where(tc_filt.val > self.cmds["SIM_FILTER_THRESHOLD"])[0]
-            imin = np.max((mask[0] - 1, 0))
-            imax = np.min((mask[-1] + 1, len(tc_filt.lam) - 1))
-            lam_min, lam_max = tc_filt.lam[imin], tc_filt.lam[imax]
+                lam_min, lam_max = _filter_range(tc_filt, threshold)
         else:
             lam_min = self.cmds["SIM_LAM_MIN"]
             lam_max = self.cmds["SIM_LAM_MAX"]
@@ -564,7 +578,16 @@ class UserCommands(object):
         #                               lam_max + self.lam_psf_res + 1E-7,
         #                               self.lam_psf_res)
         # make lam_bin_edges according to how great the ADC offsets are
-        self.lam_bin_edges = self._get_lam_bin_edges(lam_min, lam_max)
+        edges_key = ("lam_bin_edges", lam_min, lam_max, self.pix_res,
+                     self.diameter) + tuple(self.cmds[key] for key in
+                                            ("INST_ADC_PERFORMANCE",
+                                             "SIM_ADC_SHIFT_THRESHOLD",
+                                             "ATMO_AIRMASS", "ATMO_TEMPERATURE",
+                                             "ATMO_REL_HUMIDITY",
+                                             "ATMO_PRESSURE", "SCOPE_LATITUDE",
+                                             "SCOPE_ALTITUDE"))
+        self.lam_bin_edges = self._memoised(edges_key, self._get_lam_bin_edges,
+                                            lam_min, lam_max)
         self.lam_bin_centers = 0.5 * (self.lam_bin_edges[1:] + \
                                       self.lam_bin_edges[:-1])
 
@@ -580,24 +603,70 @@ class UserCommands(object):
         self._split_categories()
 
 
-    def _get_total_wfe(self):
+    def _read_mirror_list(self, filename):
         """
-        Gets the total wave front error from the table in INST_WFE_LIST
+        Read a mirror list. Without a file, the list has one mirror with no
+        area
         """
+        if filename is None:
+            return ioascii.read("""
+            #Mirror     Outer   Inner   Temp
+            M0          0.     0.      -273
+            """)
 
-        if self.cmds["INST_WFE"] is not None:
-            if isinstance(self.cmds["INST_WFE"], str):
-                wfe_list = ioascii.read(self.cmds["INST_WFE"])
-                wfe = wfe_list[wfe_list.colnames[0]]
-                num = wfe_list[wfe_list.colnames[1]]
-            elif isinstance(self.cmds["INST_WFE"], (float, int)):
-                wfe, num = float(self.cmds["INST_WFE"]), 1
+        return read_table(filename)
+
+
+    def _memoised(self, key, func, *args):
+        """
+        Return ``func(*args)``, computed only once for each ``key``
+
+        The results are shared with all copies of this object and must not be
+        changed in place. Unhashable keys are not memoised
+        """
+        try:
+            if key in self._memo:
+                return self._memo[key]
+        except TypeError:
+            return func(*args)
+
+        self._memo[key] = func(*args)
+        return self._memo[key]
+
+
+    def _invalidate(self):
+        """
+        Mark the derived attributes as out of date after keywords changed
+
+        The attributes are recomputed on first access, so that a series of
+        changes only pays for one update
+        """
+        self._stale = True
+        for name in _DERIVED_ATTRIBUTES:
+            self.__dict__.pop(name, None)
 
-            tot_wfe = np.sqrt(np.sum(num * wfe**2))
-        else:
-            tot_wfe = 0
 
-        self.cmds["INST_TOTAL_WFE"] = tot_wfe
+    def _refresh(self):
+        """
+        Process the changed keywords and recompute the derived attributes
+        """
+        self._stale = False
+        try:
+            self._find_files()
+            self._default_data()
+            self._update_attributes()
+        except Exception:
+            self._stale = True
+            raise
+
+
+    def _get_total_wfe(self):
+        """
+        Gets the total wave front error from the table in INST_WFE_LIST
+        """
+
+        self.cmds["INST_TOTAL_WFE"] = self._memoised(
+            ("wfe", self.cmds["INST_WFE"]), _total_wfe, self.cmds["INST_WFE"])
 
 
     def _get_lam_bin_edges(self, lam_min, lam_max):
@@ -714,19 +783,95 @@ class UserCommands(object):
         return self.cmds[key]
 
     def __setitem__(self, key, val):
-        if key not in self.cmds.keys():
+        if key not in self._cmds.keys():
             raise ValueError(key+" not in UserCommands.keys()")
 
-        self.cmds[key] = val
-        self._find_files()
-        self._default_data()
-        self._update_attributes()
+        self._cmds[key] = val
+        self._invalidate()
+
+    def __getattr__(self, name):
+        # only called for missing attributes, i.e. derived attributes that
+        # were invalidated by a change of keywords
+        if name in _DERIVED_ATTRIBUTES and self.__dict__.get("_stale"):
+            self._refresh()
+            return self.__dict__[name]
+        raise AttributeError("'UserCommands' object has no attribute '" +
+                             name + "'")
+
+    def __deepcopy__(self, memo):
+        # Copy on write: the copy shares the base layer and the (read-only)
+        # derived attributes, only the changed keywords are copied
+        new = self.__class__.__new__(self.__class__)
+        memo[id(self)] = new
+        new.__dict__.update(self.__dict__)
+        new._cmds = ChainMap(deepcopy(self._cmds.maps[0], memo),
+                             *self._cmds.maps[1:])
+        return new
+
+    def __setstate__(self, state):
+        # UserCommands pickled before the keywords were layered
+        if "cmds" in state:
+            state["_cmds"] = ChainMap(OrderedDict(), state.pop("cmds"))
+        state.setdefault("_stale", False)
+        state.setdefault("_memo", {})
+        self.__dict__.update(state)
+
+    @property
+    def cmds(self):
+        """
+        The keyword-value pairs, with all changes processed
+        """
+        if self._stale:
+            self._refresh()
+        return self._cmds
+
+    @cmds.setter
+    def cmds(self, new_cmds):
+        self._cmds = ChainMap(new_cmds)
+        self._invalidate()
 
 
     ### Add to the update that all the cmds.variable are updated when
     ### the dicts are updated
 
 
+def _total_wfe(inst_wfe):
+    """
+    [nm] The total wave front error of the INST_WFE table or value
+    """
+    if inst_wfe is not None:
+        if isinstance(inst_wfe, str):
+            wfe_list = read_table(inst_wfe)
+            wfe = wfe_list[wfe_list.colnames[0]]
+            num = wfe_list[wfe_list.colnames[1]]
+        elif isinstance(inst_wfe, (float, int)):
+            wfe, num = float(inst_wfe), 1
+
+        tot_wfe = np.sqrt(np.sum(num * wfe**2))
+    else:
+        tot_wfe = 0
+
+    return tot_wfe
+
+
+def _filter_range(tc_filt, threshold):
+    """
+    [um] The wavelength range where the filter curve ``tc_filt`` is above
+    ``threshold``, plus one bin on each side
+    """
+    mask = np.where(tc_filt.val > threshold)[0]
+    imin = np.max((mask[0] - 1, 0))
+    imax = np.min((mask[-1] + 1, len(tc_filt.lam) - 1))
+    return tc_filt.lam[imin], tc_filt.lam[imax]
+
+
+# attributes set by UserCommands._update_attributes
+_DERIVED_ATTRIBUTES = ("mirrors_telescope", "mirrors_ao", "diameter", "area",
+                       "fpa_res", "pix_res", "lam_res", "lam", "lam_bin_edges",
+                       "lam_bin_centers", "exptime", "verbose", "obs", "sim",
+                       "atmo", "scope", "inst", "fpa", "hxrg")
+
+
 def dump_defaults(filename=None, selection="freq"):
     ## OC, 2016-08-11: changed parameter from 'type' to 'selection' as
     ##    'type' redefines built-in
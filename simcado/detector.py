@@ -82,6 +82,10 @@ Astropy ``HDUList``. The ``HDUList`` is then written to disk.
 
 import os
 import sys
+import builtins
+import threading
+import queue
+from io import BytesIO
 from datetime import datetime
 
 import warnings
@@ -107,8 +111,9 @@ from . import spectral as sc
 from . import commands
 from .nghxrg import HXRGNoise
 
-__all__ = ["Detector", "Chip", "open", "plot_detector", "plot_detector_layout",
-           "make_noise_cube", "install_noise_cube"]
+__all__ = ["Detector", "Chip", "FrameWriter", "ChipWriter", "open",
+           "plot_detector", "plot_detector_layout", "make_noise_cube",
+           "install_noise_cube"]
 
 
 ################################################################################
@@ -160,6 +165,8 @@ class Detector(object):
     -------
     read_out()
         for reading out the detector array into a FITS file
+    read_out_frames()
+        generator for reading out the detector array one DIT at a time
     open()
         not yet implemented
     write()
@@ -263,7 +270,7 @@ class Detector(object):
 
 
     def read_out(self, filename=None, to_disk=False, chips=None,
-                 read_out_type="superfast", **kwargs):
+                 read_out_type="superfast", render=None, **kwargs):
         """
         Simulate the read-out process of the detector array
 
@@ -292,6 +299,17 @@ class Detector(object):
             - "superfast"
             - "non_destructive"
             - "up_the_ramp"
+            - "expectation" : no random noise is added. Each chip extension
+              (CHIP_xx) holds the expected signal and is followed by an
+              extension (VAR_xx) holding the analytic variance of the signal.
+              See :meth:`.Chip.read_out_expectation`
+
+        render : callable, optional
+            A function ``render(i)`` which projects the image onto chip ``i``,
+            e.g. a wrapper around :meth:`.Source.apply_optical_train`. It is
+            called just before chip ``i`` is read out. Together with
+            ``SIM_ASYNC_IO="yes"`` chip ``i`` is written to disk while chip
+            ``i+1`` is being rendered. Default is None
 
         Returns
         -------
@@ -303,6 +321,31 @@ class Detector(object):
         the ``Detector``. Therefore any dictionary keywords can be passed in the
         form of a dictionary, i.e. {"OBS_EXPTIME" : 60, "OBS_OUTPUT_DIR" : "./"}
 
+        Notes
+        -----
+        The format of the output file is controlled by the keywords:
+
+        - OBS_FITS_COMPRESSION : ["none", "rice", "gzip"] tile-compress the
+          images with ``astropy.io.fits.CompImageHDU``. Compressed files always
+          start with an empty primary HDU. Float images are quantised by the
+          compression algorithm, integer images are compressed losslessly
+        - OBS_FITS_INT_ADU : ["no", "yes"] round the images (which are already
+          divided by the chip gain) to integer ADU and store them as int32
+        - OBS_FITS_CHECKSUM : ["yes", "no"] add CHECKSUM and DATASUM keywords
+
+        The settings are recorded in the INT_ADU and FITSCOMP header keywords
+
+        If SIM_ASYNC_IO is "yes", multi-chip files are written chip by chip by
+        a :class:`.ChipWriter` in a background thread. Errors raised while
+        writing are re-raised here
+
+        Examples
+        --------
+        Write a RICE-compressed image with integer ADU values::
+
+            >>> fpa.read_out("image.fits", OBS_FITS_COMPRESSION="rice",
+            ...              OBS_FITS_INT_ADU="yes")
+
         """
 
         #removed kwargs
@@ -331,91 +374,384 @@ class Detector(object):
         # timespec="seconds" throws an error on some python versions
         creation_date = datetime.now().strftime("%Y-%m-%dT%H-%M-%S")
 
+        compression, int_adu, checksum = self._get_output_settings()
+
         hdulist = fits.HDUList()
+        writer = None
 
         # Create primary header unit for multi-extension files
         if len(ro_chips) > 1:
-            primary_hdu = fits.PrimaryHDU()
+            primary_hdu = fits.PrimaryHDU(
+                header=self._make_primary_header(creation_date))
+            hdulist.append(primary_hdu)
 
-            primary_hdu.header['DATE'] = creation_date
+            if to_disk and self.cmds["SIM_ASYNC_IO"].lower() == "yes":
+                writer = ChipWriter(filename, primary_hdu, compression,
+                                    checksum)
 
+        # Save the detector image(s)
+        try:
+            for i in ro_chips:
+                if render is not None:
+                    render(i)
+
+                ######
+                # Put in a catch here so that only the chips specified in
+                # "chips" are read out
+                ######
+                print("Reading out chip", self.chips[i].id, "using",
+                      read_out_type)
+
+                if read_out_type.lower() == "expectation":
+                    array, variance = \
+                        self.chips[i].read_out_expectation(self.cmds)
+                else:
+                    array = self.chips[i].read_out(self.cmds,
+                                                   read_out_type=read_out_type)
+                    variance = None
+                    if int_adu:
+                        array = _quantise_adu(array)
+
+                ## TODO: transpose is just a hack - need to make sure
+                ##       x and y are handled correctly throughout SimCADO
+                thishdu = fits.ImageHDU(array.T,
+                                        header=self._make_chip_header(
+                                            i, creation_date))
+                hdus = [thishdu]
+
+                if variance is not None:
+                    thishdu.header["READMODE"] = ("expectation",
+                                                  "Noiseless expected signal")
+                    varhdu = fits.ImageHDU(variance.T, header=thishdu.header)
+                    varhdu.header["EXTNAME"] = \
+                        ("VAR_{:02d}".format(self.chips[i].id),
+                         "Variance of chip image")
+                    varhdu.header["BUNIT"] = ("ADU2", "")
+                    hdus += [varhdu]
+
+                for hdu in hdus:
+                    hdulist.append(hdu)
+                    if writer is not None:
+                        writer.write(hdu)
+
+        finally:
+            if writer is not None:
+                writer.close()
+
+        if to_disk and writer is None:
+            _write_hdulist(hdulist, filename, compression, checksum)
 
-            for key in self.cmds.cmds:
-                val = self.cmds.cmds[key]
+        return hdulist
 
-                if isinstance(val, (sc.TransmissionCurve, sc.EmissionCurve,
-                                    sc.UnityCurve, sc.BlackbodyCurve)):
-                    val = val.params["filename"]
 
-                if isinstance(val, str) and len(val) > 35:
-                    val = "... " + val[-35:]
+    def read_out_frames(self, n_frames=None, filename=None, chips=None,
+                        read_out_type="superfast", cube=True):
+        """
+        Read out the detector array one DIT at a time
 
-                try:
-                    primary_hdu.header["HIERARCH "+key] = val
-                except NameError:   # any other exceptions possible?
-                    pass
-            hdulist.append(primary_hdu)
+        A generator version of :meth:`.read_out` for saving every DIT of an
+        NDIT sequence. Each frame is a fresh noise realisation of the
+        noiseless photon-rate images already held by the ``Chip`` s, for a
+        single exposure of length OBS_EXPTIME / OBS_NDIT. The ``UserCommands``
+        object is not updated between frames and the FITS headers are only
+        built once, so the time and memory needed per frame do not depend on
+        the number of frames.
+
+        Parameters
+        ----------
+        n_frames : int, optional
+            Number of frames to read out. Default is ``cmds["OBS_NDIT"]``
+
+        filename : str, optional
+            If given, the frames are written to disk by a :class:`.FrameWriter`
+            running in a background thread. Default is ``None``
+
+        chips : int, array-like, optional
+            The chip or chips to be read out. Default is all chips
+
+        read_out_type : str, optional
+            See :meth:`.read_out`. Default is "superfast"
+
+        cube : bool, optional
+            Only used if ``filename`` is given. If True (default), all frames
+            are written into a single FITS file with one (n_frames, ny, nx)
+            cube per chip. If False, each frame is written to a numbered file,
+            e.g. ``image.fits`` -> ``image0.fits``, ``image1.fits``, ...
+
+        Yields
+        ------
+        astropy.io.fits.HDUList
+            The read-out images of a single DIT
+
+        Examples
+        --------
+        Save all 10 DITs of an exposure into a single FITS cube::
+
+            >>> fpa = simcado.Detector(cmds)
+            >>> src.apply_optical_train(opt_train, fpa)
+            >>> for hdu in fpa.read_out_frames(10, filename="my_cube.fits"):
+            ...     pass
+
+        See Also
+        --------
+        :meth:`.read_out`, :class:`.FrameWriter`
+
+        """
+
+        if n_frames is None:
+            n_frames = int(self.cmds["OBS_NDIT"])
+
+        if chips is None:
+            ro_chips = np.arange(len(self.chips))
+        elif np.isscalar(chips):
+            ro_chips = [chips]
+        else:
+            ro_chips = chips
+
+        dit = self.cmds["OBS_EXPTIME"] / self.cmds["OBS_NDIT"]
+        compression, int_adu, checksum = self._get_output_settings()
+
+        creation_date = datetime.now().strftime("%Y-%m-%dT%H-%M-%S")
+        primary_header = self._make_primary_header(creation_date)
+        chip_headers = []
+        for i in ro_chips:
+            hdr = self._make_chip_header(i, creation_date)
+            hdr["EXPTIME"] = (dit, "[s] Exposure time")
+            hdr["NDIT"] = (1, "Number of exposures")
+            chip_headers += [hdr]
+
+        writer = None
+        if filename is not None:
+            shapes = [(self.chips[i].naxis2, self.chips[i].naxis1)
+                      for i in ro_chips]
+            writer = FrameWriter(filename, n_frames, chip_headers, shapes,
+                                 primary_header=primary_header, cube=cube,
+                                 compression=compression, int_adu=int_adu,
+                                 checksum=checksum)
+
+        try:
+            for n in range(n_frames):
+                hdulist = fits.HDUList()
+                if len(ro_chips) > 1:
+                    hdulist.append(fits.PrimaryHDU(header=primary_header))
+
+                for i, hdr in zip(ro_chips, chip_headers):
+                    array = self.chips[i].read_out(self.cmds,
+                                                   read_out_type=read_out_type,
+                                                   dit=dit, ndit=1)
+                    if int_adu:
+                        array = _quantise_adu(array)
+                    thishdu = fits.ImageHDU(array.T, header=hdr)
+                    thishdu.header["FRAME"] = (n, "Frame number in sequence")
+                    hdulist.append(thishdu)
+
+                if writer is not None:
+                    writer.write(n, hdulist)
+
+                yield hdulist
+
+        finally:
+            if writer is not None:
+                writer.close()
+
+
+    def read_out_ladder(self, exptimes, ndits=None, chips=None,
+                        read_out_type="superfast"):
+        """
+        Read out the detector array for a list of exposure settings at once
+
+        Each entry of ``exptimes`` (and ``ndits``) gives one read-out of the
+        photon flux images already stored on the ``Chip`` s. Unlike calling
+        ``read_out(OBS_EXPTIME=...)`` once per exposure time, the
+        ``UserCommands`` object is not updated and all read-outs of a chip are
+        computed in a single vectorised step.
+
+        Parameters
+        ----------
+        exptimes : array-like
+            [s] total exposure times, i.e. DIT * NDIT
+        ndits : int, array-like, optional
+            [#] number of DITs for each exposure time. Default is OBS_NDIT
+        chips : int, array-like, optional
+            The chip or chips to be read out. Default is all chips
+        read_out_type : str, optional
+            ["superfast", "expectation"] Default is "superfast". For
+            "expectation" each chip extension (CHIP_xx) holds the cube of
+            expected signals and is followed by the cube of variances (VAR_xx)
+
+        Returns
+        -------
+        astropy.io.fits.HDUList
+            A primary HDU, one (n, ny, nx) cube per chip and a table extension
+            (LADDER) listing the EXPTIME and NDIT of each layer of the cubes
+
+        Examples
+        --------
+        ::
+
+            >>> src.apply_optical_train(opt_train, fpa)
+            >>> hdu = fpa.read_out_ladder([60, 600, 3600], ndits=[1, 10, 60])
+            >>> hdu["CHIP_00"].data.shape
+            (3, 1024, 1024)
+
+        See Also
+        --------
+        :meth:`.Chip.read_out_ladder`
+
+        """
+
+        exptimes = np.atleast_1d(np.asarray(exptimes, dtype=np.float64))
+        if ndits is None:
+            ndits = self.cmds["OBS_NDIT"]
+        ndits = np.broadcast_to(np.asarray(ndits, dtype=int), exptimes.shape)
+
+        if chips is None:
+            ro_chips = np.arange(len(self.chips))
+        elif np.isscalar(chips):
+            ro_chips = [chips]
+        else:
+            ro_chips = chips
+
+        creation_date = datetime.now().strftime("%Y-%m-%dT%H-%M-%S")
+        hdulist = fits.HDUList([fits.PrimaryHDU(
+            header=self._make_primary_header(creation_date))])
 
-        # Save the detector image(s)
         for i in ro_chips:
-            ######
-            # Put in a catch here so that only the chips specified in "chips"
-            # are read out
-            ######
-            print("Reading out chip", self.chips[i].id, "using",
-                  read_out_type)
+            header = self._make_chip_header(i, creation_date)
+            del header["EXPTIME"], header["NDIT"]
+            header["NLADDER"] = (len(exptimes), "Number of exposure settings")
+
+            out = self.chips[i].read_out_ladder(self.cmds, exptimes, ndits,
+                                                read_out_type=read_out_type)
+
+            ## TODO: transpose is just a hack - see read_out
+            if read_out_type.lower() == "expectation":
+                header["READMODE"] = ("expectation",
+                                      "Noiseless expected signal")
+                signal, variance = out
+                hdulist.append(fits.ImageHDU(signal.transpose(0, 2, 1),
+                                             header=header))
+                varhdu = fits.ImageHDU(variance.transpose(0, 2, 1),
+                                       header=header)
+                varhdu.header["EXTNAME"] = \
+                    ("VAR_{:02d}".format(self.chips[i].id),
+                     "Variance of chip image")
+                varhdu.header["BUNIT"] = ("ADU2", "")
+                hdulist.append(varhdu)
+            else:
+                hdulist.append(fits.ImageHDU(out.transpose(0, 2, 1),
+                                             header=header))
+
+        cols = [fits.Column(name="EXPTIME", format="D", unit="s",
+                            array=exptimes),
+                fits.Column(name="NDIT", format="J", array=ndits)]
+        hdulist.append(fits.BinTableHDU.from_columns(cols, name="LADDER"))
+
+        return hdulist
+
+
+    def _get_output_settings(self):
+        """
+        Return the (compression, int_adu, checksum) settings for output files
 
-            array = self.chips[i].read_out(self.cmds,
-                                           read_out_type=read_out_type)
+        Based on the keywords OBS_FITS_COMPRESSION, OBS_FITS_INT_ADU and
+        OBS_FITS_CHECKSUM. ``compression`` is either ``None``, "RICE_1" or
+        "GZIP_1"
+        """
+
+        compression = self.cmds["OBS_FITS_COMPRESSION"]
+        if compression is not None:
+            compression = compression.lower()
+            if compression not in ("rice", "gzip"):
+                raise ValueError("OBS_FITS_COMPRESSION must be one of "
+                                 "[none, rice, gzip], not " + compression)
+            compression = compression.upper() + "_1"
+
+        int_adu = self.cmds["OBS_FITS_INT_ADU"].lower() == "yes"
+        checksum = self.cmds["OBS_FITS_CHECKSUM"].lower() == "yes"
 
-            ## TODO: transpose is just a hack - need to make sure
-            ##       x and y are handled correctly throughout SimCADO
-            thishdu = fits.ImageHDU(array.T)
+        return compression, int_adu, checksum
 
-            thishdu.header["EXTNAME"] = ("CHIP_{:02d}".format(self.chips[i].id),
-                                         "Chip ID")
 
-            thishdu.header["CHIP_ID"] = (self.chips[i].id, "Chip ID")
-            thishdu.header['DATE'] = creation_date
+    def _make_primary_header(self, creation_date):
+        """
+        Return the primary header for a multi-extension read-out file
+        """
 
-            # Primary WCS for sky coordinates
-            thishdu.header.extend(self.chips[i].wcs.to_header())
+        header = fits.Header()
+        header['DATE'] = creation_date
+
+        for key in self.cmds.cmds:
+            val = self.cmds.cmds[key]
+
+            if isinstance(val, (sc.TransmissionCurve, sc.EmissionCurve,
+                                sc.UnityCurve, sc.BlackbodyCurve)):
+                val = val.params["filename"]
+
+            if isinstance(val, str) and len(val) > 35:
+                val = "... " + val[-35:]
 
-            # Secondary WCS for focal plane coordinates
             try:
-                thishdu.header.extend(self.chips[i].wcs_fp.to_header(key='A'))
-            except AttributeError:
-                print("No WCS_FP!")
+                header["HIERARCH "+key] = val
+            except NameError:   # any other exceptions possible?
                 pass
 
-            thishdu.header["BUNIT"] = ("ADU", "")
-            thishdu.header["EXPTIME"] = (self.exptime, "[s] Exposure time")
-            thishdu.header["NDIT"] = (self.ndit, "Number of exposures")
-            #thishdu.header["TRO"] = (self.tro,
-            #                         "[s] Time between non-destructive readouts")
-            thishdu.header["GAIN"] = (self.chips[i].gain, "[e-/ADU]")
-            thishdu.header["AIRMASS"] = (self.cmds["ATMO_AIRMASS"], "")
-            thishdu.header["ZD"] = \
-                (airmass2zendist(self.cmds["ATMO_AIRMASS"]), "[deg]")
-
-
-            for key in self.cmds.cmds:
-                val = self.cmds.cmds[key]
-                if isinstance(val, str):
-                    if len(val) > 35:
-                        val = "... " + val[-35:]
-                try:
-                    thishdu.header["HIERARCH "+key] = val
-                except NameError:   # any other exceptions possible?
-                    pass
-                except ValueError:
-                    warnings.warn("ValueError - Couldn't add keyword: "+key)
-            hdulist.append(thishdu)
+        return header
 
-        if to_disk:
-            hdulist.writeto(filename, clobber=True, checksum=True)
 
-        return hdulist
+    def _make_chip_header(self, i, creation_date):
+        """
+        Return the image header for chip ``i`` of the detector array
+        """
+
+        header = fits.Header()
+        header["EXTNAME"] = ("CHIP_{:02d}".format(self.chips[i].id), "Chip ID")
+
+        header["CHIP_ID"] = (self.chips[i].id, "Chip ID")
+        header['DATE'] = creation_date
+
+        # Primary WCS for sky coordinates
+        header.extend(self.chips[i].wcs.to_header())
+
+        # Secondary WCS for focal plane coordinates
+        try:
+            header.extend(self.chips[i].wcs_fp.to_header(key='A'))
+        except AttributeError:
+            print("No WCS_FP!")
+            pass
+
+        header["BUNIT"] = ("ADU", "")
+        header["EXPTIME"] = (self.exptime, "[s] Exposure time")
+        header["NDIT"] = (self.ndit, "Number of exposures")
+        #header["TRO"] = (self.tro,
+        #                 "[s] Time between non-destructive readouts")
+        header["GAIN"] = (self.chips[i].gain, "[e-/ADU]")
+        header["AIRMASS"] = (self.cmds["ATMO_AIRMASS"], "")
+        header["ZD"] = (airmass2zendist(self.cmds["ATMO_AIRMASS"]), "[deg]")
+
+        compression, int_adu, _ = self._get_output_settings()
+        header["INT_ADU"] = (int_adu, "Image rounded to integer ADU")
+        header["FITSCOMP"] = (str(compression).upper(),
+                              "Tile compression of output file")
+
+        for key in self.cmds.cmds:
+            val = self.cmds.cmds[key]
+
+            if isinstance(val, (sc.TransmissionCurve, sc.EmissionCurve,
+                                sc.UnityCurve, sc.BlackbodyCurve)):
+                val = val.params["filename"]
+
+            if isinstance(val, str):
+                if len(val) > 35:
+                    val = "... " + val[-35:]
+            try:
+                header["HIERARCH "+key] = val
+            except NameError:   # any other exceptions possible?
+                pass
+            except ValueError:
+                warnings.warn("ValueError - Couldn't add keyword: "+key)
+
+        return header
 
 
     def write(self, filename=None, **kwargs):
@@ -465,6 +801,259 @@ class Detector(object):
             warnings.warn(filename+" exists and is busy. OS won't let me write")
 
 
+class _BackgroundWriter(object):
+    """
+    Base class for writing FITS data to disk in a background thread
+
+    Items are handed over with :meth:`.write` and written by
+    :meth:`._write_item` while the main thread carries on. At most
+    ``max_queue`` items are held in memory at any one time. Any error raised
+    in the background thread is re-raised by the next call to :meth:`.write`
+    or by :meth:`.close`.
+    """
+
+    def __init__(self, max_queue=2):
+        self._error = None
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+
+    def write(self, *item):
+        """
+        Queue an item for writing
+
+        Blocks while ``max_queue`` items are already waiting
+        """
+        self._check_error()
+        self._queue.put(item)
+
+
+    def close(self):
+        """Write all remaining items and wait for the writer to finish"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._check_error()
+
+
+    def _check_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+
+    def _open(self):
+        pass
+
+
+    def _write_item(self, *item):
+        raise NotImplementedError
+
+
+    def _close(self):
+        pass
+
+
+    def _run(self):
+        try:
+            self._open()
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                self._write_item(*item)
+
+        except Exception as error:
+            self._error = error
+            # keep emptying the queue so that write() never blocks forever
+            while self._queue.get() is not None:
+                pass
+
+        finally:
+            self._close()
+
+
+class FrameWriter(_BackgroundWriter):
+    """
+    Write a sequence of read-out frames to disk in a background thread
+
+    Frames are handed over with ``write(n, hdulist)`` and written while the
+    next frame is being generated. At most ``max_queue`` frames are held in
+    memory at any one time.
+
+    Parameters
+    ----------
+    filename : str
+        path to the output file. For numbered files the frame number is
+        inserted before the file extension, i.e. ``image.fits`` becomes
+        ``image0.fits``, ``image1.fits``, ...
+    n_frames : int
+        total number of frames in the sequence
+    headers : list
+        ``astropy.io.fits.Header`` objects for each chip extension
+    shapes : list
+        (naxis2, naxis1) shape of the image of each chip
+    primary_header : astropy.io.fits.Header, optional
+        header for the primary HDU. Default is ``None``
+    cube : bool, optional
+        Default is True. If True, all frames go into a single file which holds
+        a (n_frames, naxis2, naxis1) cube for each chip. If False, each frame
+        is written to its own numbered file
+    max_queue : int, optional
+        Default is 2. Maximum number of frames waiting to be written
+    compression : str, optional
+        [None, "RICE_1", "GZIP_1"] Default is None. Tile compression for
+        numbered files. Streamed cubes cannot be tile-compressed
+    int_adu : bool, optional
+        Default is False. Set to True if the frames hold integer ADU values.
+        Cubes are then written as int32 instead of float32
+    checksum : bool, optional
+        Default is True. Add CHECKSUM and DATASUM keywords to numbered files
+
+    See Also
+    --------
+    :meth:`.Detector.read_out_frames`
+
+    """
+
+    def __init__(self, filename, n_frames, headers, shapes,
+                 primary_header=None, cube=True, max_queue=2,
+                 compression=None, int_adu=False, checksum=True):
+
+        self.filename = filename
+        self.n_frames = n_frames
+        self.cube = cube
+        self.compression = compression
+        self.checksum = checksum
+        self._dtype = np.dtype(">i4") if int_adu else np.dtype(">f4")
+        self._offsets = []
+        self._fobj = None
+
+        if primary_header is None:
+            primary_header = fits.Header()
+        self.primary_header = primary_header
+
+        if self.cube:
+            if self.compression is not None:
+                warnings.warn("Tile compression is not available for "
+                              "streamed cubes. Writing uncompressed cube")
+            self._allocate_cube(headers, shapes)
+
+        super(FrameWriter, self).__init__(max_queue=max_queue)
+
+
+    def frame_filename(self, n):
+        """Return the filename for frame ``n`` of a numbered sequence"""
+        root, ext = os.path.splitext(self.filename)
+        return root + str(n) + ext
+
+
+    def _allocate_cube(self, headers, shapes):
+        """
+        Write the headers and reserve space on disk for the full cubes
+        """
+
+        with builtins.open(self.filename, "wb") as fobj:
+            hdr = fits.PrimaryHDU(header=self.primary_header).header
+            fobj.write(hdr.tostring().encode("ascii"))
+
+            for header, shape in zip(headers, shapes):
+                dummy = np.zeros((1, 1, 1), dtype=self._dtype)
+                hdr = fits.ImageHDU(dummy, header=header).header
+                hdr["NAXIS1"] = shape[1]
+                hdr["NAXIS2"] = shape[0]
+                hdr["NAXIS3"] = self.n_frames
+                hdr["NFRAMES"] = (self.n_frames, "Number of frames in cube")
+                fobj.write(hdr.tostring().encode("ascii"))
+
+                frame_bytes = int(np.prod(shape)) * self._dtype.itemsize
+                self._offsets += [(fobj.tell(), frame_bytes)]
+
+                n_bytes = frame_bytes * self.n_frames
+                n_bytes += -n_bytes % 2880      # FITS blocks are 2880 bytes
+                if n_bytes > 0:
+                    fobj.seek(n_bytes - 1, 1)
+                    fobj.write(b"\0")
+
+
+    def _open(self):
+        if self.cube:
+            self._fobj = builtins.open(self.filename, "r+b")
+
+
+    def _write_item(self, n, hdulist):
+        if self.cube:
+            images = [hdu for hdu in hdulist if hdu.data is not None]
+            for hdu, (offset, frame_bytes) in zip(images, self._offsets):
+                self._fobj.seek(offset + n * frame_bytes)
+                self._fobj.write(hdu.data.astype(self._dtype).tobytes())
+        else:
+            _write_hdulist(hdulist, self.frame_filename(n),
+                           self.compression, self.checksum)
+
+
+    def _close(self):
+        if self._fobj is not None:
+            self._fobj.close()
+
+
+class ChipWriter(_BackgroundWriter):
+    """
+    Append chip images to a multi-extension FITS file in a background thread
+
+    The primary HDU is written straight away. Each chip ``ImageHDU`` handed
+    over with ``write(hdu)`` is compressed, checksummed and appended to the
+    file while the next chip is being simulated.
+
+    Parameters
+    ----------
+    filename : str
+        path to the output file
+    primary_hdu : astropy.io.fits.PrimaryHDU
+        the (empty) primary HDU of the file
+    compression : str, optional
+        [None, "RICE_1", "GZIP_1"] Default is None
+    checksum : bool, optional
+        Default is True. Add CHECKSUM and DATASUM keywords to each HDU
+    max_queue : int, optional
+        Default is 2. Maximum number of chips waiting to be written
+
+    See Also
+    --------
+    :meth:`.Detector.read_out`
+
+    """
+
+    def __init__(self, filename, primary_hdu, compression=None, checksum=True,
+                 max_queue=2):
+
+        self.filename = filename
+        self.compression = compression
+        self.checksum = checksum
+
+        fits.HDUList([primary_hdu]).writeto(filename, overwrite=True,
+                                            checksum=checksum)
+
+        super(ChipWriter, self).__init__(max_queue=max_queue)
+
+
+    def _write_item(self, hdu):
+        # FITS files are a concatenation of HDUs. The extension is serialised
+        # behind a dummy primary HDU which is then cut off
+        buf = BytesIO()
+        fits.PrimaryHDU().writeto(buf, checksum=self.checksum)
+        n_skip = len(buf.getvalue())
+
+        buf = BytesIO()
+        hdulist = fits.HDUList([fits.PrimaryHDU(),
+                                _compress_hdu(hdu, self.compression)])
+        hdulist.writeto(buf, checksum=self.checksum)
+
+        with builtins.open(self.filename, "ab") as fobj:
+            fobj.write(buf.getvalue()[n_skip:])
+
 ################################################################################
 #                              Chip Objects                                    #
 ################################################################################
@@ -757,7 +1346,7 @@ class Chip(object):
         self.array = None
 
 
-    def read_out(self, cmds, read_out_type="superfast"):
+    def read_out(self, cmds, read_out_type="superfast", dit=None, ndit=None):
         """
         Read out the detector array
 
@@ -765,6 +1354,11 @@ class Chip(object):
         ----------
         cmds : simcado.UserCommands
             Commands for how to read out the chip
+        read_out_type : str, optional
+            ["superfast", "non_destructive", "up_the_ramp"]
+        dit, ndit : float, int, optional
+            [s, #] Override OBS_EXPTIME / OBS_NDIT and OBS_NDIT respectively
+            without having to update ``cmds``. Default is None
 
         Returns
         -------
@@ -774,8 +1368,13 @@ class Chip(object):
         """
 
         # set up the read out
-        self.dit      = cmds["OBS_EXPTIME"] / cmds["OBS_NDIT"]
-        self.ndit     = int(cmds["OBS_NDIT"])
+        if dit is None:
+            dit = cmds["OBS_EXPTIME"] / cmds["OBS_NDIT"]
+        if ndit is None:
+            ndit = cmds["OBS_NDIT"]
+
+        self.dit      = dit
+        self.ndit     = int(ndit)
         self.dark     = cmds["FPA_DARK_MEDIAN"]
         self.min_dit  = cmds["FPA_PIXEL_READ_TIME"] * \
                         (self.naxis1 * self.naxis1 / cmds["HXRG_NUM_OUTPUTS"])
@@ -811,6 +1410,141 @@ class Chip(object):
         return out_array
 
 
+    def read_out_expectation(self, cmds, dit=None, ndit=None):
+        """
+        Return the expected signal and its variance instead of a noisy read-out
+
+        No random numbers are drawn. For NDIT exposures of length DIT the
+        expected signal and variance in [e-] are::
+
+            signal   = (rate + dark) * DIT * NDIT
+            variance = (rate + dark) * DIT * NDIT + NDIT * read_noise**2
+
+        where ``rate`` is the photon flux stored on the chip, ``dark`` is
+        FPA_DARK_MEDIAN and ``read_noise`` is FPA_READOUT_MEDIAN (zero if
+        FPA_USE_NOISE is "no"). Both are then converted to ADU with the chip
+        gain. The flat field and OBS_REMOVE_CONST_BG are applied as in
+        :meth:`.read_out`. The linearity curve is not applied.
+
+        This is the mean and variance of the "superfast" read-out, which adds
+        the same dark current. Its read noise however is drawn from the frames
+        in FPA_NOISE_PATH, so the variance only matches if the standard
+        deviation of those frames is FPA_READOUT_MEDIAN.
+
+        Parameters
+        ----------
+        cmds : simcado.UserCommands
+            Commands for how to read out the chip
+        dit, ndit : float, int, optional
+            [s, #] Override OBS_EXPTIME / OBS_NDIT and OBS_NDIT respectively.
+            Default is None
+
+        Returns
+        -------
+        signal : np.ndarray
+            [ADU] the expected image of the chip
+        variance : np.ndarray
+            [ADU^2] the variance of each pixel in ``signal``
+
+        """
+
+        if dit is None:
+            dit = cmds["OBS_EXPTIME"] / cmds["OBS_NDIT"]
+        if ndit is None:
+            ndit = cmds["OBS_NDIT"]
+
+        if self.array is None:
+            self.array = np.zeros((self.naxis1, self.naxis2), dtype=np.float32)
+
+        rate = np.clip(self.array, 0, None) + cmds["FPA_DARK_MEDIAN"]
+
+        if cmds["FPA_USE_NOISE"].lower() == "no":
+            read_noise = 0.
+        else:
+            read_noise = cmds["FPA_READOUT_MEDIAN"]
+
+        signal = rate * dit * ndit
+        variance = signal + ndit * read_noise**2
+
+        signal /= self.gain
+        variance /= self.gain**2
+
+        if self.flat_field is not None:
+            signal *= self.flat_field
+            variance *= self.flat_field**2
+
+        if cmds["OBS_REMOVE_CONST_BG"].lower() == "yes":
+            signal -= np.median(signal, axis=(-2, -1), keepdims=True)
+
+        return signal.astype(np.float32), variance.astype(np.float32)
+
+
+    def read_out_ladder(self, cmds, exptimes, ndits, read_out_type="superfast"):
+        """
+        Read out the chip for a series of exposure settings in one go
+
+        All read-outs are computed together as (n, naxis1, naxis2) cubes from
+        the photon flux stored on the chip. ``cmds`` is only read, not updated.
+
+        Parameters
+        ----------
+        cmds : simcado.UserCommands
+            Commands for how to read out the chip
+        exptimes : array-like
+            [s] total exposure time of each read-out, i.e. DIT * NDIT
+        ndits : array-like
+            [#] number of DITs of each read-out
+        read_out_type : str, optional
+            ["superfast", "expectation"] Default is "superfast"
+
+        Returns
+        -------
+        out_cube : np.ndarray
+            [ADU] if read_out_type is "superfast"
+        signal, variance : np.ndarray
+            [ADU, ADU^2] if read_out_type is "expectation"
+
+        Notes
+        -----
+        The sum of NDIT Poisson draws with mean ``rate * DIT`` is itself a
+        Poisson draw with mean ``rate * DIT * NDIT``, so a single draw per
+        read-out gives the same statistics as :meth:`._read_out_superfast`
+
+        """
+
+        exptimes = np.asarray(exptimes, dtype=np.float64).reshape(-1, 1, 1)
+        ndits = np.asarray(ndits, dtype=np.float64).reshape(-1, 1, 1)
+
+        if read_out_type.lower() == "expectation":
+            return self.read_out_expectation(cmds, dit=exptimes / ndits,
+                                             ndit=ndits)
+        elif read_out_type.lower() != "superfast":
+            raise ValueError("read_out_ladder only supports the 'superfast' "
+                             "and 'expectation' read-out types")
+
+        if self.array is None:
+            self.array = np.zeros((self.naxis1, self.naxis2), dtype=np.float32)
+
+        rate = np.clip(self.array, 0, None) + cmds["FPA_DARK_MEDIAN"]
+        signal = np.random.poisson(rate * exptimes).astype(np.float32)
+
+        lin_curve = cmds["FPA_LINEARITY_CURVE"]
+        if lin_curve is not None:
+            signal = self._apply_linearity(signal, lin_curve)
+
+        ro = self._read_noise_frame(cmds, n_frames=len(exptimes))
+        out_cube = signal + np.sqrt(ndits) * ro
+        out_cube /= self.gain
+
+        if self.flat_field is not None:
+            out_cube *= self.flat_field
+
+        if cmds["OBS_REMOVE_CONST_BG"].lower() == "yes":
+            out_cube -= np.median(out_cube, axis=(-2, -1), keepdims=True)
+
+        return out_cube.astype(np.float32)
+
+
     def _read_out_non_destructive(self, cmds, dit, ndit):
         """
         Read out NDIT times non-destructively according to FPA_READ_OUT_SCHEME
@@ -836,7 +1570,7 @@ class Chip(object):
                 if lin_curve is not None:
                     signal, lin_curve = self._apply_linearity(signal, lin_curve,
                                                               return_curve=True)
-                read_noise = self._read_noise_frame(cmds)[0]
+                read_noise = self._read_noise_frame(cmds)
                 ro_cube += [signal + read_noise]
 
             ro_cube = np.array(ro_cube)
@@ -945,7 +1679,8 @@ class Chip(object):
         Superfast read-out
         """
 
-        signal = self._read_out_poisson(self.array, dit, ndit)
+        signal = self._read_out_poisson(self.array + cmds["FPA_DARK_MEDIAN"],
+                                        dit, ndit)
 
         # apply the linearity curve
         lin_curve = cmds["FPA_LINEARITY_CURVE"]
@@ -1012,38 +1747,45 @@ class Chip(object):
         ----------
         cmds : UserCommands
         n_frames : int
-            The number of frames needed
+            The number of frames needed. Each frame is an independent draw:
+            a new NGHxRG frame, or a different layer of the noise file as long
+            as the file has enough layers
 
         Returns
         -------
         noise_cube : np.ndarray
             if n_frames == 1: shape = (naxis1, naxis2)
-            else: shape = = (naxis1, naxis2, n_frames)
+            else: shape = (n_frames, naxis1, naxis2)
 
         """
 
         if cmds["FPA_USE_NOISE"].lower() == "no":
-            return np.zeros((self.naxis1, self.naxis2))
-
-        if "gen" in cmds["FPA_NOISE_PATH"].lower():
-            if cmds["HXRG_OUTPUT_PATH"] is not None:
-                generate_hxrg_noise(cmds)
-                tmp = fits.getdata(cmds["HXRG_OUTPUT_PATH"])
-                return tmp[:self.naxis1, :self.naxis2]
-            else:
-                noise_cube = generate_hxrg_noise(cmds)
-
-        elif cmds["FPA_NOISE_PATH"] is not None:
-            n = len(fits.info(cmds["FPA_NOISE_PATH"], False))
-            layer = np.random.randint(low=0, high=n, size=n_frames)
-            tmp = [fits.getdata(cmds["FPA_NOISE_PATH"], i) for i in layer]
-            noise_cube = np.array([im[:self.naxis1, :self.naxis2] for im in tmp])
+            noise_path = None
+        else:
+            noise_path = cmds["FPA_NOISE_PATH"]
+
+        if noise_path is None:
+            noise_cube = np.zeros((n_frames, self.naxis1, self.naxis2))
+
+        elif "gen" in noise_path.lower():
+            noise_cube = []
+            for _ in range(n_frames):
+                noise = generate_hxrg_noise(cmds)
+                if cmds["HXRG_OUTPUT_PATH"] is not None:
+                    noise = fits.getdata(cmds["HXRG_OUTPUT_PATH"])
+                # NGHxRG returns a 2D frame if HXRG_NUM_NDRO == 1
+                noise = noise.reshape((-1,) + noise.shape[-2:])[0]
+                noise_cube += [noise[:self.naxis1, :self.naxis2]]
+            noise_cube = np.array(noise_cube)
 
         else:
-            noise_cube = np.zeros((self.naxis1, self.naxis2, n_frames))
+            n = len(fits.info(noise_path, False))
+            layer = np.random.choice(n, size=n_frames, replace=n_frames > n)
+            tmp = [fits.getdata(noise_path, i) for i in layer]
+            noise_cube = np.array([im[:self.naxis1, :self.naxis2] for im in tmp])
 
         if n_frames == 1:
-            return noise_cube[0,:,:]
+            return noise_cube[0]
         else:
             return noise_cube
 
@@ -1417,3 +2159,54 @@ def install_noise_cube(n=9):
     else:
         print("Sorry, but this only works in Python 3 and above. \
                See the SimCADO FAQs for work-around options")
+
+
+def _quantise_adu(array):
+    """
+    Round a read-out image in [ADU] to the nearest integer ADU value
+
+    The chip gain has already been applied by :meth:`.Chip.read_out`
+    """
+    return np.round(array).astype(np.int32)
+
+
+def _compress_hdu(hdu, compression=None):
+    """
+    Return ``hdu`` as a ``CompImageHDU``, or unchanged if compression is None
+    """
+    if compression is None:
+        return hdu
+
+    header = fits.ImageHDU(header=hdu.header).header
+    return fits.CompImageHDU(hdu.data, header=header,
+                             compression_type=compression)
+
+
+def _write_hdulist(hdulist, filename, compression=None, checksum=True):
+    """
+    Write a read-out ``HDUList`` to disk, optionally with tile compression
+
+    Parameters
+    ----------
+    hdulist : astropy.io.fits.HDUList
+    filename : str
+    compression : str, optional
+        [None, "RICE_1", "GZIP_1"] The image extensions are written as
+        ``CompImageHDU`` objects with this compression type. Default is None
+    checksum : bool, optional
+        Default is True. Add CHECKSUM and DATASUM keywords to each HDU
+
+    """
+
+    if compression is not None:
+        # A compressed image cannot be the primary HDU. Single chip read-outs
+        # hold their image in the primary HDU, so it is moved to an extension
+        comp_hdulist = fits.HDUList([fits.PrimaryHDU()])
+        for hdu in hdulist:
+            if hdu.data is None:
+                comp_hdulist[0] = hdu
+            else:
+                comp_hdulist.append(_compress_hdu(hdu, compression))
+        hdulist = comp_hdulist
+
+    hdulist.writeto(filename, overwrite=True, checksum=checksum)
@@ -9,18 +9,20 @@
 # TODO List
 # =========
 # - Make the Detector independent of the OpticalTrain
-# - Implement saving and reloading of OpticalTrain objects
 #
 
 import os
 import glob
+import pickle
+import hashlib
+import tempfile
 import warnings
 import logging
-from copy import deepcopy
+from copy import copy, deepcopy
+from collections import Counter
 
 import numpy as np
 
-from astropy.io import fits
 import astropy.units as u
 import astropy.table
 
@@ -29,11 +31,14 @@ from . import spectral as sc
 from . import spatial as pe
 from .source import flat_spectrum_sb, scale_spectrum_sb
 from .commands import UserCommands
-from .utils import __pkg_dir__, find_file
+from .utils import __pkg_dir__, find_file, _evict_lru
 
 
 __all__ = ["OpticalTrain", "get_filter_curve", "get_filter_set"]
 
+# unit-area, unit-solid-angle blackbody spectra keyed by temperature and grid
+__thermal_cache__ = {}
+
 class OpticalTrain(object):
     """
     The OpticalTrain object reads in or generates the information necessary to
@@ -56,6 +61,22 @@ class OpticalTrain(object):
     .commands.dump_defaults(), .commands.UserCommands
 
 
+    Notes
+    -----
+    If ``SIM_OPT_TRAIN_CACHE_DIR`` is set to a directory, e.g.
+    "~/.simcado/cache", built optical trains are kept in an on-disk cache
+    there. The cache key is a hash of all keywords that affect the optical
+    train, plus the modification times of the files they refer to, so an
+    identical optical train is only built once and then loaded from disk. The
+    least recently used entries are deleted when the cache grows beyond
+    ``SIM_OPT_TRAIN_CACHE_SIZE`` [MB]. The cache is off by default. The cache
+    files are pickles, which can run code when they are loaded, so only use a
+    directory that no one else can write to.
+
+    Use :meth:`.update` to change keywords of an existing optical train. Only
+    the products that depend on the changed keywords are remade.
+
+
     General Attributes
     ------------------
     - cmds : commands, optional
@@ -120,7 +141,8 @@ class OpticalTrain(object):
         if cmds is None:
             cmds = UserCommands()
         self.cmds = deepcopy(cmds)
-        self.cmds.update(kwargs)
+        if kwargs:
+            self.cmds.update(kwargs)
 
         self.tc_master = None   # set in separate method
         self.psf_size = None   # set in separate method
@@ -132,14 +154,17 @@ class OpticalTrain(object):
 
             self.read(fname)
         else:
-            self.lam_bin_edges = cmds.lam_bin_edges
-            self.lam_bin_centers = cmds.lam_bin_centers
-            self.pix_res = cmds.pix_res
+            self._gen_lam_grid()
 
-            self.lam = cmds.lam
-            self.lam_res = cmds.lam_res
+            cache_file = _cache_filename(self.cmds)
+            if cache_file is None or not self._read_cache(cache_file):
+                self._make()
+                if cache_file is not None:
+                    self._write_cache(cache_file)
 
-            self._make()
+        fname = self.cmds["SIM_OPT_TRAIN_OUT_PATH"]
+        if fname is not None:
+            self.save(fname)
 
 
     def _make(self, cmds=None):
@@ -233,15 +258,187 @@ class OpticalTrain(object):
                 filt = sc.TransmissionCurve(lam=lam, val=trans,
                                             lam_res=self.lam_res)
 
-        self.cmds["INST_FILTER_TC"] = filt
-        self._gen_all_tc()
+        self.update(INST_FILTER_TC=filt)
+
+
+    def update(self, **changes):
+        """
+        Change keywords and rebuild only the parts that depend on them
+
+        Each product of the optical train (wavelength grid, transmission
+        curves, thermal photons, PSF, ADC shifts, jitter PSF) is remade only
+        if a keyword it depends on has changed, or if a product it is made
+        from has changed. Parameter sweeps therefore only pay for what
+        actually changes, e.g. a new ``SCOPE_TEMPERATURE`` doesn't remake the
+        PSF cube. If the new set of keywords is in the on-disk cache, the
+        optical train is loaded from there instead.
+
+        Parameters
+        ----------
+        **changes
+            keyword-value pairs from the configuration files, e.g.
+            ``OBS_SEEING=0.6`` or ``INST_FILTER_TC="J"``
+
+        Raises
+        ------
+        KeyError
+            If a keyword is not in ``self.cmds``
+
+        See Also
+        --------
+        .commands.UserCommands
+
+        Examples
+        --------
+        ::
+
+            >>> opt_train = simcado.OpticalTrain(cmds)
+            >>> for temp in [-5, 0, 5, 10]:
+            ...     opt_train.update(SCOPE_TEMPERATURE=temp)
+            ...     print(opt_train.n_ph_mirror)
+
+        """
+        if not changes:
+            return
+
+        before = dict(self.cmds.cmds)
+        self.cmds.update(changes)
+        changed = [key for key, val in self.cmds.cmds.items()
+                   if key not in before or not _same_value(before[key], val)]
+        if not changed:
+            return
+
+        # the atmospheric curve was loaded for the old airmass
+        tc_atmo = self.cmds["ATMO_TC"]
+        if "ATMO_AIRMASS" in changed and \
+                isinstance(tc_atmo, sc.TransmissionCurve) and \
+                tc_atmo.params["airmass"] is not None:
+            self.cmds["ATMO_TC"] = tc_atmo.params["filename"]
+
+        cache_file = _cache_filename(self.cmds)
+        if cache_file is not None and self._read_cache(cache_file):
+            return
+
+        stale = set()
+        for key in changed:
+            nodes = _dependent_nodes(key)
+            if nodes is None:
+                logging.debug("[OpticalTrain] " + key + " forces a rebuild")
+                stale = set(name for name, _, _ in _OPT_TRAIN_NODES)
+                break
+            stale.update(nodes)
+
+        remade = set()
+        for name, _, upstream in _OPT_TRAIN_NODES:
+            if name not in stale and not remade.intersection(upstream):
+                continue
+            # _gen_all_tc also makes the thermal photons
+            if name == "thermal" and "tc" in remade:
+                continue
+
+            if self.cmds.verbose:
+                print("Updating " + name)
+            logging.debug("[OpticalTrain] Updating " + name)
+
+            if name == "lam":
+                old_grid = (self.lam, self.lam_bin_edges, self.pix_res)
+                self._gen_lam_grid()
+                new_grid = (self.lam, self.lam_bin_edges, self.pix_res)
+                if all(np.array_equal(old, new)
+                       for old, new in zip(old_grid, new_grid)):
+                    continue
+            elif name == "tc":
+                self._load_all_tc()
+                self._gen_all_tc()
+            elif name == "thermal":
+                self._gen_mirror_photons()
+            elif name == "psf":
+                self.psf = self._gen_master_psf()
+            elif name == "adc_shifts":
+                self.adc_shifts = self._gen_adc_shifts()
+            elif name == "jitter_psf":
+                self.jitter_psf = self._gen_telescope_shake()
+
+            remade.add(name)
+
+        self.n_ph_bg = self.n_ph_atmo + self.n_ph_mirror + self.n_ph_ao
+
+        if cache_file is not None:
+            self._write_cache(cache_file)
 
 
     def read(self, filename):
-        pass
+        """Load a pickled :class:`.OpticalTrain` from ``filename``"""
+        with open(filename, "rb") as fp1:
+            opt_train = pickle.load(fp1)
+        self.__dict__.update(opt_train.__dict__)
 
     def save(self, filename):
-        pass
+        """Save the :class:`.OpticalTrain` to ``filename`` as a pickle"""
+        with open(filename, "wb") as fp1:
+            pickle.dump(self, fp1, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _read_cache(self, cache_file):
+        """
+        Load the optical train from the cache. Returns False on a cache miss
+
+        Only the keywords that went into the cache key are taken from the
+        cached commands. All others keep their current values
+        """
+        if not os.path.exists(cache_file):
+            return False
+
+        cmds = self.cmds
+        try:
+            self.read(cache_file)
+        except Exception as err:
+            warnings.warn("Ignoring unreadable cache file " + cache_file +
+                          ": " + str(err))
+            self.cmds = cmds
+            return False
+
+        cmds.cmds.update({key: val for key, val in self.cmds.cmds.items()
+                          if _affects_optical_train(key)})
+        self.cmds = cmds
+
+        # mark as recently used
+        os.utime(cache_file)
+        logging.debug("[OpticalTrain] Loaded from cache " + cache_file)
+
+        return True
+
+    def _write_cache(self, cache_file):
+        """
+        Save the optical train to the cache and evict old entries
+        """
+        cache_dir = os.path.dirname(cache_file)
+        try:
+            if not os.path.exists(cache_dir):
+                os.makedirs(cache_dir)
+
+            # write to a temporary file first, so that other processes never
+            # see a half-written cache file
+            fd, tmp_name = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+            os.close(fd)
+            self.save(tmp_name)
+            os.replace(tmp_name, cache_file)
+        except Exception as err:
+            warnings.warn("Could not cache the optical train: " + str(err))
+            return
+
+        _evict_cache(cache_dir, self.cmds["SIM_OPT_TRAIN_CACHE_SIZE"])
+
+
+    def _gen_lam_grid(self):
+        """
+        Copy the spectral and spatial sampling from the commands
+        """
+        self.lam_bin_edges = self.cmds.lam_bin_edges
+        self.lam_bin_centers = self.cmds.lam_bin_centers
+        self.pix_res = self.cmds.pix_res
+
+        self.lam = self.cmds.lam
+        self.lam_res = self.cmds.lam_res
 
 
     def apply_tracking(self, arr):
@@ -302,56 +499,63 @@ class OpticalTrain(object):
 
             tc_dict[coating] = sc.TransmissionCurve(tc_file)
 
-        # Follow the thermal flux through all the warm elements
-        total_flux = 0
-        if self.cmds.verbose:
-            print("Total flux init: " + str(total_flux))
-
         # The etendue is assumed to be conserved throughout the system.
         # We used to compute the solid angle at each mirror, given its area.
-        mirror = mirr_list[0]
-        etendue = (mirror['Outer']**2 - mirror['Inner']**2) * np.pi/4 \
-                  * self.pix_res**2
+        outer = np.asarray(mirr_list['Outer'], dtype=float)
+        inner = np.asarray(mirr_list['Inner'], dtype=float)
+        etendue = (outer[0]**2 - inner[0]**2) * np.pi/4 * self.pix_res**2
+
+        # mirror areas projected perpendicular to beam
+        area = (outer**2 - inner**2) * np.pi/4 \
+               * np.cos(np.deg2rad(np.asarray(mirr_list['Angle'], dtype=float)))
+        angle = np.sqrt(etendue / area)
 
         # Assume that all (warm) mirrors are at the same temperature)
         # Mirror specific temperatures could be taken from the list with
-        # temp = mirror['Temp'] within the loop
+        # temps = mirr_list['Temp']
         # NOTE: Should this be equal to ATMO_TEMPERATURE?
-        temp = self.cmds["SCOPE_TEMPERATURE"]
-
-        for mirror in mirr_list:
-            # mirror area projected perpendicular to beam
-            area = (mirror['Outer']**2 - mirror['Inner']**2) * np.pi/4 \
-                   * np.cos(np.deg2rad(mirror['Angle']))
-            angle = np.sqrt(etendue / area)
-
-            reflectivity = tc_dict[mirror['Coating']].val
-            emissivity = 1. - reflectivity
+        temps = [self.cmds["SCOPE_TEMPERATURE"]] * len(mirr_list)
+
+        # (n_mirror, n_lam) arrays of reflectivity and emitted photons
+        reflectivity = np.array([tc_dict[coating].val
+                                 for coating in mirr_list['Coating']])
+        unit_bb = [_thermal_spectrum(self.lam, temp) for temp in temps]
+        mirror_flux = np.array([bb.val for bb in unit_bb]) \
+                      * (area * angle**2)[:, None] * (1. - reflectivity)
+
+        # Follow the thermal flux through all the warm elements: the flux
+        # emitted by each mirror is reflected by all the mirrors after it
+        trans_after = np.ones_like(reflectivity)
+        trans_after[:-1] = np.cumprod(reflectivity[:0:-1], axis=0)[::-1]
+        total_flux = deepcopy(unit_bb[0])
+        total_flux.val = np.sum(mirror_flux * trans_after, axis=0)
+        total_flux.params.update({"pix_res": angle[0], "area": area[0]})
+
+        n_ph_thermal = total_flux.photons_in_range(self.lam_bin_edges[0],
+                                                   self.lam_bin_edges[-1])
 
-            mirror_flux = sc.BlackbodyCurve(lam=self.lam, temp=temp,
-                                            pix_res=angle, area=area) * \
-                                            emissivity
-
-            total_flux = mirror_flux + total_flux * reflectivity
-            n_ph_thermal = total_flux.photons_in_range(self.lam_bin_edges[0],
-                                                       self.lam_bin_edges[-1])
-
-            if self.cmds.verbose:
+        if self.cmds.verbose:
+            mask = (total_flux.lam >= self.lam_bin_edges[0]) * \
+                   (total_flux.lam < self.lam_bin_edges[-1])
+            emitted = np.sum(mirror_flux[:, mask], axis=1)
+            running = 0
+            for i, mirror in enumerate(mirr_list):
                 print("{0}: {1}   Mean reflectivity {2:.3f}".format(
                     mirror['Mirror'], mirror['Coating'],
-                    np.mean(reflectivity)))
+                    np.mean(reflectivity[i])))
+                running = mirror_flux[i] + running * reflectivity[i]
                 print("{0}: Emitted {1:.3f}     Total {2:.3f}".format(
-                    mirror['Mirror'],
-                    mirror_flux.photons_in_range(self.lam_bin_edges[0],
-                                                 self.lam_bin_edges[-1]),
-                    total_flux.photons_in_range(self.lam_bin_edges[0],
-                                                self.lam_bin_edges[-1])))
+                    mirror['Mirror'], emitted[i], np.sum(running[mask])))
 
         return n_ph_thermal, total_flux
 
 
     def _gen_all_tc(self):
 
+        # forget the resampled curves and products of previous calls
+        self._tc_resampled = {}
+        self._tc_products = {}
+
         ############## AO INSTRUMENT PHOTONS #########################
         if self.cmds.verbose:
             print("Generating AO module mirror emission photons")
@@ -401,19 +605,7 @@ class OpticalTrain(object):
         # Make the transmission curve for the blackbody photons from the mirror
         self.tc_mirror = self._gen_master_tc(preset="mirror")
 
-        if self.cmds["SCOPE_USE_MIRROR_BG"].lower() == "yes":
-            # KL - _gen_thermal_emission() returns the sum of all thermal photons
-            # not just the ones that pass through the system transmission curve
-            # Add the 3rd line here to correct this
-            self.n_ph_mirror, self.ec_mirror = self._gen_thermal_emission()
-            self.ph_mirror = self.ec_mirror * self.tc_mirror
-            self.n_ph_mirror = self.ph_mirror.photons_in_range(
-                self.lam_bin_edges[0],
-                self.lam_bin_edges[-1])
-        else:
-            self.ec_mirror = None
-            self.ph_mirror = None
-            self.n_ph_mirror = 0.
+        self._gen_mirror_photons()
 
 
         ############## ATMOSPHERIC PHOTONS #########################
@@ -506,6 +698,26 @@ class OpticalTrain(object):
         self.tc_source = self._gen_master_tc(preset="source")
 
 
+    def _gen_mirror_photons(self):
+        """
+        Thermal photons from the warm telescope mirrors that pass through the
+        system, i.e. ``ec_mirror``, ``ph_mirror`` and ``n_ph_mirror``
+        """
+        if self.cmds["SCOPE_USE_MIRROR_BG"].lower() == "yes":
+            # KL - _gen_thermal_emission() returns the sum of all thermal photons
+            # not just the ones that pass through the system transmission curve
+            # Add the 3rd line here to correct this
+            self.n_ph_mirror, self.ec_mirror = self._gen_thermal_emission()
+            self.ph_mirror = self.ec_mirror * self.tc_mirror
+            self.n_ph_mirror = self.ph_mirror.photons_in_range(
+                self.lam_bin_edges[0],
+                self.lam_bin_edges[-1])
+        else:
+            self.ec_mirror = None
+            self.ph_mirror = None
+            self.n_ph_mirror = 0.
+
+
     def _gen_master_tc(self, tc_keywords=None, preset=None):
         """
         Combine a list of TransmissionCurves into one, either by specifying the
@@ -558,7 +770,7 @@ class OpticalTrain(object):
 
         tc_dict = dict([])
 
-        for key in tc_keywords:
+        for key in Counter(tc_keywords):
             if key not in self.cmds.keys():
                 raise ValueError(key + " is not in your list of commands")
 
@@ -578,8 +790,15 @@ class OpticalTrain(object):
 
         tc_master = sc.UnityCurve(lam=self.lam, lam_res=self.lam_res,
                                   min_step=self.cmds["SIM_SPEC_MIN_STEP"])
-        for key in tc_keywords:
-            tc_master *= tc_dict[key]
+
+        if any(isinstance(tc, sc.EmissionCurve) for tc in tc_dict.values()):
+            # EmissionCurves take over the product - multiply one by one
+            for key in tc_keywords:
+                tc_master *= tc_dict[key]
+        else:
+            tc_master.val = tc_master.val * \
+                            self._tc_product(Counter(tc_keywords), tc_dict,
+                                             tc_master.lam)
 
         self.tc_keywords = tc_keywords
         self.tc_dict = tc_dict
@@ -587,6 +806,47 @@ class OpticalTrain(object):
         return tc_master
 
 
+    def _tc_product(self, counts, tc_dict, lam):
+        """
+        Product of the curves in ``tc_dict`` on the grid ``lam``, each raised
+        to the power of the number of times it appears in ``counts``
+
+        Each distinct curve is only resampled once. The products are kept so
+        that the presets, which contain each other, can build on the largest
+        product already made (e.g. "mirror" on "ao")
+        """
+        if not hasattr(self, "_tc_products") or \
+                not np.array_equal(getattr(self, "_tc_lam", None), lam):
+            self._tc_resampled = {}
+            self._tc_products = {}
+            self._tc_lam = lam
+
+        factors = {(key, id(tc_dict[key])): n for key, n in counts.items()}
+
+        # start from the largest product that is part of this one
+        done, prod = {}, np.ones(len(lam))
+        for items, val in self._tc_products.items():
+            sub = dict(items)
+            if sum(sub.values()) > sum(done.values()) and \
+               all(factors.get(fac, 0) >= n for fac, n in sub.items()):
+                done, prod = sub, val
+
+        for fac, n in factors.items():
+            if n > done.get(fac, 0):
+                if fac not in self._tc_resampled:
+                    tc = tc_dict[fac[0]]
+                    if len(tc.lam) != len(lam) or np.any(tc.lam != lam):
+                        tc.resample(lam)
+                    # keep a reference to tc so that its id isn't reused
+                    self._tc_resampled[fac] = (tc, np.copy(tc.val))
+                val = self._tc_resampled[fac][1]
+                prod = prod * val**(n - done.get(fac, 0))
+
+        self._tc_products[frozenset(factors.items())] = prod
+
+        return prod
+
+
     def _gen_master_psf(self):
         """
         Import or make a master PSF for the system.
@@ -615,18 +875,24 @@ class OpticalTrain(object):
             Generating Moffat profile from with FWHM = OBS_SEEING""")
             logging.debug("No PSF Given: making Seeing PSF")
 
-            hdulist = fits.HDUList()
-            for lam in self.cmds.lam_bin_centers:
-
-                psf_mo = psf.seeing_psf(fwhm=self.cmds["OBS_SEEING"],
-                                        size=self.cmds["SIM_PSF_SIZE"],
-                                        pix_res=self.cmds["SIM_DETECTOR_PIX_SCALE"],
-                                        psf_type="moffat", filename=None)
+            # The seeing PSF doesn't depend on wavelength, so all slices share
+            # a single PSF object
+            psf_mo = psf.seeing_psf(fwhm=self.cmds["OBS_SEEING"],
+                                    size=self.cmds["SIM_PSF_SIZE"],
+                                    pix_res=self.cmds["SIM_DETECTOR_PIX_SCALE"],
+                                    psf_type="moffat", filename=None)
 
-                psf_mo[0].header["WAVELENG"] = lam
-                hdulist.append(psf_mo[0])
+            hdr = psf_mo[0].header
+            psf_slice = psf.PSF(size=hdr["NAXIS1"], pix_res=hdr["CDELT1"])
+            psf_slice.set_array(psf_mo[0].data)
+            psf_slice.info["Type"] = hdr["PSF_TYPE"]
+            psf_slice.info["description"] = "Seeing PSF, FWHM = " + \
+                                            str(hdr["FWHM"]) + " arcsec"
 
-            psf_m1 = psf.UserPSFCube(hdulist, self.lam_bin_centers)
+            psf_m1 = psf.PSFCube(self.lam_bin_centers, psf_slices=psf_slice)
+            psf_m1.size = [psf_slice.size] * len(psf_m1)
+            psf_m1.info["description"] = "Seeing PSF cube from OBS_SEEING"
+            psf_m1.info["Type"] = psf_slice.info["Type"] + "Cube"
 
 
         elif isinstance(self.cmds["SCOPE_PSF_FILE"], psf.PSFCube):
@@ -641,7 +907,8 @@ class OpticalTrain(object):
                 #logging.debug("Using PSF: " + self.cmds["SCOPE_PSF_FILE"])
 
                 psf_m1 = psf.UserPSFCube(self.cmds["SCOPE_PSF_FILE"],
-                                         self.lam_bin_centers)
+                                         self.lam_bin_centers,
+                                         size=self.cmds["SIM_PSF_SIZE"])
 
                 if psf_m1[0].pix_res != self.pix_res:
                     psf_m1.resample(self.pix_res)
@@ -655,6 +922,41 @@ class OpticalTrain(object):
                                           size=9)
                 logging.debug("Couldn't resolve given PSF: making Delta PSF")
 
+        if self.cmds["SIM_PSF_EE_FRACTION"] is not None:
+            psf_m1 = self._truncate_psf(psf_m1)
+
+        return psf_m1
+
+
+    def _truncate_psf(self, psf_m1):
+        """
+        Crop the PSF slices to the radius holding ``SIM_PSF_EE_FRACTION`` of
+        the energy, which makes the convolutions in ``image_in_range`` cheaper
+
+        The new size and lost flux of each slice are logged, and printed if
+        ``SIM_VERBOSE`` is "yes"
+
+        """
+        halo = self.cmds["SIM_PSF_EE_HALO"] == "yes"
+
+        # don't change a PSFCube which was passed in with SCOPE_PSF_FILE
+        psf_m1 = copy(psf_m1)
+        psf_m1.truncate(self.cmds["SIM_PSF_EE_FRACTION"], halo=halo)
+
+        reported = set()
+        for lam, psf_i in zip(psf_m1.lam_bin_centers, psf_m1.psf_slices):
+            if id(psf_i) in reported:
+                continue
+            reported.add(id(psf_i))
+
+            msg = "PSF at %.3f um truncated to %d pixels, flux %s: %.2e" % \
+                  (lam, psf_i.info["ee_size"],
+                   "moved to halo" if halo else "lost",
+                   psf_i.info["ee_flux_lost"])
+            logging.debug(msg)
+            if self.cmds.verbose:
+                print(msg)
+
         return psf_m1
 
 
@@ -679,7 +981,158 @@ class OpticalTrain(object):
         return jitter_psf
 
 
+# The products of an OpticalTrain in the order they are made, the keywords
+# they are made from and the products they are made from. Keywords ending in
+# "_" stand for all keywords with this prefix. Exact keywords take precedence
+# over prefixes, e.g. SCOPE_TEMPERATURE only changes the thermal photons,
+# and longer prefixes take precedence over shorter ones.
+# The "cmds" keywords aren't used to make any product, they are read from the
+# commands when the optical train is applied or by the detector
+_OPT_TRAIN_NODES = [
+    ("lam", ("INST_FILTER_TC", "SIM_USE_FILTER_LAM", "SIM_FILTER_THRESHOLD",
+             "SIM_LAM_MIN", "SIM_LAM_MAX", "SIM_LAM_TC_BIN_WIDTH",
+             "SIM_DETECTOR_PIX_SCALE", "SIM_OVERSAMPLING",
+             "SIM_ADC_SHIFT_THRESHOLD", "INST_ADC_PERFORMANCE",
+             "ATMO_AIRMASS", "OBS_ZENITH_DIST", "ATMO_TEMPERATURE",
+             "ATMO_REL_HUMIDITY", "ATMO_PRESSURE", "SCOPE_LATITUDE",
+             "SCOPE_ALTITUDE"), ()),
+    ("tc", ("ATMO_", "SCOPE_", "INST_", "FPA_QE", "SIM_SPEC_MIN_STEP",
+            "SIM_DETECTOR_PIX_SCALE", "SIM_OVERSAMPLING", "INST_FILTER_TC",
+            "ATMO_AIRMASS", "OBS_ZENITH_DIST"), ("lam",)),
+    ("thermal", ("SCOPE_TEMPERATURE", "SCOPE_USE_MIRROR_BG",
+                 "SCOPE_MIRROR_LIST"), ("lam", "tc")),
+    ("psf", ("SCOPE_PSF_FILE", "OBS_SEEING", "SIM_PSF_SIZE",
+             "SIM_PSF_EE_FRACTION", "SIM_PSF_EE_HALO",
+             "SIM_DETECTOR_PIX_SCALE"), ("lam",)),
+    ("adc_shifts", ("OBS_PARALLACTIC_ANGLE", "INST_ADC_PERFORMANCE",
+                    "ATMO_AIRMASS", "OBS_ZENITH_DIST", "ATMO_TEMPERATURE",
+                    "ATMO_REL_HUMIDITY", "ATMO_PRESSURE", "SCOPE_LATITUDE",
+                    "SCOPE_ALTITUDE"), ("lam",)),
+    ("jitter_psf", ("SCOPE_JITTER_FWHM",), ("lam",)),
+    ("cmds", ("SCOPE_DRIFT_", "INST_DEROT_", "INST_FLAT_FIELD",
+              "INST_DISTORTION_MAP", "INST_TEMPERATURE", "SCOPE_LONGITUDE",
+              "SCOPE_AO_EFFECTIVENESS", "SCOPE_STREHL_RATIO", "ATMO_PWV",
+              "OBS_ALT", "OBS_AZ", "OBS_RA", "OBS_DEC", "OBS_DATE",
+              "OBS_TIME", "OBS_FIELD_ROTATION", "SIM_PIXEL_THRESHOLD",
+              "SIM_LAM_PSF_BIN_WIDTH", "SIM_PSF_OVERSAMPLE", "PSF_MODE",
+              "SPEC_"), ())]
+
+
+def _dependent_nodes(key):
+    """
+    Returns the names of the optical train products made from keyword
+    ``key``, or None if it is unknown which products depend on ``key``
+    """
+    if not _affects_optical_train(key):
+        return []
+
+    nodes = [name for name, keys, _ in _OPT_TRAIN_NODES if key in keys]
+    if not nodes:
+        # the longest matching prefix wins, e.g. SCOPE_DRIFT_ over SCOPE_
+        prefixes = [pre for _, keys, _ in _OPT_TRAIN_NODES for pre in keys
+                    if pre.endswith("_") and key.startswith(pre)]
+        if not prefixes:
+            return None
+        pre = max(prefixes, key=len)
+        nodes = [name for name, keys, _ in _OPT_TRAIN_NODES if pre in keys]
+
+    return [name for name in nodes if name != "cmds"]
+
+
+def _same_value(val1, val2):
+    """
+    True if two keyword values are the same object or compare equal
+    """
+    if val1 is val2:
+        return True
+    try:
+        return bool(val1 == val2)
+    except Exception:
+        return False
+
+
 ## note: 'filter' redefines a built-in and should not be used
+def _affects_optical_train(key):
+    """
+    Returns False for keywords that are only used by the detector, for the
+    output or for bookkeeping, i.e. that can be ignored by the cache
+    """
+    if key == "FPA_QE":
+        return True
+
+    ignored = ("FPA_", "HXRG_", "SIM_OPT_TRAIN_", "SIM_DETECTOR_IN_PATH",
+               "SIM_DETECTOR_OUT_PATH", "SIM_ASYNC_IO", "SIM_VERBOSE",
+               "SIM_SIM_MESSAGE_LEVEL", "OBS_EXPTIME", "OBS_NDIT",
+               "OBS_NONDESTRUCT_TRO", "OBS_REMOVE_CONST_BG", "OBS_READ_MODE",
+               "OBS_SAVE_ALL_FRAMES", "OBS_INPUT_SOURCE_PATH", "OBS_FITS_",
+               "OBS_OUTPUT_DIR", "CONFIG_")
+
+    return not key.startswith(ignored)
+
+
+def _cache_filename(cmds):
+    """
+    Returns the path of the cache file for the optical train made by ``cmds``
+
+    The file name is the hash of all relevant keyword values, the paths and
+    modification times of all files they refer to and the SimCADO version.
+    Returns None if the cache is switched off or if a value can't be hashed
+    """
+    import simcado as sim
+
+    cache_dir = cmds["SIM_OPT_TRAIN_CACHE_DIR"]
+    if cache_dir is None:
+        return None
+
+    sha = hashlib.sha1(str(sim.__version__).encode())
+    for key in sorted(cmds.keys()):
+        if not _affects_optical_train(key):
+            continue
+
+        val = cmds[key]
+        if isinstance(val, str) and os.path.isfile(val):
+            stat = os.stat(val)
+            val = (os.path.abspath(val), stat.st_mtime, stat.st_size)
+
+        if isinstance(val, (str, int, float, bool, tuple, type(None))):
+            val = repr(val).encode()
+        else:
+            # objects like TransmissionCurves or PSFCubes
+            try:
+                val = pickle.dumps(val, protocol=pickle.HIGHEST_PROTOCOL)
+            except Exception:
+                return None
+
+        sha.update(key.encode())
+        sha.update(val)
+
+    return os.path.join(os.path.expanduser(cache_dir),
+                        "opt_train_" + sha.hexdigest() + ".pkl")
+
+
+def _evict_cache(cache_dir, max_size):
+    """
+    Delete the least recently used cache files until the cache is smaller
+    than ``max_size`` [MB]
+    """
+    _evict_lru(glob.glob(os.path.join(cache_dir, "opt_train_*.pkl")), max_size)
+
+
+def _thermal_spectrum(lam, temp):
+    """
+    Returns the memoised BlackbodyCurve for an area of 1 m2 and 1 arcsec2
+
+    The curves scale linearly with area and solid angle, so one curve per
+    temperature and wavelength grid serves all warm mirrors of all optical
+    trains in the session, e.g. when sweeping ``SCOPE_TEMPERATURE``
+    """
+    key = (float(temp), lam.tobytes())
+    if key not in __thermal_cache__:
+        __thermal_cache__[key] = sc.BlackbodyCurve(lam=lam, temp=temp,
+                                                   pix_res=1., area=1.)
+    return __thermal_cache__[key]
+
+
 def get_filter_curve(filter_name):
     """
     Return a Vis/NIR broadband filter TransmissionCurve object
@@ -101,12 +101,21 @@ convolution of a list of PSF components
 
 """
 
+import os
+import glob
+import json
+import hashlib
+import tempfile
 import warnings
-from copy import deepcopy
+from copy import copy, deepcopy
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
 import scipy.ndimage.interpolation as spi
 from scipy.signal import fftconvolve
+from scipy import fft as spfft
+from scipy import sparse
 
 from astropy.io import fits
 #from astropy import units as u   ## unused (OC)
@@ -118,11 +127,7 @@ from astropy.modeling.parameters import Parameter
 
 from . import utils
 
-try:
-    import poppy
-except:
-    warnings.warn("""Poppy is not installed. Functions beginning with "poppy_"
-                  will not work. See http://pythonhosted.org/poppy/""")
+# poppy is optional and only imported by the functions that need it
 
 
 ## TODO
@@ -136,11 +141,24 @@ __all__ = ["PSF", "PSFCube",
            "GaussianPSF", "GaussianPSFCube",
            "DeltaPSF", "DeltaPSFCube",
            "CombinedPSF", "CombinedPSFCube",
-           "UserPSF", "UserPSFCube",
+           "UserPSF", "UserPSFCube", "PSFLibrary",
            #"poppy_eelt_psf", "poppy_ao_psf", "seeing_psf",
            "get_eelt_segments", "make_foreign_PSF_cube"
            ]
 
+# Analytic PSF arrays already generated, keyed on the parameters which define
+# them. The arrays are read-only so that they can be shared between PSFs
+__psf_cache__ = {}
+
+# Slices of PSF files resampled to a new pixel scale, keyed on the file, the
+# extension, the crop size and the pixel scales. The arrays are read-only. The
+# least recently used slices are dropped beyond _RESAMPLE_CACHE_SIZE [MB]
+__resample_cache__ = {}
+_RESAMPLE_CACHE_SIZE = 256
+
+# Number of transforms of different shapes which a PSF keeps for convolutions
+_OTF_CACHE_SIZE = 2
+
 
 
 ###############################################################################
@@ -181,6 +199,89 @@ class PSF(object):
     def __str__(self):
         return self.info['description']
 
+    @property
+    def array(self):
+        """
+        The PSF image. A PSF made by convolution is kept as the product of
+        the transforms of its components until the pixels are first used.
+        Assign a new array instead of changing it in place, so that the cached
+        transforms are dropped
+        """
+        if self._array is None and self._transfer is not None:
+            otf, fft_shape, _ = self._transfer
+            arr = spfft.irfft2(otf, s=fft_shape)
+            self._array = _normalised(arr[_wrapped_index(self.shape,
+                                                         fft_shape)])
+        return self._array
+
+    @array.setter
+    def array(self, array):
+        self._array = array
+        self._transfer = None
+        self._otf_cache = {}
+
+    def otf(self, fft_shape):
+        """
+        Returns the real FFT of the PSF, zero-padded to ``fft_shape``
+
+        Pixel ``((ny-1)//2, (nx-1)//2)`` of the array is moved to the origin,
+        so that the product with the transform of an image is the same as
+        ``fftconvolve(image, self.array, mode="same")``. The transforms of the
+        last ``_OTF_CACHE_SIZE`` shapes are kept
+
+        Parameters
+        ----------
+        fft_shape : tuple
+            [pixel] (ny, nx) of the padded array, at least ``self.shape``
+
+        Returns
+        -------
+        otf : np.ndarray
+            complex array of shape ``(ny, nx // 2 + 1)``
+
+        """
+        fft_shape = tuple(int(n) for n in fft_shape)
+        if self._transfer is not None and self._transfer[1] == fft_shape:
+            return self._transfer[0]
+
+        if fft_shape not in self._otf_cache:
+            array = self.array
+            padded = np.zeros(fft_shape, dtype=np.result_type(array.dtype,
+                                                              np.float32))
+            padded[_wrapped_index(array.shape, fft_shape)] = array
+            if len(self._otf_cache) >= _OTF_CACHE_SIZE:
+                self._otf_cache.pop(next(iter(self._otf_cache)))
+            self._otf_cache[fft_shape] = spfft.rfft2(padded)
+
+        return self._otf_cache[fft_shape]
+
+    def _support(self):
+        """Returns the (ny, nx) extent of the PSF, before any cropping"""
+        if self._transfer is not None:
+            return self._transfer[2]
+        return tuple(self.shape)
+
+    def _set_transfer(self, otf, fft_shape, support, shape):
+        """Keep the PSF as a transform, with an array of ``shape`` pixels"""
+        self._array = None
+        self._transfer = (otf, tuple(fft_shape), tuple(support))
+        self._otf_cache = {}
+        self.shape = tuple(int(n) for n in shape)
+        self.size = self.shape[0]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_otf_cache"] = {}
+        return state
+
+    def __setstate__(self, state):
+        # PSFs pickled before the array became a property
+        if "array" in state:
+            state["_array"] = state.pop("array")
+        state.setdefault("_transfer", None)
+        state.setdefault("_otf_cache", {})
+        self.__dict__.update(state)
+
     def set_array(self, array, threshold=1e-15):
         """
         Set the spatial flux distribution array for the PSF
@@ -196,9 +297,7 @@ class PSF(object):
             by default set to 1E-15. Below this, the array is set to 0
 
         """
-        self.array = array.astype(np.float32)
-        self.array[self.array <= 0] = threshold
-        self.array = self.array / np.sum(self.array)
+        self.array = _normalised(array, threshold)
         self.size = self.array.shape[0]
         self.shape = self.array.shape
 
@@ -225,7 +324,10 @@ class PSF(object):
         """
         Resample the PSF array onto a new grid
 
-        Not perfect, but conserves flux
+        The flux of each old pixel is shared out among the new pixels it
+        overlaps, separately along each axis. The centres of the old and new
+        arrays coincide and the new array always has an odd side length, so
+        that its centre is a pixel
 
         Parameters
         ----------
@@ -242,28 +344,75 @@ class PSF(object):
             >>> new_PSF = old_PSF.resample(new_pix_res)
 
         """
-        scale_factor = self.pix_res / np.float(new_pix_res)
-        new_arr = spi.zoom(self.array, scale_factor, order=1)
-        new_arr *= np.sum(self.array) / np.sum(new_arr)
-
-        # catch any even-numbered arrays
-        if new_arr.shape[0] % 2 == 0:
-            tmp_arr = np.zeros((new_arr.shape[0]+1, new_arr.shape[1]+1))
-            tmp_arr[:new_arr.shape[0], :new_arr.shape[1]] = new_arr
-            new_arr = spi.shift(tmp_arr, 0.5, order=5)
+        new_arr = _resample_array(self.array, self.pix_res / float(new_pix_res))
 
         ############################################################
         # Not happy with the way the returned type is not the same #
         # as the original type. The new object is a plain PSF      #
         ############################################################
         psf_new = PSF(size=new_arr.shape[0], pix_res=new_pix_res)
+        psf_new.info = deepcopy(self.info)
         psf_new.set_array(new_arr)
         return psf_new
 
+    def truncate(self, ee_fraction, halo=False):
+        """
+        Crop the PSF to the radius which encircles a fraction of its energy
+
+        Parameters
+        ----------
+        ee_fraction : float
+            [0..1] the fraction of the flux inside the radius, e.g. 0.999.
+            The radius is measured from the centre of the array
+        halo : bool, optional
+            Default False. If False, the flux outside the radius is dropped,
+            i.e. the new array sums to less than 1. If True, the new array is
+            normalised to the flux inside the radius and the flux outside is
+            kept in ``info["halo"]``, to be spread evenly over the image
+
+        Returns
+        -------
+        psf_new : PSF
+            a PSF of side length ``2 * radius + 1``, at most the old size.
+            ``info["ee_size"]`` holds the new size in pixels and
+            ``info["ee_flux_lost"]`` the fraction of the flux outside it
+
+        """
+        total = np.sum(self.array, dtype=np.float64)
+        ny, nx = self.array.shape
+        cy, cx = ny // 2, nx // 2
+
+        # encircled energy for integer radii from the centre
+        yy, xx = np.ogrid[:ny, :nx]
+        radius = np.ceil(np.hypot(yy - cy, xx - cx)).astype(int)
+        ee = np.cumsum(np.bincount(radius.ravel(),
+                                   weights=self.array.ravel())) / total
+
+        r = int(np.searchsorted(ee, ee_fraction))
+        r = min(r, cy, cx, (ny - 1) - cy, (nx - 1) - cx)
+        window = self.array[cy - r:cy + r + 1, cx - r:cx + r + 1]
+        flux_lost = max(1. - np.sum(window, dtype=np.float64) / total, 0.)
+
+        psf_new = copy(self)
+        psf_new.info = deepcopy(self.info)
+        psf_new.set_array(window)
+        psf_new.info["ee_size"] = psf_new.size
+        psf_new.info["ee_flux_lost"] = flux_lost
+        if halo:
+            psf_new.info["halo"] = flux_lost
+        else:
+            psf_new.array *= np.float32(1. - flux_lost)
+
+        return psf_new
+
     def convolve(self, kernel):
         """
         Convolve the PSF with another kernel. The PSF keeps its shape
 
+        The new PSF is the product of the transforms of the two PSFs. Its
+        pixels are only computed when ``array`` is used, so that a chain of
+        convolutions costs one multiplication per step
+
         Parameters
         ----------
         kernel : np.array, PSF
@@ -274,14 +423,18 @@ class PSF(object):
         psf_new : PSF
 
         """
-        psf_new = deepcopy(self)
-
-        if issubclass(type(kernel), PSF):
-            psf_new.set_array(fftconvolve(self.array, kernel.array, mode="same"))
-            #psf_new.set_array(convolve_fft(self.array, kernel.array))
-        else:
-            psf_new.set_array(fftconvolve(self.array, kernel, mode="same"))
-            #psf_new.set_array(convolve_fft(self.array, kernel))
+        kernel = _as_psf(kernel, self.pix_res)
+        support = [n + k - 1 for n, k in zip(self._support(),
+                                             kernel._support())]
+        fft_shape = _fft_shape(support)
+        if self._transfer is not None and \
+                all(np.less_equal(support, self._transfer[1])):
+            fft_shape = self._transfer[1]
+
+        psf_new = copy(self)
+        psf_new.info = deepcopy(self.info)
+        psf_new._set_transfer(self.otf(fft_shape) * kernel.otf(fft_shape),
+                              fft_shape, support, self.shape)
         psf_new.info["Type"] = "Combined"
 
         return psf_new
@@ -555,7 +708,7 @@ class MoffatPSF(PSF):
         super(MoffatPSF, self).__init__(size, pix_res)
 
         beta = 4.765 ### Trujillo et al. 2001
-        alpha = self.fwhm/(2 * np.sqrt(2**(1/beta) - 1))
+        alpha = self.fwhm / self.pix_res / (2 * np.sqrt(2**(1/beta) - 1))
         self.info["Type"] = "Moffat"
         self.info['description'] = "Moffat PSF, FWHM = %.1f, alpha = %.1f"\
                                        % (self.fwhm * 1E3, alpha)
@@ -602,19 +755,22 @@ class CombinedPSF(PSF):
                                         if psf.info["Type"] == "Delta"])
         size += 2 * np.max(shifts)
 
-        arr_tmp = np.zeros((size, size))
-        arr_tmp[size // 2, size // 2] = 1
+        size = int(size)
 
-        for psf in psf_list:
-            arr_tmp = fftconvolve(arr_tmp, psf.array, mode="same")
-            #arr_tmp = convolve_fft(arr_tmp, psf.array)
+        # the transforms are padded to the full extent of the convolution
+        support = np.sum([psf._support() for psf in psf_list], axis=0) \
+                  - len(psf_list) + 1
+        fft_shape = _fft_shape(np.maximum(support, size))
+        otf = psf_list[0].otf(fft_shape)
+        for psf in psf_list[1:]:
+            otf = otf * psf.otf(fft_shape)
 
-
-        super(CombinedPSF, self).__init__(size, pix_res)
+        super(CombinedPSF, self).__init__(0, pix_res)
         self.info["Type"] = "Combined"
         self.info['description'] = "Combined PSF from " + str(len(psf_list)) \
                                                                 + "PSF objects"
-        self.set_array(arr_tmp)
+        self._set_transfer(otf, fft_shape, np.maximum(support, size),
+                           (size, size))
 
 
 
@@ -713,6 +869,10 @@ class PSFCube(object):
     ----------
     lam_bin_centers : array
         [um] the centre of each wavelength slice
+    psf_slices : PSF, list, optional
+        Default None. A single PSF is shared by all wavelength slices. A list
+        holds one PSF per slice, where the same PSF object may appear several
+        times
 
     Notes
     -----
@@ -721,20 +881,90 @@ class PSFCube(object):
       is called, self[i] will return the array associated with the instance
       e.g plt.imshow(self[i]) will plot PSF.array from self.psf_slices[i]
     - Maths operators \*,\+,\- act equally on all PSF.arrays in self.psf_slices
+    - Slices which are the same object, e.g. a wavelength independent seeing
+      PSF, are processed once by the methods here and are never changed in
+      place for only some of the wavelengths. Consumers can test
+      ``self[i] is self[j]`` to reuse work done for an identical slice
 
 
     """
 
-    def __init__(self, lam_bin_centers):
+    def __init__(self, lam_bin_centers, psf_slices=None):
 
         self.lam_bin_centers = lam_bin_centers
-        self.psf_slices = [None] * len(lam_bin_centers)
+        if isinstance(psf_slices, PSF):
+            self.psf_slices = [psf_slices] * len(lam_bin_centers)
+        elif psf_slices is not None:
+            if len(psf_slices) != len(lam_bin_centers):
+                raise ValueError("Number of PSFs must equal number of "
+                                 "wavelength slices")
+            self.psf_slices = list(psf_slices)
+        else:
+            self.psf_slices = [None] * len(lam_bin_centers)
+
+        # (lam, y, x) array, if the slices are views of one array
+        self.array = None
 
         self.info = dict([])
         self.info['created'] = 'yes'
         self.info['description'] = "Point spread function (multiple layer)"
 
 
+    def set_array(self, array, pix_res, threshold=1e-15, slice_info=None):
+        """
+        Set the PSFs of all slices from one (lam, y, x) array
+
+        The array is kept as ``self.array`` and each slice is a PSF object
+        holding a view of its layer. Each layer is renormalised like
+        :meth:`PSF.set_array`
+
+        Parameters
+        ----------
+        array : np.ndarray
+            the PSF cube with one layer per wavelength slice
+        pix_res : float
+            [arcsec] the pixel scale of the array
+        threshold : float
+            by default set to 1E-15. Below this, the array is set to 0
+        slice_info : list, optional
+            a dictionary of ``info`` entries for each slice
+
+        """
+        self.array = np.asarray(array, dtype=np.float32)
+        self.array[self.array <= 0] = threshold
+        self.array /= np.sum(self.array, axis=(1, 2))[:, None, None]
+
+        self.psf_slices = []
+        for i, layer in enumerate(self.array):
+            psf = PSF(size=0, pix_res=pix_res)
+            psf.array, psf.size, psf.shape = layer, layer.shape[0], layer.shape
+            if slice_info is not None:
+                psf.info.update(slice_info[i])
+            self.psf_slices += [psf]
+        self.size = [psf.size for psf in self.psf_slices]
+
+    def _set_analytic_array(self, psf_type, pix_res, size, mode=None,
+                            obscuration=0.):
+        """
+        Evaluate an analytic PSF for all ``self.fwhm`` at once
+
+        ``mode`` defaults to the choice of the single PSF classes, i.e.
+        "linear_interp" for arrays larger than 100 pixels, else "oversample"
+        """
+        if mode is None:
+            mode = "linear_interp" if size > 100 else "oversample"
+
+        array = _analytic_psf_array(psf_type, self.fwhm, pix_res, size, mode,
+                                    obscuration=obscuration)
+
+        name = psf_type.capitalize()
+        slice_info = [{"Type"        : name,
+                       "description" : "%s PSF, FWHM = %.1f mas" % (name,
+                                                                   f * 1E3),
+                       "fwhm"        : f * 1E3,
+                       "mode"        : mode} for f in self.fwhm]
+        self.set_array(array, pix_res, slice_info=slice_info)
+
     def resize(self, new_size):
         """
         Resize the list of PSFs. The target shape is (new_size, new_size).
@@ -745,8 +975,9 @@ class PSFCube(object):
             [pixel] the new size of the PSF array in pixels
 
         """
-        for psf in self.psf_slices:
+        for psf in self.unique_slices():
             psf.resize(new_size)
+        self.array = None
 
     def resample(self, new_pix_res):
         """
@@ -771,7 +1002,9 @@ class PSFCube(object):
         """
 
         ## TODO: Check whether this makes sense
-        self.psf_slices = [psf.resample(new_pix_res) for psf in self.psf_slices]
+        self.psf_slices = self._map_slices(lambda psf, res: psf.resample(res),
+                                           [new_pix_res] * len(self))
+        self.array = None
 
     def export_to_fits(self, filename, clobber=True):
         """
@@ -810,6 +1043,28 @@ class PSFCube(object):
         ext_list.writeto(filename, clobber=clobber, checksum=True)
 
 
+    def truncate(self, ee_fraction, halo=False):
+        """
+        Crop each PSF to the radius which encircles a fraction of its energy
+
+        See :meth:`PSF.truncate`. The PSFs of the slices may end up with
+        different sizes
+
+        Parameters
+        ----------
+        ee_fraction : float
+            [0..1] the fraction of the flux inside the radius, e.g. 0.999
+        halo : bool, optional
+            Default False. If True, the flux outside the radius is kept in
+            ``info["halo"]`` of each PSF instead of being dropped
+
+        """
+        self.psf_slices = self._map_slices(
+            lambda psf, frac: psf.truncate(frac, halo=halo),
+            [ee_fraction] * len(self))
+        self.size = [psf.size for psf in self.psf_slices]
+        self.array = None
+
     def convolve(self, kernel_list):
         """
         Convolve a list of PSFs with a list of kernels
@@ -825,9 +1080,15 @@ class PSFCube(object):
                   "len(kernel_list):", len(kernel_list))
             raise ValueError("Number of kernels must equal number of PSFs")
 
-        for i in np.arange(len(self.psf_slices)):
-            tmp = self.psf_slices[i].convolve(kernel_list[i])
-            self.psf_slices[i].set_array(tmp.array)
+        # arrays become PSFs once, so that their transforms are shared
+        kernels = {}
+        for psf, kernel in zip(self.psf_slices, kernel_list):
+            if id(kernel) not in kernels:
+                kernels[id(kernel)] = _as_psf(kernel, psf.pix_res)
+
+        self.psf_slices = self._map_slices(
+            lambda psf, k: psf.convolve(kernels[id(k)]), kernel_list)
+        self.array = None
         self.info["Type"] = "Complex"
 
 
@@ -849,22 +1110,43 @@ class PSFCube(object):
         i = utils.nearest(self.lam_bin_centers, lam)
         return self.psf_slices[i]
 
+    def unique_slices(self):
+        """
+        Returns the distinct PSF objects in the cube, in order of first use
 
-    def __str__(self):
-        return self.info['description']
+        Returns
+        -------
+        psf_slices : list
+            PSF objects shared by several wavelength slices appear only once
 
-    def __getitem__(self, i):
-        if len(self.psf_slices) > 1:
-            return self.psf_slices[i]
-        else:
-            return self.psf_slices[0]
+        """
+        unique = {}
+        for psf in self.psf_slices:
+            unique.setdefault(id(psf), psf)
 
-    def __len__(self):
-        return len(self.psf_slices)
+        return list(unique.values())
 
+    def _map_slices(self, func, args):
+        """
+        Returns ``[func(psf, arg) for psf, arg in zip(self.psf_slices, args)]``
 
-    def __mul__(self, x):
-        newpsf = deepcopy(self)
+        ``func`` is called only once for each distinct (PSF, argument) pair,
+        so that slices which were shared stay shared in the returned list.
+        ``func`` must not change ``psf`` in place
+        """
+        results = {}
+        new_slices = []
+        for psf, arg in zip(self.psf_slices, args):
+            key = (id(psf), id(arg))
+            if key not in results:
+                results[key] = func(psf, arg)
+            new_slices += [results[key]]
+
+        return new_slices
+
+    def _slice_maths(self, x, operator):
+        """Applies ``operator(PSF, x_i)`` to the PSF of each slice i"""
+        newpsf = copy(self)
 
         if not hasattr(x, "__len__"):
             y = [x] * len(self.psf_slices)
@@ -875,44 +1157,41 @@ class PSFCube(object):
             print(len(self.psf_slices), len(y))
             raise ValueError("len(arguments) must equal len(PSFs)")
 
-        for i in np.arange(len(self.psf_slices)):
-            newpsf[i].set_array(self.psf_slices[i] * y[i])
-        return newpsf
+        def _apply(psf, y_i):
+            new_psf = deepcopy(psf)
+            new_psf.set_array(operator(psf, y_i))
+            return new_psf
 
+        newpsf.info = deepcopy(self.info)
+        newpsf.psf_slices = self._map_slices(_apply, y)
+        newpsf.array = None
+        return newpsf
 
 
-    def __add__(self, x):
-        newpsf = deepcopy(self)
+    def __str__(self):
+        return self.info['description']
 
-        if not hasattr(x, "__len__"):
-            y = [x] * len(self.psf_slices)
+    def __getitem__(self, i):
+        if len(self.psf_slices) > 1:
+            return self.psf_slices[i]
         else:
-            y = x
+            return self.psf_slices[0]
 
-        if len(self.psf_slices) != len(y):
-            print(len(self.psf_slices), len(y))
-            raise ValueError("len(arguments) must equal len(PSFs)")
+    def __len__(self):
+        return len(self.psf_slices)
 
-        for i in np.arange(len(self.psf_slices)):
-            newpsf[i].set_array(self.psf_slices[i] + y[i])
-        return newpsf
 
+    def __mul__(self, x):
+        return self._slice_maths(x, lambda psf, y_i: psf * y_i)
 
-    def __sub__(self, x):
-        newpsf = deepcopy(self)
 
-        if not hasattr(x, "__len__"):
-            y = [x] * len(self.psf_slices)
-        else:
-            y = x
 
-        if len(self.psf_slices) != len(y):
-            print(len(self.psf_slices), len(y))
-            raise ValueError("len(arguments) must equal len(PSFs)")
+    def __add__(self, x):
+        return self._slice_maths(x, lambda psf, y_i: psf + y_i)
 
-        for i in np.arange(len(self.psf_slices)):
-            newpsf[i].set_array(self.psf_slices[i] - y[i])
-        return newpsf
+
+    def __sub__(self, x):
+        return self._slice_maths(x, lambda psf, y_i: psf - y_i)
 
 
 
@@ -973,6 +1252,11 @@ class AiryPSFCube(PSFCube):
     mode : str
         ['oversample','linear_interp'] see Kernel2D (scipy.convolution.core)
 
+    Notes
+    -----
+    All slices are evaluated at once on a common grid, which is large
+    enough for the widest PSF, and are stored in ``self.array``
+
     """
 
     def __init__(self, lam_bin_centers, fwhm=None, **kwargs):
@@ -997,8 +1281,13 @@ class AiryPSFCube(PSFCube):
         else:
             self.fwhm = fwhm
 
-        self.psf_slices = [AiryPSF(fwhm=f, **kwargs) for f in self.fwhm]
-        self.size = [psf.size for psf in self.psf_slices]
+        # Ensure that PSF size is at least 8 times fwhm, as in AiryPSF
+        pix_res = kwargs.get("pix_res", 0.004)
+        size = int(np.max([round(8 * f / pix_res) * 2 + 1 for f in self.fwhm]
+                          + [kwargs.get("size", 255)]))
+
+        self._set_analytic_array("airy", pix_res, size, kwargs.get("mode"),
+                                 obscuration=self.obscuration)
 
         self.info['description'] = "List of Airy function PSFs"
         self.info["Type"] = "AiryCube"
@@ -1019,6 +1308,11 @@ class GaussianPSFCube(PSFCube):
     mode : str
         ['oversample','linear_interp'] see Kernel2D (scipy.convolution.core)
 
+    Notes
+    -----
+    All slices are evaluated at once on a common grid, which is large
+    enough for the widest PSF, and are stored in ``self.array``
+
     """
 
     def __init__(self, lam_bin_centers, fwhm=None, **kwargs):
@@ -1035,9 +1329,21 @@ class GaussianPSFCube(PSFCube):
                                                     for lam in lam_bin_centers]
         elif not hasattr(fwhm, "__len__"):
             self.fwhm = [fwhm] * len(self)
+        else:
+            self.fwhm = fwhm
 
-        self.psf_slices = [GaussianPSF(fwhm=f, **kwargs) for f in self.fwhm]
-        self.size = [psf.size for psf in self.psf_slices]
+        # the same size rules as in GaussianPSF, for the widest PSF
+        pix_res = kwargs.get("pix_res", 0.004)
+        if "size" in kwargs.keys():
+            size = round(kwargs["size"] / 2) * 2 + 1
+        else:
+            size = 1
+        if not kwargs.get("undersized", False):
+            size = np.max([round(5 * f / pix_res) * 2 + 1 for f in self.fwhm]
+                          + [size])
+
+        self._set_analytic_array("gaussian", pix_res, int(size),
+                                 kwargs.get("mode"))
 
         self.info['description'] = "List of Gaussian function PSFs"
         self.info["Type"] = "GaussianCube"
@@ -1057,6 +1363,11 @@ class MoffatPSFCube(PSFCube):
     mode : str
         ['oversample','linear_interp'] see Kernel2D (scipy.convolution.core)
 
+    Notes
+    -----
+    All slices are evaluated at once on a common grid, which is large
+    enough for the widest PSF, and are stored in ``self.array``
+
     """
 
     def __init__(self, lam_bin_centers, fwhm=None, **kwargs):
@@ -1070,19 +1381,31 @@ class MoffatPSFCube(PSFCube):
         if fwhm is None:
             # lam in um, diameter in m, 206265 is 1 rad in arcsec
             rad2arcsec = 3600 * 180. / np.pi
-            self.fwhm = rad2arcsec * 1.22 * lam_bin_centers * 1E-6 / self.diameter
+            self.fwhm = rad2arcsec * 1.22 * np.asarray(lam_bin_centers) \
+                        * 1E-6 / self.diameter
         elif not hasattr(fwhm, "__len__"):
             self.fwhm = [fwhm] * len(self)
+        else:
+            self.fwhm = fwhm
 
-        self.psf_slices = [MoffatPSF(fwhm=f, **kwargs) for f in fwhm]
-        self.size = [psf.size for psf in self.psf_slices]
+        # the same size rules as in MoffatPSF, for the widest PSF
+        pix_res = kwargs.get("pix_res", 0.004)
+        if "size" in kwargs.keys():
+            size = round(kwargs["size"] / 2) * 2 + 1
+        else:
+            size = 1
+        size = np.max([round(4 * f / pix_res) * 2 + 1 for f in self.fwhm]
+                      + [size])
+
+        self._set_analytic_array("moffat", pix_res, int(size),
+                                 kwargs.get("mode"))
 
         self.info['description'] = "List of Moffat function PSFs"
         self.info["Type"] = "MoffatCube"
 
 class CombinedPSFCube(PSFCube):
     """
-    Generate a list of CombinedPSFCubes from the list of psfs in psf_list
+    Generate a cube of CombinedPSFs from the slices of the cubes in psf_list
 
     Parameters
     ----------
@@ -1114,9 +1437,14 @@ class CombinedPSFCube(PSFCube):
         for i, psfi in enumerate(psf_list):
             self.info['PSF%02d' % (i+1)] = psfi.info['description']
 
+        # slices which are shared in all cubes stay shared
+        combined = {}
         for i in range(len(self)):
-            self.psf_slices[i] = CombinedPSFCube([psf[i] for psf in psf_list],
-                                                 **kwargs)
+            slices = [cube.psf_slices[i] for cube in psf_list]
+            key = tuple(id(psf) for psf in slices)
+            if key not in combined:
+                combined[key] = CombinedPSF(slices, **kwargs)
+            self.psf_slices[i] = combined[key]
         self.size = [psf.size for psf in self.psf_slices]
 
 
@@ -1129,35 +1457,53 @@ class UserPSFCube(PSFCube):
 
     Parameters
     ----------
-    filename : str
-        the path to the FITS file holding the cube
+    filename : str, list, astropy.io.fits.HDUList
+        the path to the FITS file holding the cube, or a list of paths to
+        FITS files which each hold one PSF in the primary HDU
+    lam_bin_centers : array, list
+        [um] the wavelengths for which PSFs are needed. Only the extensions
+        closest to these wavelengths are used
+    size : int, optional
+        [pixel] Default None. If given, slices larger than ``size`` are
+        cropped to their central ``size`` x ``size`` pixels when they are read
 
     Notes
     -----
     A separate function will exist to convert foreign PSF FITS files into
     ``simcado.psf`` readable FITS files
 
+    The file is memory-mapped and only the headers are read at first. The
+    data of a slice is read, cropped and normalised the first time the slice
+    is used, e.g. by ``self[i]`` or ``self.nearest(lam)``. The cube keeps the
+    file(s) open until ``close()`` is called or the cube is pickled or copied
+
     See Also
     --------
     :func:`.make_foreign_PSF_cube`
 
     """
 
-    def __init__(self, filename, lam_bin_centers):
+    def __init__(self, filename, lam_bin_centers, size=None):
         if not hasattr(lam_bin_centers, "__len__"):
             lam_bin_centers = [lam_bin_centers]
 
-        psf_slices = []
-
         # pull out the wavelengths in the PSF FITS files
         psf_lam_cen = []
 
+        # an HDUList is a list too
         if isinstance(filename, fits.HDUList):
+            self.filename = None
+        elif isinstance(filename, (list, tuple)):
+            self.filename = list(filename)
+        else:
+            self.filename = filename
+        self._files = []
+        if self.filename is None:
             hdulist = filename
         else:
-            hdulist = fits.open(filename)
+            hdulist = self._open()
 
-        n_slices = len(hdulist.info(output=False))
+        n_slices = len(hdulist)
 
 
         for i in range(n_slices):
@@ -1178,57 +1524,229 @@ class UserPSFCube(PSFCube):
 
         # find the closest PSFs in the file to what is needed for the psf
         i_slices = utils.nearest(psf_lam_cen, lam_bin_centers)
-        i_psf_lam_cen = [psf_lam_cen[i] for i in np.unique(i_slices)]
+        ext_numbers = [int(i) for i in np.unique(i_slices)]
+        i_psf_lam_cen = np.array([psf_lam_cen[i] for i in ext_numbers])
 
-        # import only the relevant PSFs
-        for i in np.unique(i_slices):
+        super(UserPSFCube, self).__init__(i_psf_lam_cen)
 
-            hdr = hdulist[i].header
-            self.header = hdr
+        # only the relevant PSFs are read in, when they are first needed
+        self.psf_size = size
+        self._hdulist = hdulist
+        self._ext_numbers = ext_numbers
+        self._loaded = {}
+        self._new_pix_res = None
+        self.psf_slices = _LazyPSFSlices(self)
 
-            if 'CDELT1' in hdr.keys():
-                pix_res = hdr["CDELT1"]
-            elif 'CD1_1' in hdr.keys():
-                pix_res = hdr['CD1_1']
-            elif 'PIXSCALE' in hdr.keys():
-                pix_res = hdr['PIXSCALE']
-            else:
-                raise KeyError("Could not get pixel scale from " +
-                               filename)
+        self.header = hdulist[ext_numbers[-1]].header
+        self.size = [self._slice_size(hdulist[i].header) for i in ext_numbers]
 
-            if pix_res > 1:
-                warnings.warn("CDELT > 1. Assuming the scale to be [mas]")
-                pix_res *= 1E-3
+        if isinstance(self.filename, str):
+            self.info['description'] = "User PSF cube input from " + filename
+        elif self.filename is not None:
+            self.info['description'] = "User PSF cube input from " + \
+                                       str(len(self.filename)) + " files"
+        else:
+            self.info['description'] = "User PSF cube input from memory"
 
-            psf = PSF(size=hdr["NAXIS1"], pix_res=pix_res)
-            psf.set_array(hdulist[i].data)
+        hdr = hdulist[ext_numbers[0]].header
+        psf_type = hdr["PSF_TYPE"] if "PSF_TYPE" in hdr.keys() else "Unknown"
+        self.info["Type"] = psf_type + "Cube"
 
-            if "PSF_TYPE" in hdr.keys():
-                psf.info["Type"] = hdr["PSF_TYPE"]
-            else:
-                psf.info["Type"] = "Unknown"
+    def _slice_size(self, hdr):
+        """Returns the side length of a slice after cropping"""
+        if self.psf_size is None:
+            return hdr["NAXIS1"]
+        return min(hdr["NAXIS1"], int(self.psf_size))
+
+    def _load_slice(self, i):
+        """Reads, crops and normalises slice i, if it isn't in memory yet"""
+        if i in self._loaded:
+            return self._loaded[i]
+
+        if self._hdulist is None:
+            self._hdulist = self._open()
+
+        hdu = self._hdulist[self._ext_numbers[i]]
+        hdr = hdu.header
+
+        size = self._slice_size(hdr)
+        pix_res = self._slice_pix_res(hdr)
+        key = self._resample_key(i, size, pix_res)
+
+        if key in __resample_cache__:
+            # move to the end, as the most recently used
+            psf = __resample_cache__.pop(key)
+            __resample_cache__[key] = psf
+            psf = copy(psf)
+        else:
+            # only the cropped window is read from the memory-mapped file
+            y0 = (hdr["NAXIS2"] - size) // 2
+            x0 = (hdr["NAXIS1"] - size) // 2
+            psf = PSF(size=size, pix_res=pix_res)
+            psf.set_array(hdu.data[y0:y0 + size, x0:x0 + size])
+
+            if self._new_pix_res is not None and \
+                    pix_res != self._new_pix_res:
+                psf = psf.resample(self._new_pix_res)
+            if key is not None:
+                psf.array.setflags(write=False)
+                _cache_resampled(key, psf)
+                psf = copy(psf)
+
+        psf.info = {}
+        if "PSF_TYPE" in hdr.keys():
+            psf.info["Type"] = hdr["PSF_TYPE"]
+        else:
+            psf.info["Type"] = "Unknown"
+
+        if "DESCRIPT" in hdr.keys():
+            psf.info["description"] = hdr["DESCRIPT"]
+        else:
+            psf.info["description"] = "Unknown"
+
+        self._loaded[i] = psf
+
+        return psf
+
+    def _slice_pix_res(self, hdr):
+        """Returns the pixel scale [arcsec] of a slice in the file"""
+        if 'CDELT1' in hdr.keys():
+            pix_res = hdr["CDELT1"]
+        elif 'CD1_1' in hdr.keys():
+            pix_res = hdr['CD1_1']
+        elif 'PIXSCALE' in hdr.keys():
+            pix_res = hdr['PIXSCALE']
+        else:
+            raise KeyError("Could not get pixel scale from " +
+                           str(self.info['description']))
+
+        if pix_res > 1:
+            warnings.warn("CDELT > 1. Assuming the scale to be [mas]")
+            pix_res *= 1E-3
+
+        return pix_res
+
+    def resample(self, new_pix_res):
+        """
+        Resample the PSFs onto a grid with pixels of ``new_pix_res`` [arcsec]
+
+        Slices are resampled with :meth:`PSF.resample` when they are read.
+        Slices of a FITS file on disk are kept in ``__resample_cache__``, so
+        that the next cube made from the same file, e.g. by a new
+        ``OpticalTrain``, doesn't need to resample them again
 
-            if "DESCRIPT" in hdr.keys():
-                psf.info["description"] = hdr["DESCRIPT"]
+        Parameters
+        ----------
+        new_pix_res : float
+            [arcsec] the pixel resolution of the resampled PSFs
+
+        """
+        if not isinstance(self.psf_slices, _LazyPSFSlices):
+            # the slices were replaced, e.g. by convolve(), and are no longer
+            # read from the file
+            super(UserPSFCube, self).resample(new_pix_res)
+            self.size = [psf.size for psf in self.psf_slices]
+            return
+
+        self._new_pix_res = new_pix_res
+
+        if self._hdulist is not None or self.filename is not None:
+            # re-read the slices, so that they are only resampled once
+            self._loaded = {}
+            if self._hdulist is None:
+                self._hdulist = self._open()
+        else:
+            self._loaded = {i: psf.resample(new_pix_res)
+                            for i, psf in self._loaded.items()}
+
+        self.size = []
+        for i in range(len(self)):
+            if i in self._loaded:
+                self.size += [self._loaded[i].size]
             else:
-                psf.info["description"] = "Unknown"
+                hdr = self._hdulist[self._ext_numbers[i]].header
+                zoom = self._slice_pix_res(hdr) / float(new_pix_res)
+                size = self._slice_size(hdr)
+                self.size += [size if zoom == 1 else
+                              _resampled_size(size, zoom)]
 
-            psf_slices += [psf]
+    def _resample_key(self, i, size, pix_res):
+        """
+        Returns the key of slice i in ``__resample_cache__``, or None if the
+        slice isn't resampled or doesn't come from a file on disk
+        """
+        if self._new_pix_res is None or pix_res == self._new_pix_res or \
+                self.filename is None:
+            return None
 
+        if isinstance(self.filename, str):
+            fname, ext = self.filename, self._ext_numbers[i]
+        else:
+            fname, ext = self.filename[self._ext_numbers[i]], 0
 
-        hdulist.close()
+        return (os.path.abspath(fname), os.path.getmtime(fname), ext, size,
+                pix_res, float(self._new_pix_res))
 
-        lam_bin_centers = np.array(lam_bin_centers)
+    def _open(self):
+        """Memory-maps the FITS file(s) and returns the PSF extensions"""
+        if isinstance(self.filename, str):
+            self._files = [fits.open(self.filename, memmap=True)]
+            return self._files[0]
 
-        super(UserPSFCube, self).__init__(i_psf_lam_cen)
-        self.psf_slices = psf_slices
-        self.size = [psf.size for psf in self.psf_slices]
+        self._files = [fits.open(fname, memmap=True)
+                       for fname in self.filename]
+        return fits.HDUList([hdulist[0] for hdulist in self._files])
 
-        if isinstance(filename, str):
-            self.info['description'] = "User PSF cube input from " + filename
+    def close(self):
+        """
+        Close the FITS file. Slices which are still needed are read first
+        """
+        if self._hdulist is None:
+            return
+
+        if self.filename is None:
+            # an HDUList from memory can't be opened again
+            for i in range(len(self._ext_numbers)):
+                self._load_slice(i)
         else:
-            self.info['description'] = "User PSF cube input from memory"
-        self.info["Type"] = psf_slices[0].info["Type"]+"Cube"
+            for hdulist in self._files:
+                hdulist.close()
+            self._files = []
+        self._hdulist = None
+
+    def __getstate__(self):
+        # file handles can't be pickled. Keep what has been read so far and
+        # re-open the file when another slice is needed
+        self.close()
+        return self.__dict__.copy()
+
+
+class _LazyPSFSlices(Sequence):
+    """
+    List of the PSF slices of a UserPSFCube, which are read when first used
+
+    Parameters
+    ----------
+    cube : UserPSFCube
+
+    """
+
+    def __init__(self, cube):
+        self._cube = cube
+
+    def __len__(self):
+        return len(self._cube._ext_numbers)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(len(self))[i]]
+
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("PSF slice index out of range: " + str(i))
+
+        return self._cube._load_slice(i)
 
 
 
@@ -1313,6 +1831,204 @@ class ADC_PSFCube(DeltaPSFCube):
 
 
 
+def _normalised(array, threshold=1e-15):
+    """Returns a float32 copy of ``array`` summing to 1, without values <= 0"""
+    array = array.astype(np.float32)
+    array[array <= 0] = threshold
+    return array / np.sum(array)
+
+
+def _fft_shape(shape):
+    """Returns the fast real FFT lengths which are at least ``shape``"""
+    return tuple(spfft.next_fast_len(int(n), real=True) for n in shape)
+
+
+def _wrapped_index(shape, fft_shape):
+    """
+    Returns the index of an array of ``shape`` in an FFT array of
+    ``fft_shape``, with pixel ``((ny-1)//2, (nx-1)//2)`` at the origin
+    """
+    return np.ix_(*[(np.arange(n) - (n - 1) // 2) % m
+                    for n, m in zip(shape, fft_shape)])
+
+
+def _resampled_size(size, zoom):
+    """Returns the odd side length of ``size`` pixels resampled by ``zoom``"""
+    new_size = int(round(size * zoom))
+    return new_size + 1 - new_size % 2
+
+
+def _resampling_matrix(size, new_size, zoom):
+    """
+    Returns the (new_size, size) matrix which shares the flux of old pixels
+    out among new pixels
+
+    Both grids are centred on their geometric centres and ``zoom`` is the
+    number of new pixels per old pixel. The flux of an old pixel is spread
+    as a box one pixel wide, or when upsampling (``zoom > 1``) as a triangle
+    two pixels wide, so that the new pixels don't show the old pixel edges.
+    Where the new grid covers the old one, the columns sum to 1
+    """
+    # edges of the new pixels relative to the old pixel centres [old pixel]
+    edges = (np.arange(new_size + 1) - new_size / 2.) / zoom
+    x = edges[:, None] - (np.arange(size) - (size - 1) / 2.)[None, :]
+
+    if zoom <= 1:
+        cdf = np.clip(x + 0.5, 0, 1)
+    else:
+        x = np.clip(x, -1, 1)
+        cdf = np.where(x < 0, (x + 1)**2 / 2., 1 - (1 - x)**2 / 2.)
+
+    return sparse.csr_matrix(np.diff(cdf, axis=0))
+
+
+def _cache_resampled(key, psf):
+    """
+    Keep a resampled PSF in ``__resample_cache__`` and drop the least recently
+    used ones once the cache holds more than ``_RESAMPLE_CACHE_SIZE`` [MB]
+    """
+    __resample_cache__[key] = psf
+    size = sum(cached.array.nbytes for cached in __resample_cache__.values())
+    while size > _RESAMPLE_CACHE_SIZE * 2**20 and len(__resample_cache__) > 1:
+        oldest = __resample_cache__.pop(next(iter(__resample_cache__)))
+        size -= oldest.array.nbytes
+
+
+def _resample_array(array, zoom):
+    """
+    Resample a 2D array by ``zoom`` new pixels per old pixel, conserving flux
+
+    See :func:`_resampling_matrix`. The new array has odd side lengths
+    """
+    ny, nx = array.shape
+    mat_y = _resampling_matrix(ny, _resampled_size(ny, zoom), zoom)
+    mat_x = _resampling_matrix(nx, _resampled_size(nx, zoom), zoom)
+
+    # (M_y @ A) @ M_x.T, with the sparse matrices on the left
+    tmp = mat_y.dot(np.asarray(array, dtype=np.float64))
+    return mat_x.dot(tmp.T).T
+
+
+def _as_psf(kernel, pix_res):
+    """Returns ``kernel`` as a PSF object, if it is an array"""
+    if isinstance(kernel, PSF):
+        return kernel
+
+    psf = PSF(size=0, pix_res=pix_res)
+    psf.array = np.asarray(kernel)
+    psf.size, psf.shape = psf.array.shape[0], psf.array.shape
+    return psf
+
+
+def _discretisation_matrix(size, mode, factor=10):
+    """
+    Returns the matrix that samples a symmetric profile on a pixel grid
+
+    A profile ``f(|x|, |y|)`` evaluated on ``offsets`` x ``offsets`` gives
+    the pixel values ``matrix @ f @ matrix.T``, with the same sampling as the
+    astropy ``Kernel2D`` discretisation modes
+
+    Parameters
+    ----------
+    size : int
+        [pixel] the side length of the array, centred on pixel ``size // 2``
+    mode : str
+        ["center", "linear_interp", "oversample"]
+    factor : int, optional
+        Default 10. The oversampling factor for mode "oversample"
+
+    Returns
+    -------
+    offsets : np.ndarray
+        [pixel] the distinct distances of the samples from the centre
+    matrix : np.ndarray
+        (size, len(offsets)) weights of the samples in each pixel
+
+    """
+    x = np.arange(size) - size // 2
+
+    if mode == "center":
+        samples = x[:, None] + np.zeros(1)
+    elif mode == "linear_interp":
+        samples = x[:, None] + np.array([-0.5, 0.5])
+    elif mode == "oversample":
+        samples = x[:, None] - 0.5 + (np.arange(factor) + 0.5) / factor
+    else:
+        raise ValueError("Unknown discretisation mode: " + str(mode))
+
+    offsets, inverse = np.unique(np.round(np.abs(samples), 10),
+                                 return_inverse=True)
+    matrix = np.zeros((size, len(offsets)))
+    np.add.at(matrix, (np.repeat(np.arange(size), samples.shape[1]),
+                       inverse.ravel()), 1. / samples.shape[1])
+
+    return offsets, matrix
+
+
+def _analytic_psf_array(psf_type, fwhm, pix_res, size, mode,
+                        obscuration=0.):
+    """
+    Evaluate an analytic PSF for several FWHMs on one (fwhm, y, x) grid
+
+    Radial profiles (Airy, Moffat) are only evaluated for the distinct
+    distances of the samples from the centre. The Gaussian is separable and
+    is evaluated in 1D
+
+    Parameters
+    ----------
+    psf_type : str
+        ["airy", "gaussian", "moffat"]
+    fwhm : list, array
+        [arcsec] the FWHM of each layer
+    pix_res : float
+        [arcsec]
+    size : int
+        [pixel]
+    mode : str
+        ["center", "linear_interp", "oversample"], see Kernel2D
+    obscuration : float, optional
+        [0..1] for the Airy PSF, see AiryDiskDiff2D
+
+    Returns
+    -------
+    psf_array : np.ndarray
+        (len(fwhm), size, size) array, not normalised
+
+    """
+    offsets, matrix = _discretisation_matrix(size, mode)
+    fwhm_pix = np.asarray(fwhm, dtype=float).reshape(-1, 1, 1) / pix_res
+
+    if psf_type == "gaussian":
+        # as in GaussianPSF
+        sigma = fwhm_pix[:, 0] / 2.35
+        profile = (np.exp(-offsets**2 / (2 * sigma**2)) @ matrix.T)
+        profile = profile.astype(np.float32)
+        return profile[:, :, None] * profile[:, None, :]
+
+    r = np.sqrt(offsets[:, None]**2 + offsets[None, :]**2)
+
+    if psf_type == "moffat":
+        # as in MoffatPSF
+        beta = 4.765
+        alpha = fwhm_pix / (2 * np.sqrt(2**(1/beta) - 1))
+        profile = (1 + (r / alpha)**2)**(-beta)
+
+    elif psf_type == "airy":
+        # as in AiryPSF and AiryDiskDiff2D. (2 * 1.6163...) is the FWHM of
+        # J1(x)/x, i.e. x is the distance in units of the FWHM
+        from scipy.special import j1
+        x = r * (2 * 1.616339948310703) / fwhm_pix
+        x0 = np.where(x > 0, x, 1.)
+        profile = np.where(x > 0,
+                           (2 * j1(x0) / x0 -
+                            2 * obscuration * j1(obscuration * x0) / x0)**2,
+                           (1 - obscuration**2)**2)
+    else:
+        raise ValueError("Unknown analytic PSF type: " + str(psf_type))
+
+    return matrix @ profile @ matrix.T
+
+
 ## The following two classes implement a kernel for the PSF of a centrally
 ## obscured circular aperture. The classes are modelled after the kernels
 ## in astropy.convolution.kernel and the models in astropy.modeling.models,
@@ -1745,26 +2461,15 @@ def seeing_psf(fwhm=0.8, psf_type="moffat", size=1024, pix_res=0.004,
     # Approximate parameters - Bendinelli 1988
     # beta = 4.765 - Trujillo et al. 2001
 
+    The kernel arrays are memoised on (fwhm, psf_type, size, pix_res), so
+    repeated calls only pay for a copy of the array
+
     """
 
     if fwhm > 5:
         warnings.warn("FWHM is rather large: [arcsec]"+str(fwhm))
-    fwhm_pix = fwhm/pix_res
-
-    if "moff" in psf_type.lower():
-        beta = 4.785
-        alpha = fwhm_pix / (2 * np.sqrt(2**(1/beta)-1))
 
-        # astropy gamma = Trujillo alpha
-        # astropy alpha = Trujillo beta
-        seeing_psf = Moffat2DKernel(gamma=alpha, alpha=beta,
-                                    x_size=size, y_size=size,
-                                    factor=1).array
-    elif "gauss" in psf_type.lower():
-        sigma = fwhm_pix/2.3548
-        seeing_psf = Gaussian2DKernel(stddev=sigma,
-                                      x_size=size, y_size=size,
-                                      factor=1).array
+    seeing_psf = np.copy(_seeing_psf_array(fwhm, psf_type, size, pix_res))
 
     hdu = fits.PrimaryHDU(seeing_psf)
     hdu.header["PIXELSCL"] = pix_res
@@ -1784,6 +2489,63 @@ def seeing_psf(fwhm=0.8, psf_type="moffat", size=1024, pix_res=0.004,
         hdu_list.writeto(filename, clobber=True)
 
 
+def _seeing_psf_array(fwhm, psf_type, size, pix_res):
+    """
+    Returns the memoised, read-only kernel array for :func:`seeing_psf`
+
+    Parameters
+    ----------
+    fwhm : float
+        [arcsec]
+    psf_type : str
+        ["moffat, "gaussian"]
+    size : int
+        [pixel]
+    pix_res : float
+        [arcsec]
+
+    Returns
+    -------
+    seeing_psf : 2D-array
+        Shared between all callers. Copy it before changing it
+
+    """
+
+    if "moff" in psf_type.lower():
+        psf_type = "moffat"
+    elif "gauss" in psf_type.lower():
+        psf_type = "gaussian"
+    else:
+        raise ValueError("psf_type must be 'moffat' or 'gaussian': " +
+                         str(psf_type))
+
+    key = (float(fwhm), psf_type, int(size), float(pix_res))
+    if key in __psf_cache__:
+        return __psf_cache__[key]
+
+    fwhm_pix = fwhm/pix_res
+
+    if psf_type == "moffat":
+        beta = 4.785
+        alpha = fwhm_pix / (2 * np.sqrt(2**(1/beta)-1))
+
+        # astropy gamma = Trujillo alpha
+        # astropy alpha = Trujillo beta
+        seeing_psf = Moffat2DKernel(gamma=alpha, alpha=beta,
+                                    x_size=size, y_size=size,
+                                    factor=1).array
+    else:
+        sigma = fwhm_pix/2.3548
+        seeing_psf = Gaussian2DKernel(sigma,
+                                      x_size=size, y_size=size,
+                                      factor=1).array
+
+    seeing_psf.setflags(write=False)
+    __psf_cache__[key] = seeing_psf
+
+    return seeing_psf
+
+
 def poppy_eelt_psf(plan="A", wavelength=2.2, mode="wide", size=1024,
                   segments=None, filename=None, use_pupil_mask=True, **kwargs):
     """
@@ -2000,3 +2762,348 @@ def get_eelt_segments(plan="A", missing=None, return_missing_segs=False,
         return segs, missing
     else:
         return segs
+
+
+
+###############################################################################
+#                        On-disk library of PSF slices                        #
+###############################################################################
+
+# Part of every library key. Increase it when the way entries are made changes
+_PSF_LIBRARY_VERSION = 1
+
+
+class PSFLibrary(object):
+    """
+    On-disk library of PSFs which are expensive to generate, e.g. with POPPY
+
+    Each entry is a FITS file with the PSF for one wavelength. The file name
+    is a hash of the full set of parameters the PSF was made with (plan,
+    missing segments, wavelength, mode, strehl, size, pixel scale, ...), so
+    each PSF is only ever generated once
+
+    Parameters
+    ----------
+    directory : str, optional
+        Default "~/.simcado/psf_library". Created when the first PSF is stored
+
+    Notes
+    -----
+    If ``strehl`` is given, the PSFs are made by :func:`.poppy_ao_psf`,
+    otherwise by :func:`.poppy_eelt_psf`. All other keyword arguments are
+    passed on to these functions and are part of the key.
+
+    If ``segments`` is None, the mirror segments are drawn once for each
+    ``plan`` and ``n_missing`` and stored in the library (see
+    :meth:`.segments`). The key holds ``n_missing``, not the drawn segments,
+    and all PSFs made with the same ``plan`` and ``n_missing`` share this one
+    realisation of the randomly missing segments.
+
+    Examples
+    --------
+    ::
+
+        >>> lib = PSFLibrary()
+        >>> cube = lib.get_cube([1.25, 1.65, 2.2], plan="B", strehl=0.6,
+        ...                     n_processes=3)
+        >>> psf_ks = lib.get(2.2, plan="B", strehl=0.6)
+        >>> bad_files = lib.validate()
+
+    """
+
+    def __init__(self, directory="~/.simcado/psf_library"):
+        self.directory = os.path.expanduser(directory)
+
+    def key(self, wavelength, **kwargs):
+        """
+        Returns the parameters of a PSF with all defaults filled in, and their hash
+
+        Parameters
+        ----------
+        wavelength : float
+            [um]
+        kwargs
+            see :func:`.poppy_ao_psf` and :func:`.poppy_eelt_psf`
+
+        Returns
+        -------
+        params : dict
+        key : str
+
+        """
+        params = {"plan"       : "A",
+                  "mode"       : "wide",
+                  "size"       : 1024,
+                  "strehl"     : None,
+                  "segments"   : None,
+                  "n_missing"  : None}
+        params.update(kwargs)
+        params["wavelength"] = round(float(wavelength), 6)
+        if "pix_res" not in kwargs:
+            params["pix_res"] = 0.0015 if params["mode"].lower() == "zoom" \
+                                else 0.004
+
+        for name, val in params.items():
+            if isinstance(val, np.ndarray):
+                params[name] = val.tolist()
+            elif isinstance(val, np.generic):
+                params[name] = val.item()
+        if params["segments"] is not None:
+            params["segments"] = sorted(int(seg) for seg in params["segments"])
+
+        text = json.dumps([_PSF_LIBRARY_VERSION, params], sort_keys=True)
+        return params, hashlib.sha1(text.encode()).hexdigest()
+
+    def filename(self, wavelength, **kwargs):
+        """Returns the path of the entry for a PSF, whether it exists or not"""
+        return self._filename(self.key(wavelength, **kwargs)[1])
+
+    def _filename(self, key):
+        return os.path.join(self.directory, "psf_" + key + ".fits")
+
+    def populate(self, wavelengths, n_processes=None, **kwargs):
+        """
+        Generate the PSFs which are not yet in the library
+
+        Parameters
+        ----------
+        wavelengths : float, list, array
+            [um]
+        n_processes : int, optional
+            Default None. The number of PSFs generated at once, by default up
+            to the number of CPUs. With ``n_processes=1`` they are made one
+            after another in this process
+        kwargs
+            see :func:`.poppy_ao_psf` and :func:`.poppy_eelt_psf`
+
+        Returns
+        -------
+        fnames : list
+            the paths of the library entries for ``wavelengths``
+
+        """
+        entries = [self.key(lam, **kwargs) for lam in np.atleast_1d(wavelengths)]
+        fnames = [self._filename(key) for _, key in entries]
+
+        jobs = {}
+        for (params, key), fname in zip(entries, fnames):
+            if fname not in jobs and not self.is_valid(fname, key, full=False):
+                jobs[fname] = (params, key)
+        if not jobs:
+            return fnames
+
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+
+        segments = kwargs.get("segments")
+        if segments is None:
+            segments = self.segments(kwargs.get("plan", "A"),
+                                     kwargs.get("n_missing"))
+
+        jobs = [(params, key, fname, segments)
+                for fname, (params, key) in jobs.items()]
+
+        if n_processes is None:
+            n_processes = min(len(jobs), os.cpu_count() or 1)
+
+        if n_processes > 1:
+            with ProcessPoolExecutor(max_workers=n_processes) as pool:
+                list(pool.map(_make_library_psf, *zip(*jobs)))
+        else:
+            for job in jobs:
+                _make_library_psf(*job)
+
+        return fnames
+
+    def get_cube(self, lam_bin_centers, n_processes=None, **kwargs):
+        """
+        Returns a PSFCube with the library PSFs, generating any missing ones
+
+        Parameters
+        ----------
+        lam_bin_centers : array, list
+            [um]
+        n_processes : int, optional
+            see :meth:`.populate`
+        kwargs
+            see :func:`.poppy_ao_psf` and :func:`.poppy_eelt_psf`
+
+        Returns
+        -------
+        psf_cube : UserPSFCube
+            slices are read from the memory-mapped library files when they
+            are first used. ``psf_cube.close()`` closes the files
+
+        """
+        lam_bin_centers = np.atleast_1d(lam_bin_centers)
+        fnames = self.populate(lam_bin_centers, n_processes=n_processes,
+                               **kwargs)
+
+        psf_cube = UserPSFCube(sorted(set(fnames), key=fnames.index),
+                               lam_bin_centers)
+        psf_cube.info["description"] = "PSF cube from library " + \
+                                       self.directory
+        return psf_cube
+
+    def get(self, wavelength, **kwargs):
+        """
+        Returns the library PSF for a single wavelength as a PSF object
+
+        See :meth:`.get_cube`
+        """
+        psf_cube = self.get_cube([wavelength], n_processes=1, **kwargs)
+        psf = psf_cube[0]
+        psf_cube.close()
+        return psf
+
+    def segments(self, plan="A", n_missing=None):
+        """
+        Returns the mirror segments of the PSFs made with ``segments=None``
+
+        The segments are drawn by :func:`.get_eelt_segments` the first time
+        a ``plan`` and ``n_missing`` are used, and are then stored in the
+        library next to the PSFs
+
+        Parameters
+        ----------
+        plan : str, optional
+            ["A", "B"] Default "A"
+        n_missing : int, list, optional
+            Default None. See ``missing`` in :func:`.get_eelt_segments`
+
+        Returns
+        -------
+        segments : list
+            the IDs of the mirror segments
+
+        """
+        params, key = self.key(0, plan=plan, n_missing=n_missing)
+        text = json.dumps([_PSF_LIBRARY_VERSION, params["plan"],
+                           params["n_missing"]])
+        fname = os.path.join(self.directory, "segments_" +
+                             hashlib.sha1(text.encode()).hexdigest() + ".json")
+
+        if not os.path.exists(fname):
+            if not os.path.exists(self.directory):
+                os.makedirs(self.directory)
+            segments = get_eelt_segments(plan=plan, missing=n_missing)
+
+            fd, tmp_name = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as fp1:
+                json.dump([int(seg) for seg in segments], fp1)
+            # if another process has stored segments in the meantime, those
+            # are used
+            try:
+                os.link(tmp_name, fname)
+            except FileExistsError:
+                pass
+            finally:
+                os.remove(tmp_name)
+
+        with open(fname) as fp1:
+            return json.load(fp1)
+
+    def is_valid(self, fname, key=None, full=True):
+        """
+        Check that a library entry can be used
+
+        Parameters
+        ----------
+        fname : str
+            path to the library entry
+        key : str, optional
+            the key the entry must have been stored under
+        full : bool, optional
+            Default True. Also check the FITS checksums and that the data are
+            finite and positive. Otherwise only the header is read
+
+        Returns
+        -------
+        valid : bool
+
+        """
+        if not os.path.exists(fname):
+            return False
+
+        try:
+            with fits.open(fname, memmap=True) as hdulist:
+                hdu = hdulist[0]
+                if hdu.header.get("LIBVER") != _PSF_LIBRARY_VERSION:
+                    return False
+                if key is not None and hdu.header.get("PSFKEY") != key:
+                    return False
+                if not full:
+                    return True
+
+                if hdu.verify_checksum() != 1 or hdu.verify_datasum() != 1:
+                    return False
+                data = hdu.data
+                return data is not None and data.ndim == 2 and \
+                       bool(np.all(np.isfinite(data))) and np.sum(data) > 0
+        except Exception:
+            return False
+
+    def validate(self, remove=True):
+        """
+        Check every entry in the library
+
+        An entry is invalid if it can't be read, if its checksums don't
+        match, if it was stored by another library version or under another
+        file name, or if its data are not finite
+
+        Parameters
+        ----------
+        remove : bool, optional
+            Default True. Delete the invalid entries
+
+        Returns
+        -------
+        bad_files : list
+            paths of the invalid entries
+
+        """
+        fnames = glob.glob(os.path.join(self.directory, "psf_*.fits"))
+
+        bad_files = []
+        for fname in sorted(fnames):
+            key = os.path.basename(fname)[len("psf_"):-len(".fits")]
+            if not self.is_valid(fname, key):
+                bad_files += [fname]
+                if remove:
+                    try:
+                        os.remove(fname)
+                    except OSError:
+                        pass
+
+        return bad_files
+
+
+def _make_library_psf(params, key, fname, segments=None):
+    """
+    Generate one PSF of a PSFLibrary and store it atomically under ``fname``
+    """
+    kwargs = {name: val for name, val in params.items() if val is not None}
+    if segments is not None:
+        kwargs["segments"] = segments
+
+    if "strehl" in kwargs:
+        hdu = poppy_ao_psf(**kwargs)[0]
+    else:
+        hdu = poppy_eelt_psf(**kwargs)[0]
+
+    hdu = fits.PrimaryHDU(np.asarray(hdu.data, dtype=np.float32),
+                          header=hdu.header)
+    hdu.header["WAVE0"] = (params["wavelength"],
+                           "[micron] - Wavelength of slice")
+    hdu.header["PSFKEY"] = (key, "PSFLibrary key")
+    hdu.header["LIBVER"] = (_PSF_LIBRARY_VERSION, "PSFLibrary version")
+
+    # write to a temporary file first, so that other processes never see a
+    # half-written entry
+    fd, tmp_name = tempfile.mkstemp(dir=os.path.dirname(fname),
+                                    suffix=".tmp")
+    os.close(fd)
+    fits.HDUList([hdu]).writeto(tmp_name, overwrite=True, checksum=True)
+    os.replace(tmp_name, fname)
+
+    return fname
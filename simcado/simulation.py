@@ -6,6 +6,10 @@ simulation.py
 #import warnings
 #import logging
 
+import os
+from copy import deepcopy
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
 import numpy as np
 
 #import simmetis as sim
@@ -13,8 +17,10 @@ from . import source
 from .commands import UserCommands
 from .optics import OpticalTrain
 from .detector import Detector
+from . import utils
 
-__all__ = ["run", "snr", "check_chip_positions", "limiting_mags"]
+__all__ = ["run", "run_filters", "snr", "check_chip_positions", "limiting_mags",
+           "aperture_photometry", "snr_analytic", "limiting_mags_analytic"]
 
 def run(src, mode="wide", cmds=None, opt_train=None, fpa=None,
         detector_layout="small", filename=None, return_internals=False,
@@ -25,8 +31,9 @@ def run(src, mode="wide", cmds=None, opt_train=None, fpa=None,
 
     Parameters
     ----------
-    src : simcado.Source
-        The object of interest
+    src : simcado.Source, str
+        The object of interest, or the path to a saved :class:`.Source` FITS
+        file
 
     mode : str, optional
         ["wide", "zoom"] Default is "wide", for a 4mas FoV. "Zoom" -> 1.5mas
@@ -63,25 +70,17 @@ def run(src, mode="wide", cmds=None, opt_train=None, fpa=None,
     exptime : int, float
         [s] Analogous to passing OBS_EXPTIME as a keyword argument
 
+    Notes
+    -----
+    With ``SIM_ASYNC_IO="yes"`` an input Source file is read in a background
+    thread while the optical train is built. When writing to ``filename``, the
+    chips are then simulated one at a time and each chip is written to disk
+    while the next one is being simulated
+
     """
 
     if cmds is None:
-        cmds = UserCommands()
-        cmds["INST_FILTER_TC"] = "Ks"
-
-        if detector_layout.lower() in ("tiny", "small", "centre", "center"):
-            cmds["FPA_CHIP_LAYOUT"] = detector_layout
-        else:
-            cmds["FPA_CHIP_LAYOUT"] = 'full'
-
-        if mode == "wide":
-            cmds["SIM_DETECTOR_PIX_SCALE"] = 0.004
-            cmds["INST_NUM_MIRRORS"] = 11
-        elif mode == "zoom":
-            cmds["SIM_DETECTOR_PIX_SCALE"] = 0.0015
-            cmds["INST_NUM_MIRRORS"] = 13
-        else:
-            raise ValueError("'mode' must be either 'wide' or ' zoom', not " + mode)
+        cmds = _default_cmds(mode, detector_layout)
 
     if filter_name is not None:
         cmds["INST_FILTER_TC"] = filter_name
@@ -92,26 +91,51 @@ def run(src, mode="wide", cmds=None, opt_train=None, fpa=None,
     # update any remaining keywords
     cmds.update(kwargs)
 
-    if opt_train is None:
-        opt_train = OpticalTrain(cmds)
-    if fpa is None:
-        fpa = Detector(cmds, small_fov=False)
+    async_io = cmds["SIM_ASYNC_IO"].lower() == "yes"
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        # Read the Source file in the background while the OpticalTrain is
+        # being built. Errors are raised by .result()
+        if isinstance(src, str):
+            if async_io:
+                src = pool.submit(source.Source, filename=src)
+            else:
+                src = source.Source(filename=src)
+
+        if opt_train is None:
+            opt_train = OpticalTrain(cmds)
+        if fpa is None:
+            fpa = Detector(cmds, small_fov=False)
+
+        if not isinstance(src, source.Source):
+            src = src.result()
 
     print("Detector layout")
     print(fpa.layout)
     print("Creating", len(cmds.lam_bin_centers), "layer(s) per chip")
     print(len(fpa.chips), "chip(s) will be simulated")
 
-    src.apply_optical_train(opt_train, fpa, sub_pixel=sub_pixel)
-
-    if filename is not None:
-        if cmds["OBS_SAVE_ALL_FRAMES"] == "yes":
-            for n in range(cmds["OBS_NDIT"]):
-                fname = filename.replace(".", str(n) + ".")
-                hdu = fpa.read_out(filename=fname, to_disk=True, OBS_NDIT=1)
-        else:
-            hdu = fpa.read_out(filename=filename, to_disk=True)
+    if filename is not None and cmds["OBS_SAVE_ALL_FRAMES"] in ("yes", "cube"):
+        src.apply_optical_train(opt_train, fpa, sub_pixel=sub_pixel)
+        cube = cmds["OBS_SAVE_ALL_FRAMES"] == "cube"
+        for hdu in fpa.read_out_frames(filename=filename, cube=cube):
+            pass
+    elif filename is not None and async_io:
+        # Pipeline: chip N is written while chip N+1 is being simulated. The
+        # transmission curve is applied to the spectra once for all chips
+        src._apply_transmission_curve(opt_train.tc_source)
+
+        def render(i):
+            src.apply_optical_train(opt_train, fpa, chips=i,
+                                    sub_pixel=sub_pixel,
+                                    apply_transmission=False)
+
+        hdu = fpa.read_out(filename=filename, to_disk=True, render=render)
+    elif filename is not None:
+        src.apply_optical_train(opt_train, fpa, sub_pixel=sub_pixel)
+        hdu = fpa.read_out(filename=filename, to_disk=True)
     else:
+        src.apply_optical_train(opt_train, fpa, sub_pixel=sub_pixel)
         hdu = fpa.read_out()
 
     if return_internals:
@@ -120,6 +144,157 @@ def run(src, mode="wide", cmds=None, opt_train=None, fpa=None,
         return hdu
 
 
+def run_filters(src, filter_names, mode="wide", cmds=None, opt_train=None,
+                fpa=None, detector_layout="small", return_internals=False,
+                sub_pixel=False, n_processes=None, **kwargs):
+    """
+    Run a MICADO simulation of the same field through several filters
+
+    The optical train and the detector are built once. For each filter only
+    the parts of the optical train that depend on the filter are remade (see
+    :meth:`.OpticalTrain.update`), and the filters are simulated in parallel
+    processes. ``cmds``, ``opt_train`` and ``fpa`` are copied, not changed.
+
+    Parameters
+    ----------
+    src : simcado.Source, str, list
+        The object of interest, or the path to a saved :class:`.Source` FITS
+        file. A list with one :class:`.Source` per filter is also accepted
+
+    filter_names : list
+        The filters, as names or TransmissionCurve objects. See
+        :func:`simcado.optics.get_filter_set`
+
+    mode : str, optional
+        ["wide", "zoom"] Default is "wide", for a 4mas FoV. "Zoom" -> 1.5mas
+
+    cmds : simcado.UserCommands, optional
+        A custom set of commands for the simulation. Default is None
+
+    opt_train : simcado.OpticalTrain, optional
+        A custom optical train to start from. Default is None
+
+    fpa : simcado.Detector, optional
+        A custom detector layout for the simulation. Default is None
+
+    detector_layout : str, optional
+        ["small", "centre", "full", "tiny"] Default is "small". See :func:`run`
+
+    return_internals : bool
+        [False, True] Default is False. If True, a tuple with the
+        ``UserCommands``, ``OpticalTrain`` and ``Detector`` objects used for
+        each filter is returned with each HDUList
+
+    sub_pixel : bool, optional
+        Default is False. If True, sources are placed with sub-pixel accuracy
+
+    n_processes : int, optional
+        The number of processes. Default is None, i.e. one per filter, up to
+        the number of CPUs. With ``n_processes=1`` the filters are simulated
+        one after the other in this process
+
+    Optional Parameters
+    -------------------
+    Any Keyword-Value pairs accepted by a
+    :class:`~simcado.commands.UserCommands` object
+
+    Returns
+    -------
+    hdus : list
+        A list of ``astropy.io.fits.HDUList`` objects, one per filter, or of
+        ``(hdu, (cmds, opt_train, fpa))`` tuples if ``return_internals=True``
+
+    See Also
+    --------
+    :func:`run`
+
+    Examples
+    --------
+    ::
+
+        >>> import simcado
+        >>> src = simcado.source.cluster()
+        >>> hdu_j, hdu_h, hdu_ks = simcado.run_filters(src, ["J", "H", "Ks"])
+
+    """
+    if isinstance(filter_names, str):
+        filter_names = [filter_names]
+
+    if isinstance(src, str):
+        src = source.Source(filename=src)
+    if isinstance(src, (list, tuple)):
+        if len(src) != len(filter_names):
+            raise ValueError("One Source per filter is needed")
+        srcs = list(src)
+    else:
+        srcs = [src] * len(filter_names)
+
+    if cmds is None:
+        cmds = _default_cmds(mode, detector_layout)
+    else:
+        cmds = deepcopy(cmds)
+    cmds.update(kwargs)
+    cmds["INST_FILTER_TC"] = filter_names[0]
+
+    if opt_train is None:
+        opt_train = OpticalTrain(cmds)
+    if fpa is None:
+        fpa = Detector(cmds, small_fov=False)
+
+    if n_processes is None:
+        n_processes = min(len(filter_names), os.cpu_count() or 1)
+
+    jobs = [(src_i, filt, opt_train, fpa, sub_pixel, return_internals)
+            for src_i, filt in zip(srcs, filter_names)]
+    if n_processes > 1:
+        with ProcessPoolExecutor(max_workers=n_processes) as pool:
+            return list(pool.map(_run_filter, *zip(*jobs)))
+
+    return [_run_filter(*job) for job in jobs]
+
+
+def _run_filter(src, filter_name, opt_train, fpa, sub_pixel=False,
+                return_internals=False):
+    """
+    Simulate ``src`` with copies of ``opt_train`` and ``fpa`` for one filter
+    """
+    opt_train = deepcopy(opt_train)
+    opt_train.update(INST_FILTER_TC=filter_name)
+    # the output headers are made from the commands of the detector
+    fpa = deepcopy(fpa)
+    fpa.cmds["INST_FILTER_TC"] = opt_train.cmds["INST_FILTER_TC"]
+
+    src.apply_optical_train(opt_train, fpa, sub_pixel=sub_pixel)
+    hdu = fpa.read_out()
+
+    if return_internals:
+        return hdu, (opt_train.cmds, opt_train, fpa)
+    return hdu
+
+
+def _default_cmds(mode="wide", detector_layout="small"):
+    """
+    The default commands for :func:`run` in the "wide" or "zoom" mode
+    """
+    cmds = UserCommands()
+    cmds["INST_FILTER_TC"] = "Ks"
+
+    if detector_layout.lower() in ("tiny", "small", "centre", "center"):
+        cmds["FPA_CHIP_LAYOUT"] = detector_layout
+    else:
+        cmds["FPA_CHIP_LAYOUT"] = 'full'
+
+    if mode == "wide":
+        cmds["SIM_DETECTOR_PIX_SCALE"] = 0.004
+        cmds["INST_NUM_MIRRORS"] = 11
+    elif mode == "zoom":
+        cmds["SIM_DETECTOR_PIX_SCALE"] = 0.0015
+        cmds["INST_NUM_MIRRORS"] = 13
+    else:
+        raise ValueError("'mode' must be either 'wide' or ' zoom', not " + mode)
+
+    return cmds
+
 
 def check_chip_positions(filename="src.fits", x_cen=17.084, y_cen=17.084,
                          n=0.3, mode="wide"):
@@ -191,30 +366,170 @@ def _make_snr_grid_fpas(filter_names=None, mmin=22, mmax=32,
     if isinstance(filter_names, str):
         filter_names = [filter_names]
 
-    if not isinstance(cmds, list):
-        cmds = [cmds] * len(filter_names)
+    if isinstance(cmds, list):
+        fpas = []
+        for filt, cmd in zip(filter_names, cmds):
+            fpa, grid = _make_snr_grid_fpas([filt], mmin, mmax, cmd, **kwargs)
+            fpas += fpa
+        return fpas, grid
 
-    fpas = []
-    grids = []
-    for filt, cmd in zip(filter_names, cmds):
-        if cmd is None:
-            cmd = UserCommands()
-        #cmd["FPA_USE_NOISE"] = "no"
-        cmd["OBS_NDIT"] = 1
-        cmd["FPA_LINEARITY_CURVE"] = "none"
-        cmd["FPA_CHIP_LAYOUT"] = "small"
-        cmd.update(kwargs)
+    if cmds is None:
+        cmds = UserCommands()
+    #cmds["FPA_USE_NOISE"] = "no"
+    cmds["OBS_NDIT"] = 1
+    cmds["FPA_LINEARITY_CURVE"] = "none"
+    cmds["FPA_CHIP_LAYOUT"] = "small"
+    cmds.update(kwargs)
+
+    star_sep = cmds["SIM_DETECTOR_PIX_SCALE"] * 100
 
-        star_sep = cmd["SIM_DETECTOR_PIX_SCALE"] * 100
+    # the same commands for all filters: simulate them in one batch
+    grids = [source.star_grid(100, mmin, mmax, filter_name=filt,
+                              separation=star_sep) for filt in filter_names]
+    results = run_filters(grids, filter_names, cmds=cmds,
+                          return_internals=True)
+    fpas = [fpa for hdus, (cmd, opt, fpa) in results]
 
-        grid = source.star_grid(100, mmin, mmax, filter_name=filt, separation=star_sep)
-        grids += [grid]
+    return fpas, grids[-1]
 
-        hdus, (cmd, opt, fpa) = run(grid, filter_name=filt, cmds=cmd,
-                                    return_internals=True)
-        fpas += [fpa]
 
-    return fpas, grid
+def aperture_photometry(images, x, y, r_ap=4, r_in=10, r_out=15,
+                        sigma=3., n_iter=5):
+    """
+    Measure the flux of many sources in one or more images at once
+
+    Square apertures and background annuli are used, i.e. a pixel at offset
+    (dx, dy) from a source lies inside the aperture if max(|dx|, |dy|) <= r_ap
+    and in the background annulus if r_in < max(|dx|, |dy|) <= r_out. The
+    pixels of all sources in all images are gathered in a single indexing
+    operation and the background statistics are sigma-clipped for all
+    sources together.
+
+    Parameters
+    ----------
+    images : np.ndarray
+        A single (ny, nx) image or a (n, ny, nx) stack of images, e.g. the
+        output of :meth:`.Detector.read_out_ladder`
+    x, y : array-like
+        [pixel] positions of the sources. Rounded down to the nearest pixel
+    r_ap : int, array-like, optional
+        [pixel] half-width of the aperture. Either one value for all sources
+        or one per source. Default is 4
+    r_in, r_out : int, array-like, optional
+        [pixel] inner and outer half-widths of the background annulus. Either
+        one value for all sources or one per source. Default is 10 and 15
+    sigma : float, optional
+        Clipping threshold for the background pixels in standard deviations.
+        Default is 3
+    n_iter : int, optional
+        Maximum number of clipping iterations. Default is 5
+
+    Returns
+    -------
+    flux : np.ndarray
+        sum of the aperture pixels minus the median background
+    flux_err : np.ndarray
+        uncertainty in ``flux`` from the Poisson noise of the source and
+        the scatter of the background pixels
+    bg : np.ndarray
+        the sigma-clipped median background level per pixel
+    bg_std : np.ndarray
+        the sigma-clipped standard deviation of the background pixels
+
+    All arrays have the shape (n, n_sources), or (n_sources,) if ``images``
+    is a single image. Pixels outside the image are ignored.
+
+    Examples
+    --------
+    ::
+
+        >>> hdu = fpa.read_out_ladder([60, 600, 3600], chips=0)
+        >>> flux, err, bg, bg_std = aperture_photometry(hdu[1].data,
+        ...                                             src.x_pix, src.y_pix)
+        >>> snr = flux / err        # shape (3, len(src.x_pix))
+
+    """
+
+    images = np.asarray(images)
+    single = images.ndim == 2
+    if single:
+        images = images[np.newaxis, :, :]
+    n_img, ny, nx = images.shape
+
+    x = np.asarray(x).astype(int)
+    y = np.asarray(y).astype(int)
+    r_ap, r_in, r_out = [np.broadcast_to(np.asarray(r, dtype=int), x.shape)
+                         for r in (r_ap, r_in, r_out)]
+
+    def gather(r_min, r_max):
+        # offsets of every pixel with r_min < max(|dx|, |dy|) <= r_max
+        dy, dx = np.mgrid[-r_max:r_max+1, -r_max:r_max+1]
+        dist = np.maximum(np.abs(dx), np.abs(dy)).ravel()
+        keep = dist > r_min
+        dist, dx, dy = dist[keep], dx.ravel()[keep], dy.ravel()[keep]
+
+        iy = y[:, np.newaxis] + dy[np.newaxis, :]
+        ix = x[:, np.newaxis] + dx[np.newaxis, :]
+        valid = (iy >= 0) * (iy < ny) * (ix >= 0) * (ix < nx)
+        vals = images[:, np.clip(iy, 0, ny-1), np.clip(ix, 0, nx-1)]
+
+        return vals.astype(np.float64), dist[np.newaxis, :], valid
+
+    # aperture pixels
+    ap_vals, ap_dist, ap_valid = gather(-1, r_ap.max())
+    ap_mask = (ap_dist <= r_ap[:, np.newaxis]) * ap_valid
+    n_ap = ap_mask.sum(axis=1)
+    ap_sum = np.sum(ap_vals * ap_mask, axis=2)
+
+    # background annulus pixels
+    bg_vals, bg_dist, bg_valid = gather(r_in.min(), r_out.max())
+    bg_mask = (bg_dist > r_in[:, np.newaxis]) * \
+              (bg_dist <= r_out[:, np.newaxis]) * bg_valid
+    bg_vals[:, ~bg_mask] = np.nan
+    bg_mean, bg, bg_std = _sigma_clipped_stats(bg_vals, sigma, n_iter)
+
+    flux = ap_sum - bg * n_ap
+    n_bg = np.sum(bg_mask, axis=1)
+    flux_err = np.sqrt(np.clip(flux, 0, None) + n_ap * bg_std**2 +
+                       n_ap**2 * bg_std**2 / np.clip(n_bg, 1, None))
+
+    if single:
+        return flux[0], flux_err[0], bg[0], bg_std[0]
+    else:
+        return flux, flux_err, bg, bg_std
+
+
+def _sigma_clipped_stats(vals, sigma=3., n_iter=5):
+    """
+    Sigma-clipped mean, median and std along the last axis of ``vals``
+
+    NaN values are ignored. Vectorised version of
+    ``astropy.stats.sigma_clipped_stats`` for many rows at once
+    """
+
+    vals = np.array(vals, dtype=np.float64)
+
+    for _ in range(n_iter + 1):
+        valid = ~np.isnan(vals)
+        count = np.clip(valid.sum(axis=-1), 1, None)
+
+        # NaNs are sorted to the end of each row
+        srt = np.sort(vals, axis=-1)
+        lo = np.take_along_axis(srt, ((count - 1) // 2)[..., np.newaxis], -1)
+        hi = np.take_along_axis(srt, (count // 2)[..., np.newaxis], -1)
+        median = 0.5 * (lo + hi)
+
+        mean = np.nansum(vals, axis=-1, keepdims=True) / count[..., np.newaxis]
+        std = np.sqrt(np.nansum((vals - mean)**2, axis=-1, keepdims=True) /
+                      count[..., np.newaxis])
+
+        with np.errstate(invalid="ignore"):
+            clip = np.abs(vals - median) > sigma * std
+        if _ == n_iter or not np.any(clip):
+            break
+        vals[clip] = np.nan
+
+    return mean[..., 0], median[..., 0], std[..., 0]
 
 
 def _get_limiting_mags(fpas, grid, exptimes, filter_names=None,
@@ -279,37 +594,26 @@ def _get_limiting_mags(fpas, grid, exptimes, filter_names=None,
     mags_all = []
     for fpa, filt, AB_corr in zip(fpas, filter_names, AB_corrs):
 
-        lim_mags = []
-        for exptime in exptimes:
+        # read out all exposure times from the same noiseless image
+        ladder = fpa.read_out_ladder(exptimes, chips=0)
 
-            hdus = fpa.read_out(OBS_EXPTIME=exptime)
-            im = hdus[0].data
+        # The box around each star shrinks from 20 to 10 pixels with
+        # increasing magnitude. The outer 5 pixels are used for the background
+        n_stars = len(grid.x_pix)
+        dw = 5
+        w = np.maximum(dw + 5, ((1. - np.arange(n_stars) / n_stars) *
+                                20).astype(int))
 
-            im_width = hdus[0].data.shape[0]
-            #x = (grid.x_pix+im_width//2).astype(int)
-            x = grid.x_pix.astype(int)
-            y = grid.y_pix.astype(int)
+        flux, _, bg, bg_std = aperture_photometry(ladder[1].data, grid.x_pix,
+                                                  grid.y_pix, r_ap=w-dw,
+                                                  r_in=w-dw, r_out=w)
+        n_ap = (2 * (w - dw) + 1)**2
+        snrs = flux / (bg_std * np.sqrt(n_ap))
 
-            sigs, nss, snrs, bgs = [], [], [], []
-            for n in range(len(x)):
-                dw = 5
-                w = max(dw + 5, int((1. - n/len(x)) * 20))
+        mags = np.linspace(mmin, mmax, n_stars) + AB_corr
 
-                ps = im[y[n]-w:y[n]+w, x[n]-w:x[n]+w]
-
-                sig = np.copy(ps[dw:-dw, dw:-dw])
-                bg = np.copy(ps)
-                bg[dw:-dw, dw:-dw] = 0
-
-                bgs += [np.average(bg[bg != 0])]
-                nss += [np.std(bg[bg != 0]) * np.sqrt(np.sum(bg == 0))]
-                sigs += [np.sum(sig - bgs[-1])]
-
-            nss = np.array(nss)
-            sigs = np.array(sigs)
-            snr = sigs/nss
-
-            mags = np.linspace(mmin, mmax, len(x)) + AB_corr
+        lim_mags = []
+        for exptime, snr in zip(exptimes, snrs):
 
             mask = snr > 5
             try:
@@ -548,18 +852,7 @@ def snr_curve(exptimes, mmin=20, mmax=30, filter_name="Ks",
     if isinstance(exptimes, (float, int)):
         exptimes = [exptimes]
 
-    paranal_bg = {"J" : 16.5, "H" : 14.4, "Ks" : 13.6}
-
-    default_cmds = UserCommands()
-    default_cmds["ATMO_EC"] = "none"
-    default_cmds["FPA_USE_NOISE"] = "no"
-    if filter_name in paranal_bg.keys():
-        default_cmds["ATMO_BG_MAGNITUDE"] = paranal_bg[filter_name]
-
-    if cmds is not None:
-        default_cmds.update(cmds)
-
-    default_cmds.update(kwargs)
+    default_cmds = _snr_cmds(filter_name, cmds, **kwargs)
 
     q = _make_snr_grid_fpas(filter_names=[filter_name],
                             mmin=mmin, mmax=mmax, cmds=default_cmds)
@@ -571,44 +864,28 @@ def snr_curve(exptimes, mmin=20, mmax=30, filter_name="Ks",
     r_out = 48
     r_width = 5
 
-    snr_array = []
-    for exptime in exptimes:
-
-        hdu = fpa.read_out(OBS_EXPTIME=exptime)
-        data = hdu[0].data
-
-        sq_aps = []
-        bg_stats = []
-
-        for i in range(len(src.x_pix)):
-
-            x, y = int(src.x_pix[i]), int(src.y_pix[i])
-            sq_ap = np.copy(data[y-r:y+r+1, x-r:x+r+1])
-            sq_aps += [sq_ap]
-
-            bg_ap = np.copy(data[y-r_out:y+r_out+1, x-r_out:x+r_out+1])
-            bg_ap[r_width:-r_width, r_width:-r_width] = 0
+    # read out all exposure times from the same noiseless image
+    ladder = fpa.read_out_ladder(exptimes, chips=0)
 
-            av, med, std = sigma_clipped_stats(bg_ap[bg_ap != 0])
-            bg_stats += [[av, med, std]]
+    # photometry of all stars in all exposures at once
+    sigs, _, bg_meds, _ = aperture_photometry(ladder[1].data, src.x_pix,
+                                              src.y_pix, r_ap=r,
+                                              r_in=r_out-r_width, r_out=r_out)
 
-        RON = default_cmds["FPA_READOUT_MEDIAN"]
-        bg_med = np.array([s[1] for s in bg_stats])
-        bg_std = np.array([s[0] for s in bg_stats])
-        n_pix = (r*2+1)**2
+    RON = default_cmds["FPA_READOUT_MEDIAN"]
+    n_pix = (r*2+1)**2
 
-        raw = np.array([np.sum(s) for s in sq_aps])
-        sig = raw - bg_med * n_pix
+    snr_array = []
+    for sig, bg_med in zip(sigs, bg_meds):
 
         sig_shot = np.sqrt(sig)
         bg_shot = np.sqrt(bg_med * n_pix)
-        bg_shot_std = np.sqrt(n_pix) * bg_std
         e_shot = np.sqrt(n_pix  * RON**2)
 
         tot_err = np.sqrt(sig_shot**2 + bg_shot**2 + e_shot**2)
 
         snr_val = sig / tot_err
-        mask = snr > 10
+        mask = snr_val > 10
 
         log_snr = np.log10(snr_val[mask])
         p = np.polyfit(mags[mask], log_snr, 2)
@@ -620,6 +897,30 @@ def snr_curve(exptimes, mmin=20, mmax=30, filter_name="Ks",
 
 
 
+def _snr_cmds(filter_name, cmds=None, **kwargs):
+    """
+    Returns the ``UserCommands`` used by the SNR tools for ``filter_name``
+
+    The sky background is set to a flat spectrum with the Paranal sky
+    brightness for J, H and Ks and the detector noise is switched off
+    """
+
+    paranal_bg = {"J" : 16.5, "H" : 14.4, "Ks" : 13.6}
+
+    default_cmds = UserCommands()
+    default_cmds["ATMO_EC"] = "none"
+    default_cmds["FPA_USE_NOISE"] = "no"
+    if filter_name in paranal_bg.keys():
+        default_cmds["ATMO_BG_MAGNITUDE"] = paranal_bg[filter_name]
+
+    if cmds is not None:
+        default_cmds.update(cmds)
+
+    default_cmds.update(kwargs)
+
+    return default_cmds
+
+
 def plot_snr_curve(snr_array, mags, snr_markers=None):
     """
     Plots a single ``snr_curve()`` result
@@ -838,6 +1139,231 @@ def snr(exptimes, mags, filter_name="Ks", cmds=None, **kwargs):
 
 
 
+def snr_analytic(exptimes, mags, filter_names="Ks", ndits=1,
+                 aperture_radius=4, spec_type="A0V", opt_train=None,
+                 cmds=None, **kwargs):
+    """
+    Returns the signal-to-noise ratios of stars without simulating an image
+
+    The signal is the number of source photons that pass through the system
+    transmission curve (``OpticalTrain.tc_source``) and land inside a square
+    aperture with a half-width of ``aperture_radius`` pixels, as given by the
+    encircled energy of the PSF cube. The noise includes the shot noise of the
+    source, the sky and mirror backgrounds (``n_ph_atmo``, ``n_ph_mirror``,
+    ``n_ph_ao``), the dark current and the read noise of each DIT.
+
+    Only the :class:`.OpticalTrain` for each filter takes time to build. The
+    SNR for all magnitudes and exposure times are then calculated at once.
+
+    Parameters
+    ----------
+    exptimes : float, array-like
+        [s] Total exposure time(s)
+
+    mags : float, array-like
+        [mag] Magnitude(s) of the star(s) in the filter(s) ``filter_names``
+
+    filter_names : str, list, optional
+        The filter(s) to use. See :func:`~simcado.optics.get_filter_set`.
+        Default is "Ks"
+
+    ndits : int, array-like, optional
+        [#] Number of DITs for each exposure time. Default is 1
+
+    aperture_radius : int, optional
+        [pixels] Half-width of the square aperture. Default is 4
+
+    spec_type : str, optional
+        Spectral type of the stars. Default is "A0V"
+
+    opt_train : simcado.OpticalTrain, optional
+        A ready-made optical train. If given, ``filter_names``, ``cmds`` and
+        ``kwargs`` are ignored and only the filter of ``opt_train`` is used
+
+    cmds : UserCommands, optional
+        Commands to build the optical trains. The same defaults as for
+        :func:`.snr_curve` are used
+
+    Optional Parameters
+    -------------------
+    **kwargs : Any keyword-value pairs to be passed to the internal
+    :class:`.UserCommands` object
+
+    Returns
+    -------
+    snr_array : np.ndarray
+        The SNR with the dimensions (n_filters, n_exptimes, n_mags)
+
+    Examples
+    --------
+    ::
+
+        >>> exptimes = np.logspace(0, np.log10(18000), 30)
+        >>> mags = np.linspace(20, 30, 101)
+        >>> snrs = snr_analytic(exptimes, mags, filter_names=["J", "Ks"])
+        >>> snrs.shape
+        (2, 30, 101)
+
+    See Also
+    --------
+    :func:`.snr`, :func:`.limiting_mags_analytic`
+
+    """
+
+    exptimes = np.atleast_1d(np.asarray(exptimes, dtype=np.float64))
+    ndits = np.broadcast_to(np.asarray(ndits, dtype=np.float64),
+                            exptimes.shape)
+    mags = np.atleast_1d(np.asarray(mags, dtype=np.float64))
+
+    snr_array = []
+    for rates in _etc_rates_per_filter(filter_names, aperture_radius,
+                                       spec_type, opt_train, cmds, **kwargs):
+        sig = rates["src"] * exptimes[:, np.newaxis] * \
+              10**(-0.4 * mags[np.newaxis, :])
+        snr_array += [sig / np.sqrt(sig + _etc_noise(rates, exptimes,
+                                                     ndits)[:, np.newaxis])]
+
+    return np.array(snr_array)
+
+
+def limiting_mags_analytic(exptimes, filter_names="Ks", limiting_sigma=5,
+                           ndits=1, aperture_radius=4, spec_type="A0V",
+                           opt_train=None, cmds=None, **kwargs):
+    """
+    Returns the limiting magnitudes without simulating an image
+
+    Solves the noise model of :func:`.snr_analytic` for the magnitude at
+    which a star has a signal-to-noise ratio of ``limiting_sigma``
+
+    Parameters
+    ----------
+    exptimes : float, array-like
+        [s] Total exposure time(s)
+
+    filter_names : str, list, optional
+        The filter(s) to use. See :func:`~simcado.optics.get_filter_set`.
+        Default is "Ks"
+
+    limiting_sigma : float, optional
+        [sigma] The SNR that defines the limiting magnitude. Default is 5
+
+    Optional Parameters
+    -------------------
+    See :func:`.snr_analytic`
+
+    Returns
+    -------
+    mags_all : np.ndarray
+        [mag] The limiting magnitudes with the dimensions (n_filters, n_exptimes)
+
+    Examples
+    --------
+    ::
+
+        >>> exptimes = np.logspace(0, np.log10(18000), 30)
+        >>> lim_mags = limiting_mags_analytic(exptimes, ["J", "H", "Ks"])
+
+    """
+
+    exptimes = np.atleast_1d(np.asarray(exptimes, dtype=np.float64))
+    ndits = np.broadcast_to(np.asarray(ndits, dtype=np.float64),
+                            exptimes.shape)
+
+    k2 = limiting_sigma**2
+    mags_all = []
+    for rates in _etc_rates_per_filter(filter_names, aperture_radius,
+                                       spec_type, opt_train, cmds, **kwargs):
+        # solve sig**2 = k**2 * (sig + noise) for the signal
+        noise = _etc_noise(rates, exptimes, ndits)
+        sig = 0.5 * (k2 + np.sqrt(k2**2 + 4 * k2 * noise))
+        mags_all += [-2.5 * np.log10(sig / (rates["src"] * exptimes))]
+
+    return np.array(mags_all)
+
+
+def _etc_rates_per_filter(filter_names, aperture_radius=4, spec_type="A0V",
+                          opt_train=None, cmds=None, **kwargs):
+    """Yields the output of :func:`._etc_rates` for each filter"""
+
+    if opt_train is not None:
+        yield _etc_rates(opt_train, aperture_radius, spec_type)
+        return
+
+    if isinstance(filter_names, str):
+        filter_names = [filter_names]
+
+    for filt in filter_names:
+        filt_cmds = _snr_cmds(filt, deepcopy(cmds), **kwargs)
+        filt_cmds["INST_FILTER_TC"] = filt
+        yield _etc_rates(OpticalTrain(filt_cmds), aperture_radius, spec_type)
+
+
+def _etc_rates(opt_train, aperture_radius=4, spec_type="A0V"):
+    """
+    Returns the count rates needed by the analytic exposure time calculator
+
+    Parameters
+    ----------
+    opt_train : simcado.OpticalTrain
+
+    aperture_radius : int, optional
+        [pixels] Half-width of the square aperture. Default is 4
+
+    spec_type : str, optional
+        Spectral type of the star. Default is "A0V"
+
+    Returns
+    -------
+    rates : dict
+        - "src" : [e-/s] from a 0 mag star inside the aperture
+        - "bg" : [e-/s/pixel] from the backgrounds and the dark current
+        - "n_pix" : [#] pixels in the aperture
+        - "ron" : [e-] read noise per DIT
+
+    """
+
+    cmds = opt_train.cmds
+    oversample = cmds["SIM_DETECTOR_PIX_SCALE"] / opt_train.pix_res
+
+    # source photons per wavelength bin in [ph/s/m2], as in
+    # Source.apply_optical_train
+    star = source.stars([spec_type], [0], filter_name=cmds["INST_FILTER_TC"])
+    star._apply_transmission_curve(opt_train.tc_source)
+    edges = opt_train.lam_bin_edges
+
+    n_ph_ap = 0
+    for i in range(len(edges) - 1):
+        n_ph = star.photons_in_range(edges[i], edges[i+1])[0]
+
+        psf_i = utils.nearest(opt_train.psf.lam_bin_centers,
+                              opt_train.lam_bin_centers[i])
+        psf = np.copy(opt_train.psf[psf_i].array)
+        if cmds["SCOPE_JITTER_FWHM"] > 0.33 * opt_train.pix_res:
+            psf = opt_train.apply_wind_jitter(psf)
+
+        # square aperture of (2r+1) detector pixels around the PSF centre
+        width = int(round((2 * aperture_radius + 1) * oversample))
+        x0 = psf.shape[0] // 2 - width // 2
+        y0 = psf.shape[1] // 2 - width // 2
+        ee = np.sum(psf[max(x0, 0):x0+width, max(y0, 0):y0+width]) / \
+             np.sum(psf)
+
+        n_ph_ap += n_ph * ee
+
+    n_ph_bg = opt_train.n_ph_atmo + opt_train.n_ph_mirror + opt_train.n_ph_ao
+
+    rates = {"src"   : n_ph_ap * cmds.area,
+             "bg"    : n_ph_bg * oversample**2 + cmds["FPA_DARK_MEDIAN"],
+             "n_pix" : (2 * aperture_radius + 1)**2,
+             "ron"   : cmds["FPA_READOUT_MEDIAN"]}
+
+    return rates
+
+
+def _etc_noise(rates, exptimes, ndits):
+    """Variance of the aperture sum without the source shot noise [e-^2]"""
+    return rates["n_pix"] * (rates["bg"] * exptimes + ndits * rates["ron"]**2)
+
 
 
 # def snr_old(mags, filter_name="Ks", total_exptime=18000, ndit=1, cmds=None):
@@ -95,7 +95,7 @@ Helper functions
 import os
 
 import warnings
-from copy import deepcopy
+from copy import copy, deepcopy
 from glob import glob
 
 import numpy as np
@@ -113,11 +113,11 @@ from .spectral import TransmissionCurve, EmissionCurve,\
     UnityCurve, BlackbodyCurve
 from . import psf as sim_psf
 from . import utils
-from .utils import __pkg_dir__, find_file
+from .utils import __pkg_dir__, find_file, read_table, read_fits_data
 
 import synphot
 
-__all__ = ["Source",
+__all__ = ["Source", "SourceBuilder",
            "star", "stars", "cluster",
            "spiral", "spiral_profile", "elliptical", "sersic_profile"
            "source_from_image",
@@ -139,6 +139,33 @@ __all__ = ["Source",
 # apply_optical_train() moved to Source
 
 
+class _Column(object):
+    """
+    An array with one value per emitting object of a ``Source``
+
+    The columns of a Source are kept in its ``_columns`` dictionary. Values
+    which are assigned are converted to ``dtype``, without a copy if they
+    already have it. A ``dtype`` of None uses ``params["weight_dtype"]``
+    """
+
+    def __init__(self, name, dtype=None):
+        self.name = name
+        self.dtype = dtype
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        return obj.__dict__.setdefault("_columns", {}).get(self.name)
+
+    def __set__(self, obj, value):
+        dtype = self.dtype
+        if dtype is None:
+            dtype = obj.params.get("weight_dtype", np.float32)
+        if value is not None:
+            value = np.asarray(value, dtype=dtype)
+        obj.__dict__.setdefault("_columns", {})[self.name] = value
+
+
 class Source(object):
     """
     Create a source object from a file or from arrays
@@ -190,9 +217,24 @@ class Source(object):
         brightness calculations
     bg_spectrum : EmissionCurve
         If there is a surface brightness term to add, add it here
+    weight_dtype : np.dtype
+        The type of the ``weight`` array. Default is np.float32
+
+    Notes
+    -----
+    The arrays with one value per object are stored compactly: ``x`` and
+    ``y`` as float32, ``ref`` as int32 and ``weight`` as ``weight_dtype``.
+    Arrays assigned to them are converted. ``x_orig`` and ``y_orig`` are only
+    kept separately once ``rotate``, ``shift`` or ``scale_with_distance``
+    have changed the coordinates. Until then they are ``x`` and ``y``
 
     """
 
+    x = _Column("x", np.float32)
+    y = _Column("y", np.float32)
+    ref = _Column("ref", np.int32)
+    weight = _Column("weight")
+
     def __init__(self, filename=None,
                  lam=None, spectra=None, x=None, y=None, ref=None, weight=None,
                  **kwargs):
@@ -202,18 +244,15 @@ class Source(object):
                        "exptime" : 1,
                        "area"    : 1,
                        "pix_res" : 0.004,
-                       "bg_spectrum" : None}
+                       "bg_spectrum" : None,
+                       "weight_dtype": np.float32}
         self.params.update(kwargs)
-
-        if isinstance(x, (tuple, list)):
-            x = np.array(x)
-        if isinstance(y, (tuple, list)):
-            y = np.array(y)
+        self._columns = {}
 
         if x is not None:
-            x = x.astype(np.float32)
+            x = np.array(x, dtype=np.float32)
         if y is not None:
-            y = y.astype(np.float32)
+            y = np.array(y, dtype=np.float32)
 
         if "pix" in self.params["pix_unit"]:
             x *= self.params["pix_res"]
@@ -252,13 +291,47 @@ class Source(object):
         else:
             raise ValueError("Trouble with inputs. Could not create Source")
 
-        self.ref = np.array(self.ref, dtype=int)
-        self.x_orig = deepcopy(self.x)
-        self.y_orig = deepcopy(self.y)
         self.spectra_orig = deepcopy(self.spectra)
 
         self.bg_spectrum = None
 
+    @property
+    def x_orig(self):
+        """[arcsec] x before any ``rotate``, ``shift`` or scaling"""
+        return self._columns.get("x_orig", self.x)
+
+    @property
+    def y_orig(self):
+        """[arcsec] y before any ``rotate``, ``shift`` or scaling"""
+        return self._columns.get("y_orig", self.y)
+
+    def _keep_orig_xy(self):
+        """Copy x and y to x_orig and y_orig before they are first changed"""
+        if "x_orig" not in self._columns:
+            self._columns["x_orig"] = np.copy(self.x)
+            self._columns["y_orig"] = np.copy(self.y)
+
+    def _forget_orig_xy(self):
+        """Make the current x and y the original coordinates"""
+        self._columns.pop("x_orig", None)
+        self._columns.pop("y_orig", None)
+
+    def __setstate__(self, state):
+        # Sources pickled before the columns were kept in ``_columns``
+        columns = {key: state.pop(key) for key in
+                   ["x", "y", "ref", "weight", "x_orig", "y_orig"]
+                   if key in state}
+        self.__dict__.update(state)
+        self.__dict__.setdefault("_columns", {})
+        for key in ["x", "y", "ref", "weight"]:
+            if key in columns:
+                setattr(self, key, columns[key])
+        if "x_orig" in columns:
+            self._columns["x_orig"] = np.asarray(columns["x_orig"],
+                                                 dtype=np.float32)
+            self._columns["y_orig"] = np.asarray(columns["y_orig"],
+                                                 dtype=np.float32)
+
     @classmethod
     def load(cls, filename):
         """Load :class:'.Source' object from filename"""
@@ -274,7 +347,8 @@ class Source(object):
             pickle.dump(self, fp1)
 
     def apply_optical_train(self, opt_train, detector, chips="all",
-                            sub_pixel=False, **kwargs):
+                            sub_pixel=False, apply_transmission=True,
+                            **kwargs):
         """
         Apply all effects along the optical path to the source photons
 
@@ -290,6 +364,10 @@ class Source(object):
         sub_pixel : bool, optional
             if sub-pixel accuracy is needed, each source is shifted individually.
             Default is False
+        apply_transmission : bool, optional
+            Default is True. If False, the spectra are expected to already hold
+            the photons passed by ``opt_train.tc_source``, e.g. when the chips
+            are imaged one at a time
 
         Other Parameters
         ----------------
@@ -346,7 +424,8 @@ class Source(object):
             chips = [chips]
 
         # 1.
-        self._apply_transmission_curve(opt_train.tc_source)
+        if apply_transmission:
+            self._apply_transmission_curve(opt_train.tc_source)
 
         for chip_i in chips:
             print("Generating image for chip", detector.chips[chip_i].id)
@@ -355,11 +434,14 @@ class Source(object):
             image = None
 
             # 2.
-            for i in range(len(opt_train.lam_bin_edges[:-1])):
+            # The image is linear in the photons, so neighbouring wavelength
+            # slices with the same PSF object and ADC shift are imaged in one
+            # go over their combined wavelength range
+            for i, j in _shared_psf_slices(opt_train):
 
                 if params["verbose"]:
                     print("Wavelength slice [um]:",
-                          opt_train.lam_bin_centers[i])
+                          opt_train.lam_bin_centers[i:j+1])
 
                 # apply the adc shifts
                 self._x = self.x + opt_train.adc_shifts[0][i]
@@ -368,10 +450,9 @@ class Source(object):
                 # include any other shifts here
 
                 # apply the psf (get_slice_photons is called within)
-                lam_min, lam_max = opt_train.lam_bin_edges[i:i+2]
-                psf_i = utils.nearest(opt_train.psf.lam_bin_centers,
-                                      opt_train.lam_bin_centers[i])
-                psf = opt_train.psf[psf_i]
+                lam_min = opt_train.lam_bin_edges[i]
+                lam_max = opt_train.lam_bin_edges[j+1]
+                psf = _slice_psf(opt_train, i)
 
                 oversample = opt_train.cmds["SIM_OVERSAMPLING"]
                 sub_pixel = params["sub_pixel"]
@@ -632,6 +713,11 @@ class Source(object):
             except ValueError:
                 slice_array = convolve(slice_array, psf.array)
 
+        # flux outside the radius of a truncated PSF is spread over the chip
+        if params["sub_pixel"] != "raw" and psf.info.get("halo", 0) > 0:
+            slice_array += psf.info["halo"] * np.sum(slice_photons[mask]) / \
+                           slice_array.size
+
         return slice_array
 
     def photons_in_range(self, lam_min=None, lam_max=None):
@@ -718,6 +804,7 @@ class Source(object):
             >>> src.scale_with_distance( new_dist/curr_dist )
 
         """
+        self._keep_orig_xy()
         self.x /= distance_factor
         self.y /= distance_factor
         self.weight /= distance_factor**2
@@ -746,8 +833,9 @@ class Source(object):
             current coordinates (e.g. if rotation has already been applied)
 
         """
-        ang = (angle * u.Unit(unit)).to(u.rad)
+        ang = (angle * u.Unit(unit)).to(u.rad).value
 
+        self._keep_orig_xy()
         if use_orig_xy:
             xold, yold = self.x_orig, self.y_orig
         else:
@@ -775,6 +863,7 @@ class Source(object):
         self.dx = dx
         self.dy = dy
 
+        self._keep_orig_xy()
         if use_orig_xy:
             self.x = self.x_orig + dx
             self.y = self.y_orig + dy
@@ -1040,7 +1129,7 @@ class Source(object):
         if weight is not None:
             self.weight = weight
         else:
-            self.weight = np.array([1] * len(x))
+            self.weight = np.ones(len(x))
         self.lam_res = np.median(lam[1:] - lam[:-1])
 
         if len(spectra.shape) == 1:
@@ -1067,31 +1156,15 @@ class Source(object):
         return newsrc
 
     def __add__(self, x):
-        newsrc = deepcopy(self)
         if isinstance(x, Source):
-            if self.units != x.units:
-                raise ValueError("units are not compatible: " +
-                                 str(self.units) + ", " + str(x.units))
-
-            newsrc.lam = self.lam
-            newsrc.spectra = list(self.spectra)
-            # Resample new spectra to wavelength grid of self
-            for spec in x.spectra:
-                tmp = np.interp(self.lam, x.lam, spec)
-                scale_factor = np.sum(spec) / np.sum(tmp)
-                newsrc.spectra += [tmp * scale_factor]
-            newsrc.spectra = np.asarray(newsrc.spectra)
-            newsrc.spectra_orig = newsrc.spectra
-            newsrc.x = np.array((list(self.x) + list(x.x)))
-            newsrc.y = np.array((list(self.y) + list(x.y)))
-            newsrc.ref = np.array((list(self.ref) +
-                                   list(x.ref + self.spectra.shape[0])))
-            newsrc.weight = np.array((list(self.weight) + list(x.weight)))
-
-            newsrc.x_orig = deepcopy(newsrc.x)
-            newsrc.y_orig = deepcopy(newsrc.y)
+            # Resample new spectra to wavelength grid of self. To combine
+            # many sources, use a SourceBuilder instead of repeated +=
+            builder = SourceBuilder([self], merge_duplicates=False)
+            builder.add(x)
+            newsrc = builder.build()
 
         else:
+            newsrc = deepcopy(self)
             newsrc.spectra += x
 
         newsrc.info["object"] = "combined"
@@ -1129,6 +1202,167 @@ class Source(object):
         return self.__sub__(x)
 
 
+class SourceBuilder(object):
+    """
+    Collect the components of a scene and combine them into one Source
+
+    Adding N sources with ``+=`` copies the growing Source N times. A
+    ``SourceBuilder`` keeps the components until :meth:`build` concatenates
+    them in one go
+
+    Parameters
+    ----------
+    sources : list, optional
+        ``Source`` objects to start with
+    lam : np.ndarray, optional
+        [um] The wavelength grid of the combined Source. Default is the grid
+        of the first component
+    merge_duplicates : bool, optional
+        Default True. Spectra which are identical on the common grid are only
+        kept once in the combined Source
+
+    Examples
+    --------
+    ::
+
+        >>> from simcado.source import SourceBuilder, star
+        >>>
+        >>> builder = SourceBuilder()
+        >>> for i in range(100):
+        ...     builder += star(mag=20, x=i, y=0)
+        >>> src = builder.build()
+
+    """
+
+    def __init__(self, sources=None, lam=None, merge_duplicates=True):
+        self.sources = [] if sources is None else list(sources)
+        self.lam = lam
+        self.merge_duplicates = merge_duplicates
+
+    def add(self, src):
+        """
+        Add a Source to the list of components
+
+        Parameters
+        ----------
+        src : Source
+
+        """
+        if not isinstance(src, Source):
+            raise TypeError("Only Source objects can be added: " + str(src))
+        if self.sources and src.units != self.sources[0].units:
+            raise ValueError("units are not compatible: " +
+                             str(self.sources[0].units) + ", " +
+                             str(src.units))
+        self.sources += [src]
+
+    def __iadd__(self, src):
+        self.add(src)
+        return self
+
+    def __len__(self):
+        return len(self.sources)
+
+    def build(self):
+        """
+        Combine the components into one Source
+
+        The combined Source takes its parameters and info from the first
+        component. Spectra on other wavelength grids are interpolated onto
+        ``lam`` and rescaled to keep their total flux, like ``Source.__add__``
+
+        Returns
+        -------
+        src : Source
+
+        """
+        if not self.sources:
+            raise ValueError("SourceBuilder has no sources to combine")
+
+        first = self.sources[0]
+        lam = first.lam if self.lam is None else np.asarray(self.lam)
+
+        spectra = self._spectra_on_grid(lam)
+        offsets = np.cumsum([0] + [len(spec) for spec in spectra[:-1]])
+        spectra = np.concatenate(spectra)
+        ref = np.concatenate([src.ref + off for src, off in
+                              zip(self.sources, offsets)])
+
+        if self.merge_duplicates:
+            _, first_i, inverse = np.unique(spectra, axis=0,
+                                            return_index=True,
+                                            return_inverse=True)
+            # keep the spectra in the order they first appear
+            order = np.argsort(first_i)
+            rank = np.empty_like(order)
+            rank[order] = np.arange(len(order))
+            spectra = spectra[first_i[order]]
+            ref = rank[inverse.ravel()][ref]
+
+        newsrc = copy(first)
+        newsrc.params = dict(first.params)
+        newsrc.info = deepcopy(first.info)
+        # image_in_range() leftovers of the first component don't fit anymore
+        for attr in ["_x", "_y", "x_pix", "y_pix"]:
+            newsrc.__dict__.pop(attr, None)
+
+        newsrc._columns = {}
+        newsrc.lam = lam
+        newsrc.spectra = spectra
+        newsrc.spectra_orig = spectra
+        newsrc.x = np.concatenate([src.x for src in self.sources])
+        newsrc.y = np.concatenate([src.y for src in self.sources])
+        newsrc.ref = ref
+        newsrc.weight = np.concatenate([src.weight for src in self.sources])
+
+        return newsrc
+
+    def _spectra_on_grid(self, lam):
+        """
+        Returns the spectra of each component on ``lam``. The spectra of all
+        components with the same other grid are interpolated together
+        """
+        spectra = [None] * len(self.sources)
+        grids = {}
+        for i, src in enumerate(self.sources):
+            if np.array_equal(src.lam, lam):
+                spectra[i] = src.spectra
+            else:
+                key = np.asarray(src.lam).tobytes()
+                grids.setdefault(key, []).append(i)
+
+        for indices in grids.values():
+            spec = np.concatenate([self.sources[i].spectra for i in indices])
+            tmp = _interp_spectra(lam, self.sources[indices[0]].lam, spec)
+
+            # keep the total flux of each spectrum
+            sums = np.sum(tmp, axis=1)
+            factor = np.ones_like(sums)
+            np.divide(np.sum(spec, axis=1), sums, out=factor, where=sums != 0)
+            tmp *= factor[:, None]
+
+            splits = np.cumsum([len(self.sources[i].spectra)
+                                for i in indices])[:-1]
+            for i, block in zip(indices, np.split(tmp, splits)):
+                spectra[i] = block
+
+        return spectra
+
+
+def _interp_spectra(lam, lam_src, spectra):
+    """
+    Returns ``np.interp(lam, lam_src, spec)`` for each row of ``spectra``
+
+    Values outside ``lam_src`` are those at its ends, as with ``np.interp``
+    """
+    lam, lam_src = np.asarray(lam), np.asarray(lam_src)
+    i = np.clip(np.searchsorted(lam_src, lam, side="right"), 1,
+                len(lam_src) - 1)
+    w = np.clip((lam - lam_src[i - 1]) / (lam_src[i] - lam_src[i - 1]), 0, 1)
+
+    return spectra[:, i - 1] * (1 - w) + spectra[:, i] * w
+
+
 ##############################################################################
 
 
@@ -1156,7 +1390,7 @@ def _get_stellar_properties(spec_type, cat=None, verbose=False):
     """
 
     if cat is None:
-        cat = ioascii.read(find_file("EC_all_stars.csv"))
+        cat = read_table(find_file("EC_all_stars.csv"))
 
     if isinstance(spec_type, (list, tuple)):
         return [_get_stellar_properties(i, cat) for i in spec_type]
@@ -1262,7 +1496,7 @@ def _get_pickles_curve(spec_type, cat=None, verbose=False):
 
     """
     if cat is None:
-        cat = fits.getdata(find_file("EC_pickles.fits"))
+        cat = read_fits_data(find_file("EC_pickles.fits"))
 
     if isinstance(spec_type, (list, tuple)):
         return cat["lam"], [_get_pickles_curve(i, cat)[1] for i in spec_type]
@@ -1490,7 +1724,7 @@ def _get_refstar_curve(filename=None,mag=0):
     TODO: Obsolete? We now use synphot
     """
     ## TODO: Can we pre-select a star based on the instrument we're simulating?
-    data = ioascii.read(find_file("vega.dat"))
+    data = read_table(find_file("vega.dat"))
     #data = ioascii.read(find_file("sirius_downsampled.txt"))
 
     mag_scale_factor = 10**(-mag/2.5)
@@ -1596,7 +1830,7 @@ def zero_magnitude_photon_flux(filter_name):
             if fname is None:
                 raise ValueError("Filter " + filter_name + "cannot be found")
 
-        vraw = ioascii.read(fname)
+        vraw = read_table(fname)
         vlam = vraw[vraw.colnames[0]]
         vval = vraw[vraw.colnames[1]]
 
@@ -1768,7 +2002,7 @@ def SED(spec_type, filter_name="V", magnitude=0.):
     if np.any([i in gal_seds for i in spec_type]):
         galflux = []
         for gal in spec_type:
-            data = ioascii.read(find_file("data/SED_"+gal+".dat"))
+            data = read_table(find_file("data/SED_"+gal+".dat"))
             galflux += [data[data.colnames[1]]]
             galflux = np.asarray(galflux)
         lam = data[data.colnames[0]]
@@ -1980,9 +2214,7 @@ def stars(spec_types=("A0V"), mags=(0), filter_name="Ks",
     if isinstance(mags, (int, float)):
         mags = [mags] * len(spec_types)
 
-    if len(mags) > 1  and len(spec_types) == 1:
-        spec_types *= len(mags)
-    elif len(mags) != len(spec_types):
+    if len(mags) != len(spec_types) and len(spec_types) != 1:
         raise ValueError("len(mags) != len(spec_types)")
 
     mags = np.array(mags)
@@ -1994,19 +2226,15 @@ def stars(spec_types=("A0V"), mags=(0), filter_name="Ks",
 
     # only pull in the spectra for unique spectral types
 
+    # get the references to the unique stellar types
+    unique_types, ref = np.unique(spec_types, return_inverse=True)
+    if len(spec_types) == 1:
+        ref = np.zeros(len(mags), dtype=np.int32)
+
     # assign absolute magnitudes to stellar types in cluster
-    unique_types = np.unique(spec_types)
     lam, spec = SED(unique_types, filter_name=filter_name,
                     magnitude=[0]*len(unique_types))
 
-    # get the references to the unique stellar types
-    ref_dict = {i : j for i, j in zip(unique_types,
-                                      np.arange(len(unique_types)))}
-    if isinstance(spec_types, (list, tuple, np.ndarray)):
-        ref = np.array([ref_dict[i] for i in spec_types])
-    else:
-        ref = np.zeros(len(mags))
-
     weight = 10**(-0.4*mags)
 
     units = "ph/s/m2"
@@ -2306,14 +2534,13 @@ def source_from_image(images, lam, spectra, plate_scale, oversample=1,
     """
 
     if isinstance(images, (list, tuple)):
-        srclist = [source_from_image(images[i], lam, spectra[i, :], plate_scale,
-                                     oversample, units, flux_threshold,
-                                     center_offset)
-                   for i in range(len(images))]
-        fullsrc = srclist[0]
-        for src in srclist[1:]:
-            fullsrc += src
-        return fullsrc
+        builder = SourceBuilder()
+        for i in range(len(images)):
+            builder += source_from_image(images[i], lam, spectra[i, :],
+                                         plate_scale, oversample, units,
+                                         flux_threshold, center_offset,
+                                         conserve_flux, **kwargs)
+        return builder.build()
 
     else:
         # if not isinstance(oversample, int):
@@ -2638,7 +2865,7 @@ def get_lum_class_params(lum_class="V", cat=None):
     import astropy.table as tbl
 
     if cat is None:
-        cat = ioascii.read(find_file("EC_all_stars.csv"))
+        cat = read_table(find_file("EC_all_stars.csv"))
 
     t = []
     for row in cat:
@@ -2689,7 +2916,7 @@ def get_nearest_spec_type(value, param="B-V", cat=None):
     """
 
     if cat is None:
-        cat = ioascii.read(find_file("EC_all_stars.csv"))
+        cat = read_table(find_file("EC_all_stars.csv"))
 
     if isinstance(value, (np.ndarray, list, tuple)):
         spt = []
@@ -2705,6 +2932,42 @@ def get_nearest_spec_type(value, param="B-V", cat=None):
     return spec_type
 
 
+def _slice_psf(opt_train, i):
+    """Returns the PSF of the OpticalTrain for wavelength slice i"""
+    psf_i = utils.nearest(opt_train.psf.lam_bin_centers,
+                          opt_train.lam_bin_centers[i])
+    return opt_train.psf[psf_i]
+
+
+def _shared_psf_slices(opt_train):
+    """
+    Group the wavelength slices of an OpticalTrain which can be imaged together
+
+    Parameters
+    ----------
+    opt_train : simcado.OpticalTrain
+
+    Returns
+    -------
+    groups : list
+        (first, last) indices of runs of neighbouring slices which have the
+        same PSF object and the same ADC shifts
+
+    """
+    adc_x, adc_y = opt_train.adc_shifts
+    groups = []
+    for i in range(len(opt_train.lam_bin_edges) - 1):
+        if groups:
+            first = groups[-1][0]
+            if _slice_psf(opt_train, i) is _slice_psf(opt_train, first) and \
+                    adc_x[i] == adc_x[first] and adc_y[i] == adc_y[first]:
+                groups[-1][1] = i
+                continue
+        groups += [[i, i]]
+
+    return [tuple(group) for group in groups]
+
+
 def spectrum_sum_over_range(lam, flux, lam_min=None, lam_max=None):
     """
     Sum spectrum over range lam_min to lam_max
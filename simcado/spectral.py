@@ -66,7 +66,7 @@ from astropy.io import ascii as ioascii  # 'ascii' redefines built-in
 import astropy.table 
 import yaml
 
-from .utils import find_file
+from .utils import find_file, read_table, read_fits_data
 
 __all__ = []
 __all__ = ["TransmissionCurve", "EmissionCurve", "BlackbodyCurve", "UnityCurve",
@@ -134,7 +134,8 @@ class TransmissionCurve(object):
         self.info["Type"] = self.params["Type"]
 
         self.lam_orig, self.val_orig = self._get_data()
-        self.lam_orig *= (1 * self.params["lam_unit"]).to(u.um).value
+        self.lam_orig = self.lam_orig * \
+            (1 * self.params["lam_unit"]).to(u.um).value
 
         self.lam = self.lam_orig
         self.val = self.val_orig
@@ -183,12 +184,13 @@ class TransmissionCurve(object):
                 hdr = fits.getheader(filename)
                 if any(["SKYCALC" in hdr[i] for i in range(len(hdr)) \
                         if isinstance(hdr[i], str)]):
+                    data = read_fits_data(filename)
                     if self.params["Type"] == "Emission":
-                        lam = fits.getdata(filename)["lam"]
-                        val = fits.getdata(filename)["flux"]
+                        lam = data["lam"]
+                        val = data["flux"]
                     else:
-                        lam = fits.getdata(filename)["lam"]
-                        val = fits.getdata(filename)["trans"]
+                        lam = data["lam"]
+                        val = data["trans"]
                 else:
                     data = fits.getdata("../data/skytable.fits")
                     lam = data[data.columns[0].name]
@@ -199,7 +201,7 @@ class TransmissionCurve(object):
                                             airmass=self.params["airmass"])
 
             else:
-                data = ioascii.read(filename)
+                data = read_table(filename)
                 lam = data[data.colnames[0]]
                 val = data[data.colnames[1]]
         else:
@@ -212,10 +214,9 @@ class TransmissionCurve(object):
                  use_default_lam=False):
         """
         Resamples both the wavelength and value vectors to an even grid.
-        In order to avoid losing spectral information, the TransmissionCurve
-        resamples down to a resolution of 'min_step' (default: 0.01nm)
-        before resampling again up to the given sampling vector defined by
-        'bins'.
+        The new values are found by integrating the linear interpolation of
+        the original curve over each of the new wavelength bins, so no
+        spectral information is lost.
 
         Parameters
         ----------
@@ -232,7 +233,8 @@ class TransmissionCurve(object):
             [False, True] True if the array passed in 'bins' describes
             the edges of the wavelength bins. Default is False
         min_step : float, optional
-            [um] default=1E-4, the step size for the down-sample
+            [um] default=1E-4. No longer used for the resampling, which is
+            exact, but kept in ``params`` for backwards compatibility
         use_default_lam : bool, optional
             Default is False. If True, ``bins`` is ignored and the default
             wavelength range is used as the resampling grid.
@@ -247,16 +249,6 @@ class TransmissionCurve(object):
         if self.params["on_default_lam"] and self.params["use_default_lam"]:
             return
 
-        #####################################################
-        # Work out the irregular grid problem while summing #
-        #####################################################
-
-        tmp_x = np.arange(self.lam_orig[0], self.lam_orig[-1],
-                          self.params["min_step"])
-        tmp_y = np.interp(tmp_x, self.lam_orig, self.val_orig)
-
-        #print("resampling", len(self.lam_orig))
-
         # use_default_lam overrides the bins argument
         if self.params["use_default_lam"]:
             lam_tmp = self.params["default_lam"]
@@ -270,45 +262,32 @@ class TransmissionCurve(object):
             else:
                 lam_tmp = bins
 
-
         lam_res = lam_tmp[1] - lam_tmp[0]
-        if self.params["min_step"] >= lam_res:
-            warnings.warn("min_step > resample resolution. Can't resample")
 
         # define the edges and centres of each wavelength bin
         if use_edges:
             lam_bin_edges = lam_tmp
-            lam_bin_centers = 0.5 * (lam_tmp[1:] + lam_tmp[:-1])
         else:
             lam_bin_edges = np.append(lam_tmp - 0.5*lam_res,
                                       lam_tmp[-1] + 0.5*lam_res)
-            lam_bin_centers = lam_tmp
-
-        # here is the assumption of a regular grid - see res_tmp
-        val_tmp = np.zeros((len(lam_bin_centers)))
-
-        for i in range(len(lam_bin_centers)):
 
-            mask_i = np.where((tmp_x > lam_bin_edges[i]) *
-                              (tmp_x < lam_bin_edges[i+1]))[0]
-
-            if np.sum(mask_i) > 0 and action == "average":
-                val_tmp[i] = np.average(tmp_y[mask_i[0]:mask_i[-1]])
-
-            elif np.sum(mask_i) > 0 and action == "sum":
-                # FIXED. THE SUMMING ISSUE. TEST IT         #
-                # Tested - the errors are on the 0.1% level #
-                val_tmp[i] = np.trapz(tmp_y[mask_i[0]:mask_i[-1]])
-            else:
-                val_tmp[i] = 0
-
-        # The summing issue - assuming we want to integrate along the curve,
-        # i.e. count all the photons in a new set of bins, we need to integrate
-        # along the well-sampled (1E-5um) curve. However the above line of code
-        # using np.interp doesn't take into account the new bin width when
-        # resampling down to 1E-5um. I account for this summing up all the
-        # photons in the original data set and normalising the new 1E-5 bin
-        # data set to have the same amount.
+        # Only the part of each bin inside the original wavelength range
+        # counts. Bins outside the range are set to zero
+        lam_orig = np.asarray(self.lam_orig, dtype=np.float64)
+        val_orig = np.asarray(self.val_orig, dtype=np.float64)
+        edges = np.clip(lam_bin_edges, lam_orig[0], lam_orig[-1])
+        cum_val = _cumulative_integral(lam_orig, val_orig, edges)
+
+        val_tmp = np.diff(cum_val)
+        if action == "average":
+            width = np.diff(edges)
+            val_tmp = np.divide(val_tmp, width, out=np.zeros_like(val_tmp),
+                                where=width > 0)
+
+        # The summing issue - assuming we want to count all the photons in a
+        # new set of bins, the integral needs to be converted back to counts
+        # per bin. Normalise so that the new bins hold the same number of
+        # photons as the original data set.
         if action == "sum" and np.sum(val_tmp) != 0:
             val_tmp *= (np.sum(self.val_orig) / np.sum(val_tmp))
 
@@ -690,28 +669,13 @@ class BlackbodyCurve(EmissionCurve):
         # if self.params["area"] < 1E-6:
         #    self.params["area"] = 1E-6
 
-        temp += 273.15
-
         lam_res = lam[1] - lam[0]
         edges = np.append(lam - 0.5 * lam_res, lam[-1] + 0.5 * lam_res)
         lam_res = edges[1:] - edges[:-1]
 
-        # I is in W sr-1 m-3 : [erg/s/sr/cm2/um]
-        exparg = c.h * c.c / (c.k_B * (temp * u.K) * (lam * u.um))
-
-        if np.any(exparg.si > 500):  # Wien approximation to avoid overflow
-            I = 2. * c.h * c.c**2 /(lam * u.um)**5 * np.exp(-exparg)
-        else:                        # Full Planck formula
-            I = 2. * c.h * c.c**2 / (lam * u.um)**5 / (np.exp(exparg) - 1.)
-
-        I = I / u.sr    # make it explicit that this is per steradian
-
-        # E is in W
-        E = I * (self.params["area"] * u.m**2) * (lam_res * u.um) * \
-                (self.params["pix_res"] * u.arcsec)**2
         # ph is in 1/s
-        ph = E / (c.h * c.c / (lam * u.um))
-        val = ph.si.value
+        val = _blackbody_photons(lam, temp, lam_res) * \
+              self.params["area"] * self.params["pix_res"]**2
 
         super(BlackbodyCurve, self).__init__(lam=lam, val=val, units="1/s",
                                              **self.params)
@@ -733,6 +697,72 @@ class UnityCurve(TransmissionCurve):
 
 
 
+# Planck constants folded for lam in [um], area in [m2] and solid angle in
+# [arcsec2]: hc/k in [um K] and 2c in [ph s-1 um3 m-2 arcsec-2]
+_BB_EXP_CONST = (c.h * c.c / c.k_B).to(u.um * u.K).value
+_BB_PH_CONST = (2 * c.c * u.m**2 * u.um / u.um**4).to(1 / u.s).value * \
+               (1 * u.arcsec).to(u.rad).value**2
+
+
+def _blackbody_photons(lam, temp, lam_res):
+    """
+    Blackbody photon rate per wavelength bin, without astropy units
+
+    Parameters
+    ----------
+    lam : np.ndarray
+        [um] the centres of the wavelength bins
+    temp : float, np.ndarray
+        [deg C] temperature(s). Arrays broadcast against ``lam``, e.g. a
+        (n, 1) array of temperatures gives (n, len(lam)) spectra
+    lam_res : float, np.ndarray
+        [um] the widths of the wavelength bins
+
+    Returns
+    -------
+    ph : np.ndarray
+        [ph s-1 m-2 arcsec-2] photons per second per wavelength bin
+
+    """
+    temp = np.asarray(temp, dtype=float) + 273.15
+    lam = np.asarray(lam, dtype=float)
+
+    # 1 / expm1 is the full Planck formula and degrades gracefully to the
+    # Wien approximation (and to zero) where exp() would overflow
+    with np.errstate(over="ignore"):
+        occupation = 1. / np.expm1(_BB_EXP_CONST / (temp * lam))
+
+    return _BB_PH_CONST * lam_res / lam**4 * occupation
+
+
+def _cumulative_integral(x, y, x_new):
+    """
+    Integral of the linear interpolation of (x, y) from x[0] to each x_new
+
+    Parameters
+    ----------
+    x, y : np.ndarray
+        The curve. ``x`` must be sorted in ascending order
+    x_new : np.ndarray
+        The upper integration limits. Must be in the range [x[0], x[-1]]
+
+    Returns
+    -------
+    cum_y : np.ndarray
+        Same length as ``x_new``
+
+    """
+    # cumulative trapezoid integral at the original sampling points
+    cum_y = np.zeros(len(x))
+    cum_y[1:] = np.cumsum(0.5 * (y[1:] + y[:-1]) * np.diff(x))
+
+    # add the partial trapezoid from the point just below each x_new
+    i = np.clip(np.searchsorted(x, x_new, side="right") - 1, 0, len(x) - 1)
+    y_new = np.interp(x_new, x, y)
+
+    return cum_y[i] + 0.5 * (y[i] + y_new) * (x_new - x[i])
+
+
 def get_sky_spectrum(fname, airmass, return_type=None, **kwargs):
     """
     Return a spectral curve for the sky for a certain airmass
@@ -767,7 +797,7 @@ def get_sky_spectrum(fname, airmass, return_type=None, **kwargs):
     if not os.path.exists(fname):
         raise OSError("File doesn't exist: " + fname)
 
-    data = ioascii.read(fname)
+    data = read_table(fname)
     tbl_airmass = np.array([float(i[1:]) for i in data.colnames[2:]])
 
     lam = data[data.colnames[0]]
@@ -0,0 +1,53 @@
+"""Unit tests for class simcado.commands.UserCommands"""
+
+from collections import ChainMap
+from copy import deepcopy
+
+from simcado.commands import UserCommands
+
+
+def _bare_cmds(monkeypatch, refreshes):
+    def _refresh(self):
+        self._stale = False
+        refreshes.append(self)
+        self.exptime = self._cmds["OBS_EXPTIME"]
+
+    monkeypatch.setattr(UserCommands, "_refresh", _refresh)
+
+    cmds = UserCommands.__new__(UserCommands)
+    cmds._stale, cmds._memo = False, {}
+    cmds._cmds = ChainMap({}, {"OBS_EXPTIME": 60, "OBS_NDIT": 1})
+    return cmds
+
+
+class TestLazyUpdates:
+    """Tests of the deferred processing of changed keywords"""
+
+    def test_a_series_of_changes_is_processed_once(self, monkeypatch):
+        refreshes = []
+        cmds = _bare_cmds(monkeypatch, refreshes)
+
+        cmds["OBS_EXPTIME"] = 10
+        cmds["OBS_NDIT"] = 5
+        cmds.update({"OBS_EXPTIME": 20})
+        assert len(refreshes) == 0
+
+        assert cmds.exptime == 20 and cmds["OBS_NDIT"] == 5
+        assert cmds.exptime == 20
+        assert len(refreshes) == 1
+
+
+class TestCopyOnWrite:
+    """Tests of copying UserCommands objects"""
+
+    def test_copies_share_the_base_layer_only(self, monkeypatch):
+        cmds = _bare_cmds(monkeypatch, [])
+        cmds["OBS_NDIT"] = 3
+
+        new = deepcopy(cmds)
+        new["OBS_EXPTIME"] = 1
+
+        assert new._cmds.maps[1] is cmds._cmds.maps[1]
+        assert new._cmds.maps[0] is not cmds._cmds.maps[0]
+        assert cmds["OBS_EXPTIME"] == 60 and new["OBS_EXPTIME"] == 1
+        assert new["OBS_NDIT"] == 3
@@ -0,0 +1,118 @@
+"""Unit tests for class simcado.detector.Chip"""
+
+import numpy as np
+from astropy.io import fits
+
+from simcado.detector import Chip
+
+
+def _basic_cmds(**kwargs):
+    cmds = {"OBS_EXPTIME": 10, "OBS_NDIT": 2, "OBS_REMOVE_CONST_BG": "no",
+            "FPA_DARK_MEDIAN": 0.1, "FPA_READOUT_MEDIAN": 4,
+            "FPA_USE_NOISE": "yes", "FPA_LINEARITY_CURVE": None,
+            "FPA_PIXEL_READ_TIME": 1E-5, "HXRG_NUM_OUTPUTS": 64}
+    cmds.update(kwargs)
+    return cmds
+
+
+class TestReadOutExpectation:
+    """Tests of Chip.read_out_expectation"""
+
+    def test_signal_and_variance_follow_noise_model(self):
+        chip = Chip(0, 0, 16, 16, 0.004, gain=2)
+        chip.array = np.zeros((16, 16), dtype=np.float32) + 50
+
+        signal, variance = chip.read_out_expectation(_basic_cmds())
+
+        # (50 + 0.1) ph/s * 5 s * 2 DITs / 2 e-/ADU
+        assert np.allclose(signal, 250.5)
+        # (501 e- + 2 * 4**2 e-) / (2 e-/ADU)**2
+        assert np.allclose(variance, (501 + 32) / 4.)
+
+    def test_matches_mean_and_variance_of_superfast_read_outs(self):
+        np.random.seed(42)
+        chip = Chip(0, 0, 16, 16, 0.004)
+        chip.array = np.random.uniform(0, 100, (16, 16)).astype(np.float32)
+        cmds = _basic_cmds(FPA_USE_NOISE="no", FPA_DARK_MEDIAN=0)
+
+        signal, variance = chip.read_out_expectation(cmds)
+        frames = np.array([chip.read_out(cmds) for _ in range(500)])
+
+        assert np.allclose(frames.mean(axis=0), signal, rtol=0.05)
+        assert np.allclose(np.median(frames.var(axis=0) / variance), 1,
+                           rtol=0.1)
+
+    def test_dark_current_matches_mean_of_superfast_read_outs(self):
+        np.random.seed(42)
+        chip = Chip(0, 0, 16, 16, 0.004)
+        chip.array = np.zeros((16, 16), dtype=np.float32) + 1
+        cmds = _basic_cmds(FPA_USE_NOISE="no", FPA_DARK_MEDIAN=4)
+
+        signal, _ = chip.read_out_expectation(cmds)
+        frames = np.array([chip.read_out(cmds) for _ in range(500)])
+
+        # (1 + 4) e-/s * 10 s = 50 e-. The mean of 500 x 256 read-outs is
+        # good to ~0.1%
+        assert np.allclose(signal, 50)
+        assert np.isclose(frames.mean(), 50, rtol=0.01)
+
+
+class TestReadOutLadder:
+    """Tests of Chip.read_out_ladder"""
+
+    def test_expectation_ladder_matches_single_expectations(self):
+        chip = Chip(0, 0, 16, 16, 0.004)
+        chip.array = np.zeros((16, 16), dtype=np.float32) + 20
+        cmds = _basic_cmds()
+        exptimes, ndits = [10, 60, 600], [1, 2, 10]
+
+        signal, variance = chip.read_out_ladder(cmds, exptimes, ndits,
+                                                read_out_type="expectation")
+
+        assert signal.shape == (3, 16, 16)
+        for i, (exptime, ndit) in enumerate(zip(exptimes, ndits)):
+            sig_i, var_i = chip.read_out_expectation(cmds, exptime / ndit,
+                                                     ndit)
+            assert np.allclose(signal[i], sig_i)
+            assert np.allclose(variance[i], var_i)
+
+    def test_superfast_ladder_has_poisson_statistics(self):
+        np.random.seed(42)
+        chip = Chip(0, 0, 64, 64, 0.004)
+        chip.array = np.zeros((64, 64), dtype=np.float32) + 20
+        cmds = _basic_cmds(FPA_USE_NOISE="no")
+
+        cube = chip.read_out_ladder(cmds, [1, 100], [1, 4])
+
+        assert np.allclose(cube.mean(axis=(1, 2)), [20, 2000], rtol=0.02)
+        assert np.allclose(cube.var(axis=(1, 2)), [20, 2000], rtol=0.1)
+
+    def test_superfast_ladder_draws_one_noise_frame_per_read_out(self,
+                                                                 tmpdir):
+        np.random.seed(42)
+        noise_path = str(tmpdir.join("noise.fits"))
+        layers = np.random.normal(0, 4, (8, 64, 64)).astype(np.float32)
+        fits.HDUList([fits.PrimaryHDU(layers[0])] +
+                     [fits.ImageHDU(layer) for layer in layers[1:]]
+                     ).writeto(noise_path)
+        chip = Chip(0, 0, 64, 64, 0.004)
+        chip.array = np.zeros((64, 64), dtype=np.float32)
+        cmds = _basic_cmds(FPA_DARK_MEDIAN=0, FPA_NOISE_PATH=noise_path)
+
+        cube = chip.read_out_ladder(cmds, [1, 1, 4], [1, 1, 4])
+
+        assert cube.shape == (3, 64, 64)
+        assert np.allclose(cube.std(axis=(1, 2)), [4, 4, 8], rtol=0.1)
+        # every read-out uses a different layer of the noise file
+        frames = cube / [[[1]], [[1]], [[2]]]
+        for i, j in [(0, 1), (0, 2), (1, 2)]:
+            assert abs(np.corrcoef(frames[i].ravel(),
+                                   frames[j].ravel())[0, 1]) < 0.1
+
+    def test_ladder_without_a_noise_file_has_one_frame_per_read_out(self):
+        chip = Chip(0, 0, 16, 16, 0.004)
+        cmds = _basic_cmds(FPA_NOISE_PATH=None)
+
+        cube = chip.read_out_ladder(cmds, [1, 10, 100], [1, 2, 4])
+
+        assert cube.shape == (3, 16, 16)
@@ -0,0 +1,39 @@
+"""Unit tests for class simcado.detector.ChipWriter"""
+
+import pytest
+import numpy as np
+from astropy.io import fits
+
+from simcado.detector import ChipWriter
+
+
+class TestChipWriter:
+    """Tests of appending chip images in a background thread"""
+
+    @pytest.mark.parametrize("compression", [None, "RICE_1"])
+    def test_appended_chips_match_input_and_pass_checksum(self, tmpdir,
+                                                          compression):
+        filename = str(tmpdir.join("chips.fits"))
+        primary = fits.PrimaryHDU(header=fits.Header({"FOO": "bar"}))
+        images = [np.arange(64, dtype=np.int32).reshape(8, 8) + i
+                  for i in range(3)]
+
+        writer = ChipWriter(filename, primary, compression=compression)
+        for i, image in enumerate(images):
+            writer.write(fits.ImageHDU(image, name="CHIP_{:02d}".format(i)))
+        writer.close()
+
+        with fits.open(filename, checksum=True) as hdulist:
+            assert len(hdulist) == 4
+            assert hdulist[0].header["FOO"] == "bar"
+            for i, image in enumerate(images):
+                hdu = hdulist["CHIP_{:02d}".format(i)]
+                assert np.array_equal(hdu.data, image)
+                assert "CHECKSUM" in hdu.header
+
+    def test_errors_in_writer_thread_reach_the_caller(self, tmpdir):
+        filename = str(tmpdir.join("chips.fits"))
+        writer = ChipWriter(filename, fits.PrimaryHDU())
+        writer.write("not an HDU")
+        with pytest.raises(TypeError, match="not an HDU"):
+            writer.close()
@@ -0,0 +1,54 @@
+"""Unit tests for class simcado.detector.FrameWriter"""
+
+import pytest
+import numpy as np
+from astropy.io import fits
+
+from simcado.detector import FrameWriter
+
+
+def _make_frame(n, shapes):
+    hdulist = fits.HDUList([fits.PrimaryHDU()])
+    for shape in shapes:
+        data = np.zeros(shape, dtype=np.float32) + n
+        hdulist.append(fits.ImageHDU(data))
+    return hdulist
+
+
+class TestFrameWriter:
+    """Tests of writing frame sequences to disk"""
+
+    def test_cube_holds_all_frames_for_each_chip(self, tmpdir):
+        filename = str(tmpdir.join("cube.fits"))
+        shapes = [(5, 7), (3, 3)]
+        headers = [fits.Header({"EXTNAME": "CHIP_01"}),
+                   fits.Header({"EXTNAME": "CHIP_02"})]
+
+        writer = FrameWriter(filename, 4, headers, shapes)
+        for n in range(4):
+            writer.write(n, _make_frame(n, shapes))
+        writer.close()
+
+        with fits.open(filename) as hdulist:
+            assert hdulist["CHIP_01"].data.shape == (4, 5, 7)
+            assert hdulist["CHIP_02"].data.shape == (4, 3, 3)
+            assert np.all(hdulist["CHIP_02"].data[:, 0, 0] == np.arange(4))
+
+    def test_numbered_files_only_change_the_basename(self, tmpdir):
+        filename = str(tmpdir.mkdir("dir.with.dots").join("image.fits"))
+        writer = FrameWriter(filename, 2, [fits.Header()], [(4, 4)],
+                             cube=False)
+        for n in range(2):
+            writer.write(n, _make_frame(n, [(4, 4)]))
+        writer.close()
+
+        assert writer.frame_filename(1).endswith("dir.with.dots/image1.fits")
+        assert fits.getdata(writer.frame_filename(1), 1)[0, 0] == 1
+
+    def test_errors_in_writer_thread_are_raised_on_close(self, tmpdir):
+        filename = str(tmpdir.join("missing_dir", "image.fits"))
+        writer = FrameWriter(filename, 1, [fits.Header()], [(4, 4)],
+                             cube=False)
+        writer.write(0, _make_frame(0, [(4, 4)]))
+        with pytest.raises(Exception):
+            writer.close()
@@ -0,0 +1,36 @@
+"""Unit tests for the functions in module simcado.detector"""
+
+import numpy as np
+from astropy.io import fits
+
+from simcado.detector import _quantise_adu, _write_hdulist
+
+
+class TestWriteHDUList:
+    """Tests of function simcado.detector._write_hdulist"""
+
+    def test_single_image_is_moved_to_compressed_extension(self, tmpdir):
+        filename = str(tmpdir.join("image.fits"))
+        image = _quantise_adu(np.random.normal(100, 10, (32, 32)))
+        hdulist = fits.HDUList([fits.ImageHDU(image, name="CHIP_00")])
+
+        _write_hdulist(hdulist, filename, compression="RICE_1")
+
+        with fits.open(filename) as comp_hdulist:
+            assert comp_hdulist[0].data is None
+            assert isinstance(comp_hdulist["CHIP_00"], fits.CompImageHDU)
+            assert np.array_equal(comp_hdulist["CHIP_00"].data, image)
+
+    def test_no_checksum_keywords_if_checksum_is_false(self, tmpdir):
+        filename = str(tmpdir.join("image.fits"))
+        hdulist = fits.HDUList([fits.PrimaryHDU(np.zeros((4, 4)))])
+
+        _write_hdulist(hdulist, filename, checksum=False)
+
+        assert "CHECKSUM" not in fits.getheader(filename)
+
+
+def test_quantise_adu_rounds_to_nearest_int32():
+    out = _quantise_adu(np.array([0.4, 0.6, -1.6]))
+    assert out.dtype == np.int32
+    assert np.all(out == [0, 1, -2])
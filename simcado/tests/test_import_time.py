@@ -0,0 +1,55 @@
+"""Benchmark of ``import simcado``, which must stay cheap for worker processes"""
+
+import os
+import sys
+import json
+import subprocess
+
+import simcado
+
+# [s] ``import simcado`` took ~1.2 s while it imported all submodules, and
+# takes ~1 ms with lazy submodules. The budget leaves room for slow machines
+IMPORT_TIME_BUDGET = 0.25
+
+HEAVY_MODULES = ["astropy", "scipy", "poppy", "matplotlib", "multiprocessing",
+                 "simcado.utils", "simcado.psf", "simcado.detector"]
+
+SCRIPT = """
+import sys, time, json
+t0 = time.perf_counter()
+import simcado
+dt = time.perf_counter() - t0
+print(json.dumps({"time": dt, "modules": sorted(sys.modules)}))
+"""
+
+
+def _import_in_subprocess(cwd):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.path.dirname(os.path.dirname(simcado.__file__))
+    out = subprocess.check_output([sys.executable, "-c", SCRIPT], cwd=cwd,
+                                  env=env)
+    return json.loads(out.decode().strip().splitlines()[-1])
+
+
+class TestImportSimcado:
+    """Tests of the cost and side effects of ``import simcado``"""
+
+    def test_import_time_is_within_budget(self, tmpdir):
+        best = min(_import_in_subprocess(str(tmpdir))["time"]
+                   for _ in range(3))
+        assert best < IMPORT_TIME_BUDGET
+
+    def test_no_heavy_modules_and_no_files_at_import(self, tmpdir):
+        modules = _import_in_subprocess(str(tmpdir))["modules"]
+
+        assert [mod for mod in HEAVY_MODULES if mod in modules] == []
+        assert os.listdir(str(tmpdir)) == []
+
+    def test_public_names_are_loaded_on_first_use(self):
+        from simcado import UserCommands, OpticalTrain, Source, run
+
+        assert simcado.UserCommands is simcado.commands.UserCommands
+        assert simcado.Source is simcado.source.Source
+        assert OpticalTrain is simcado.optics.OpticalTrain
+        assert run is simcado.simulation.run and UserCommands
+        assert "psf" in dir(simcado)
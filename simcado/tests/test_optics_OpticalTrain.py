@@ -0,0 +1,46 @@
+"""Unit tests for class simcado.optics.OpticalTrain"""
+
+from collections import Counter
+
+import numpy as np
+
+from simcado.optics import OpticalTrain
+from simcado.spectral import TransmissionCurve, UnityCurve
+
+
+def _curves():
+    lam = np.linspace(0.5, 2.5, 201)
+    return {"A": TransmissionCurve(lam=lam, val=0.9 + 0.05 * np.sin(lam)),
+            "B": TransmissionCurve(lam=lam, val=np.linspace(0.5, 1, 201)),
+            "C": TransmissionCurve(lam=lam, val=0.8 * np.ones(201))}
+
+
+class TestTCProduct:
+    """Tests of OpticalTrain._tc_product"""
+
+    def test_matches_repeated_multiplication(self):
+        opt = OpticalTrain.__new__(OpticalTrain)
+        tc_dict = _curves()
+        keywords = ["A"] * 11 + ["B"] * 3 + ["C"]
+        lam = UnityCurve().lam
+
+        prod = opt._tc_product(Counter(keywords), tc_dict, lam)
+
+        tc_master = UnityCurve()
+        for key in keywords:
+            tc_master *= tc_dict[key]
+        assert np.allclose(prod, tc_master.val, rtol=1E-12)
+
+    def test_builds_on_products_already_made(self):
+        opt = OpticalTrain.__new__(OpticalTrain)
+        tc_dict = _curves()
+        lam = UnityCurve().lam
+        small = opt._tc_product(Counter(["A"] * 5), tc_dict, lam)
+
+        # resampling "A" again would now give zeros
+        tc_dict["A"].val_orig = tc_dict["A"].val_orig * 0
+        large = opt._tc_product(Counter(["A"] * 5 + ["B"]), tc_dict, lam)
+
+        assert len(opt._tc_products) == 2
+        assert np.any(large > 0)
+        assert np.allclose(large, small * tc_dict["B"].val)
@@ -0,0 +1,73 @@
+"""Unit tests for the functions in module simcado.optics"""
+
+import os
+import time
+
+from simcado.optics import _cache_filename, _evict_cache, _dependent_nodes
+
+
+def _basic_cmds(cache_dir, **kwargs):
+    cmds = {"SIM_OPT_TRAIN_CACHE_DIR": cache_dir, "OBS_SEEING": 0.8,
+            "OBS_EXPTIME": 60, "FPA_QE": None, "FPA_GAIN": 1}
+    cmds.update(kwargs)
+    return cmds
+
+
+class TestCacheFilename:
+    """Tests of function simcado.optics._cache_filename"""
+
+    def test_only_optical_train_keywords_change_the_key(self, tmpdir):
+        base = _cache_filename(_basic_cmds(str(tmpdir)))
+
+        assert base.startswith(str(tmpdir))
+        assert _cache_filename(_basic_cmds(str(tmpdir), OBS_EXPTIME=1)) == base
+        assert _cache_filename(_basic_cmds(str(tmpdir), FPA_GAIN=2)) == base
+        assert _cache_filename(_basic_cmds(str(tmpdir), OBS_SEEING=1)) != base
+        assert _cache_filename(_basic_cmds(str(tmpdir), FPA_QE="x")) != base
+
+    def test_modified_input_files_change_the_key(self, tmpdir):
+        fname = str(tmpdir.join("TC_qe.dat"))
+        with open(fname, "w") as fp1:
+            fp1.write("1 1")
+        key = _cache_filename(_basic_cmds(str(tmpdir), FPA_QE=fname))
+
+        os.utime(fname, (time.time() + 10, time.time() + 10))
+
+        assert _cache_filename(_basic_cmds(str(tmpdir), FPA_QE=fname)) != key
+
+    def test_no_file_name_if_cache_is_switched_off(self):
+        assert _cache_filename(_basic_cmds(None)) is None
+
+
+def test_evict_cache_removes_least_recently_used_files(tmpdir):
+    now = time.time()
+    for i in range(4):
+        fname = str(tmpdir.join("opt_train_{}.pkl".format(i)))
+        with open(fname, "wb") as fp1:
+            fp1.write(b"0" * 2**19)
+        os.utime(fname, (now - i, now - i))
+
+    _evict_cache(str(tmpdir), max_size=1.2)
+
+    assert sorted(os.listdir(str(tmpdir))) == ["opt_train_0.pkl",
+                                               "opt_train_1.pkl"]
+
+
+class TestDependentNodes:
+    """Tests of function simcado.optics._dependent_nodes"""
+
+    def test_exact_keywords_take_precedence_over_prefixes(self):
+        assert _dependent_nodes("SCOPE_TEMPERATURE") == ["thermal"]
+        assert _dependent_nodes("SCOPE_M1_TC") == ["tc"]
+        assert _dependent_nodes("OBS_SEEING") == ["psf"]
+        assert _dependent_nodes("INST_FILTER_TC") == ["lam", "tc"]
+
+    def test_longest_prefix_wins(self):
+        assert _dependent_nodes("SCOPE_DRIFT_DISTANCE") == []
+        assert _dependent_nodes("INST_DEROT_PROFILE") == []
+
+    def test_detector_and_unknown_keywords(self):
+        assert _dependent_nodes("FPA_GAIN") == []
+        assert _dependent_nodes("OBS_EXPTIME") == []
+        assert _dependent_nodes("FPA_QE") == ["tc"]
+        assert _dependent_nodes("SIM_DATA_DIR") is None
@@ -0,0 +1,76 @@
+"""Unit tests for the convolution of PSFs in simcado.psf"""
+
+import pickle
+
+import numpy as np
+from scipy.signal import fftconvolve
+
+from simcado.psf import PSF, PSFCube, AiryPSF, GaussianPSF, CombinedPSF, \
+    CombinedPSFCube
+
+
+def _same_conv(array, kernel):
+    arr = fftconvolve(array, kernel, mode="same").astype(np.float32)
+    arr[arr <= 0] = 1e-15
+    return arr / np.sum(arr)
+
+
+class TestTransferFunctions:
+    """Tests of PSFs kept as the product of the transforms of other PSFs"""
+
+    def test_convolve_matches_fftconvolve_for_odd_and_even_kernels(self):
+        gauss = GaussianPSF(fwhm=0.03, pix_res=0.004, size=31)
+        airy = AiryPSF(fwhm=0.02, pix_res=0.004, size=64)
+
+        for psf, kernel in [(gauss, airy), (airy, gauss),
+                            (airy, gauss.array)]:
+            new = psf.convolve(kernel)
+            assert new.array.shape == psf.array.shape
+            assert np.allclose(new.array, _same_conv(psf.array,
+                                                     np.asarray(kernel)),
+                               atol=1e-7)
+
+    def test_pixels_are_computed_on_first_use(self):
+        gauss = GaussianPSF(fwhm=0.03, pix_res=0.004, size=31)
+        new = gauss.convolve(gauss).convolve(gauss)
+
+        assert new._array is None and new.info["Type"] == "Combined"
+        assert np.isclose(np.sum(new.array), 1)
+        assert new._transfer is not None
+
+        new.array = np.ones((3, 3))
+        assert new._transfer is None and new.size == gauss.size
+
+    def test_pickled_psfs_keep_their_pixels_but_not_the_cache(self):
+        gauss = GaussianPSF(fwhm=0.03, pix_res=0.004, size=31)
+        gauss.otf((64, 64))
+        new = pickle.loads(pickle.dumps(gauss.convolve(gauss)))
+
+        assert new._otf_cache == {}
+        assert np.allclose(new.array, _same_conv(gauss.array, gauss.array),
+                           atol=1e-7)
+
+    def test_combined_psf_matches_convolution_of_a_delta(self):
+        gauss = GaussianPSF(fwhm=0.03, pix_res=0.004, size=31)
+        airy = AiryPSF(fwhm=0.02, pix_res=0.004, size=45)
+        size = airy.size
+        delta = np.zeros((size, size))
+        delta[size // 2, size // 2] = 1
+
+        combined = CombinedPSF([gauss, airy])
+
+        assert combined.size == size
+        expected = _same_conv(_same_conv(delta, gauss.array), airy.array)
+        assert np.allclose(combined.array, expected, atol=1e-7)
+
+    def test_combined_cube_combines_shared_slices_once(self):
+        gauss = GaussianPSF(fwhm=0.03, pix_res=0.004, size=31)
+        airy = AiryPSF(fwhm=0.02, pix_res=0.004, size=45)
+        cube_1 = PSFCube(np.array([1., 2., 3.]), psf_slices=gauss)
+        cube_2 = PSFCube(np.array([1., 2., 3.]), psf_slices=[airy, airy, gauss])
+
+        combined = CombinedPSFCube([cube_1, cube_2])
+
+        assert all(isinstance(psf, CombinedPSF) for psf in combined.psf_slices)
+        assert combined[0] is combined[1] and combined[1] is not combined[2]
+        assert isinstance(combined[2], PSF)
@@ -0,0 +1,98 @@
+"""Unit tests for class simcado.psf.PSFCube"""
+
+import numpy as np
+
+from simcado.psf import PSF, PSFCube, AiryPSF, AiryPSFCube, GaussianPSF, \
+    GaussianPSFCube, MoffatPSFCube
+
+
+def _shared_cube(n_slices=4):
+    psf = PSF(size=15, pix_res=0.004)
+    psf.set_array(np.outer(np.hanning(15), np.hanning(15)))
+    return PSFCube(np.linspace(1, 2, n_slices), psf_slices=psf)
+
+
+class TestSharedSlices:
+    """Tests of PSFCubes where several wavelength slices share one PSF"""
+
+    def test_methods_process_a_shared_slice_once(self):
+        cube = _shared_cube()
+        kernel = np.zeros((3, 3))
+        kernel[1, :] = 1
+
+        cube.convolve([kernel] * len(cube))
+        cube.resample(0.002)
+
+        assert len(cube.unique_slices()) == 1
+        assert all(cube[i] is cube[0] for i in range(len(cube)))
+        assert np.isclose(cube[0].array.sum(), 1)
+
+    def test_per_slice_arguments_split_a_shared_slice(self):
+        cube = _shared_cube()
+        orig = cube[0].array.copy()
+
+        new = cube * [1, 1, 2, 2]
+
+        assert new[0] is new[1] and new[2] is new[3]
+        assert new[1] is not new[2]
+        assert np.allclose(cube[0].array, orig)
+        assert len(cube.unique_slices()) == 1
+
+
+class TestTruncate:
+    """Tests of PSFCube.truncate"""
+
+    def test_slices_are_cropped_to_the_encircled_energy_radius(self):
+        psf = PSF(size=101, pix_res=0.004)
+        yy, xx = np.mgrid[:101, :101] - 50
+        psf.set_array(np.exp(-(xx**2 + yy**2) / (2. * 3**2)))
+        cube = PSFCube([1., 2.], psf_slices=psf)
+
+        cube.truncate(0.999)
+
+        new = cube[0]
+        assert cube[1] is new and cube.size == [new.size, new.size]
+        assert 21 <= new.size < 41 and new.array.argmax() == new.array.size // 2
+        assert 0 < new.info["ee_flux_lost"] < 1e-3
+        assert np.isclose(new.array.sum(), 1 - new.info["ee_flux_lost"])
+
+    def test_halo_keeps_the_flux_outside_the_radius(self):
+        cube = _shared_cube()
+
+        cube.truncate(0.5, halo=True)
+
+        new = cube[0]
+        assert new.size < 15 and np.isclose(new.array.sum(), 1)
+        assert new.info["halo"] == new.info["ee_flux_lost"]
+        assert 0 < new.info["halo"] < 0.5
+
+
+class TestAnalyticCubes:
+    """Tests of the Airy, Gaussian and Moffat PSFCubes"""
+
+    def test_slices_match_single_psfs_on_the_common_grid(self):
+        fwhm = [0.01, 0.02, 0.03]
+
+        for mode, size in [("oversample", 31), ("linear_interp", 125)]:
+            cube = AiryPSFCube([1., 2., 3.], fwhm=fwhm, size=size, mode=mode)
+            n = cube.size[0]
+            singles = [AiryPSF(f, obscuration=cube.obscuration, size=n,
+                               mode=mode) for f in fwhm]
+
+            assert cube.array.shape == (3, n, n) and n >= size
+            for psf, single in zip(cube, singles):
+                assert psf.array.base is cube.array
+                assert np.allclose(psf.array, single.array, atol=1e-7)
+
+        cube = GaussianPSFCube([1., 2.], fwhm=fwhm[:2], size=125)
+        for psf, f in zip(cube, fwhm):
+            single = GaussianPSF(f, size=cube.size[0])
+            assert np.allclose(psf.array, single.array, atol=1e-7)
+
+    def test_moffat_fwhm_is_in_arcsec(self):
+        cube = MoffatPSFCube([1., 2.], fwhm=[0.02, 0.04], pix_res=0.004)
+
+        for psf in cube:
+            centre = psf.array[psf.size // 2]
+            assert np.isclose(np.sum(centre > centre.max() / 2),
+                              psf.info["fwhm"] / 4., atol=1)
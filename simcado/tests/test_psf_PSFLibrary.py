@@ -0,0 +1,125 @@
+"""Unit tests for class simcado.psf.PSFLibrary"""
+
+import os
+
+import pytest
+import numpy as np
+from astropy.io import fits
+
+from simcado import psf
+from simcado.psf import PSFLibrary
+
+
+def _fake_poppy(monkeypatch, calls):
+    def fake_eelt_psf(wavelength=2.2, size=1024, segments=None, **kwargs):
+        calls.append(wavelength)
+        yy, xx = np.mgrid[:size, :size] - size // 2
+        data = np.exp(-(xx**2 + yy**2) / (2. * wavelength**2))
+        hdu = fits.ImageHDU(data / data.sum())
+        hdu.header["CDELT1"] = 0.004
+        hdu.header["NSEGS"] = len(segments)
+        hdu.header["SEGSUM"] = sum(segments)
+        return fits.HDUList([hdu])
+
+    def fake_segments(plan="A", missing=None):
+        # a new random draw each time, as with missing segments
+        n_missing = 5 if missing is None else missing
+        segs = np.arange(100)
+        np.random.shuffle(segs)
+        return sorted(segs[n_missing:].tolist())
+
+    monkeypatch.setattr(psf, "poppy_eelt_psf", fake_eelt_psf)
+    monkeypatch.setattr(psf, "get_eelt_segments", fake_segments)
+
+
+class TestPSFLibrary:
+    """Tests of storing and serving generated PSFs"""
+
+    def test_psfs_are_generated_once_and_served_as_cube(self, tmpdir,
+                                                        monkeypatch):
+        calls = []
+        _fake_poppy(monkeypatch, calls)
+        lib = PSFLibrary(str(tmpdir))
+
+        cube = lib.get_cube([1.0, 2.0], size=33, n_processes=1)
+        cube_again = lib.get_cube([2.0, 1.0, 3.0], size=33, n_processes=1)
+
+        assert calls == [1.0, 2.0, 3.0]
+        assert len(cube) == 2 and cube[1].array.shape == (33, 33)
+        assert np.allclose(cube_again.nearest(1.0).array, cube[0].array)
+        assert lib.get(2.0, size=33).array.max() < cube[0].array.max()
+
+    def test_different_parameters_get_different_entries(self, tmpdir):
+        lib = PSFLibrary(str(tmpdir))
+
+        fname = lib.filename(2.2, plan="B")
+
+        assert fname == lib.filename(np.float32(2.2), plan="B", mode="wide")
+        assert fname != lib.filename(2.2, plan="A")
+        assert fname != lib.filename(2.2, plan="B", strehl=0.5)
+        assert fname != lib.filename(2.2, plan="B", segments=[1, 2])
+
+    def test_validate_removes_broken_entries(self, tmpdir, monkeypatch):
+        _fake_poppy(monkeypatch, [])
+        lib = PSFLibrary(str(tmpdir))
+        good, bad = lib.populate([1.0, 2.0], size=17, n_processes=1)
+
+        with open(bad, "r+b") as fp:
+            fp.seek(-100, 2)
+            fp.write(b"garbage")
+
+        assert lib.validate() == [bad]
+        assert tmpdir.listdir("psf_*") == [tmpdir.join(good.split("/")[-1])]
+        assert len(tmpdir.listdir()) == 2 and tmpdir.listdir("segments_*")
+
+    def test_psfs_of_later_calls_share_the_missing_segments(self, tmpdir,
+                                                            monkeypatch):
+        _fake_poppy(monkeypatch, [])
+        lib = PSFLibrary(str(tmpdir))
+
+        lib.populate([1.0], size=17, plan="B", n_processes=1)
+        fnames = lib.populate([1.0, 2.0], size=17, plan="B", n_processes=1)
+        other = lib.populate([1.0], size=17, plan="B", n_missing=7,
+                             n_processes=1)
+
+        sums = [fits.getval(fname, "SEGSUM") for fname in fnames + other]
+        assert sums[0] == sums[1] == sum(lib.segments("B"))
+        assert fits.getval(other[0], "NSEGS") == 93
+
+    def test_psfs_made_in_several_processes_are_served(self, tmpdir,
+                                                       monkeypatch):
+        calls = []
+        _fake_poppy(monkeypatch, calls)
+        lib = PSFLibrary(str(tmpdir))
+
+        cube = lib.get_cube([1.0, 1.5, 2.0], size=33, n_processes=2)
+
+        # the PSFs were made in the (forked) worker processes
+        assert calls == [] and len(tmpdir.listdir("psf_*")) == 3
+        assert len(cube) == 3
+        assert len(set(fits.getval(str(fname), "SEGSUM")
+                       for fname in tmpdir.listdir("psf_*"))) == 1
+        assert np.isclose(cube[2].array.sum(), 1)
+
+    @pytest.mark.skipif(not os.path.exists("/proc/self/fd"),
+                        reason="needs /proc/self/fd")
+    def test_cube_closes_the_library_files(self, tmpdir, monkeypatch):
+        _fake_poppy(monkeypatch, [])
+        lib = PSFLibrary(str(tmpdir))
+        lib.populate([1.0, 2.0], size=17, n_processes=1)
+
+        def n_open_entries():
+            paths = [os.path.realpath(os.path.join("/proc/self/fd", fd))
+                     for fd in os.listdir("/proc/self/fd")]
+            return sum(os.path.dirname(path) == os.path.realpath(str(tmpdir))
+                       for path in paths)
+
+        cube = lib.get_cube([1.0, 2.0], size=17)
+        assert n_open_entries() == 2
+        cube[0]
+        cube.close()
+
+        assert n_open_entries() == 0
+        assert np.isclose(cube[1].array.sum(), 1)
+        cube.close()
+        assert n_open_entries() == 0
@@ -0,0 +1,113 @@
+"""Unit tests for class simcado.psf.UserPSFCube"""
+
+import pickle
+
+import numpy as np
+from astropy.io import fits
+
+from simcado import psf as sim_psf
+from simcado.psf import UserPSFCube
+
+
+def _psf_file(tmpdir, lams=(1.0, 1.5, 2.0, 2.5), size=65, pix_res=0.004):
+    hdulist = fits.HDUList()
+    yy, xx = np.mgrid[:size, :size] - (size - 1) / 2.
+    for i, lam in enumerate(lams):
+        hdu = fits.ImageHDU(np.exp(-(xx**2 + yy**2) / (2. * (i + 2)**2)))
+        hdu.header["WAVE0"] = lam
+        hdu.header["CDELT1"] = pix_res
+        hdulist.append(hdu)
+
+    filename = str(tmpdir.join("psf_cube.fits"))
+    hdulist.writeto(filename)
+    return filename
+
+
+class TestLazySlices:
+    """Tests of reading the slices of a UserPSFCube on demand"""
+
+    def test_only_used_slices_are_read_and_cropped(self, tmpdir):
+        cube = UserPSFCube(_psf_file(tmpdir), [1.1, 2.4], size=21)
+
+        assert list(cube.lam_bin_centers) == [1.0, 2.5]
+        assert cube._loaded == {}
+
+        psf = cube.nearest(2.3)
+
+        assert list(cube._loaded) == [1]
+        assert psf is cube[1] and psf.array.shape == (21, 21)
+        assert np.isclose(psf.array.sum(), 1)
+        assert psf.array[10, 10] == psf.array.max()
+
+    def test_pickled_cube_reopens_the_file(self, tmpdir):
+        cube = UserPSFCube(_psf_file(tmpdir), [1.1, 2.4])
+        first = cube[0].array
+
+        new = pickle.loads(pickle.dumps(cube))
+
+        assert new._hdulist is None and list(new._loaded) == [0]
+        assert np.allclose(new[0].array, first)
+        assert new[1].array.shape == (65, 65)
+
+
+class TestResample:
+    """Tests of resampling the slices of a UserPSFCube"""
+
+    def test_odd_and_even_slices_stay_centred_and_keep_their_flux(self,
+                                                                  tmpdir):
+        for size in [64, 65]:
+            fname = _psf_file(tmpdir.mkdir(str(size)), size=size,
+                              pix_res=0.002)
+            cube = UserPSFCube(fname, [1.0, 2.5])
+            cube.resample(0.004)
+
+            for psf in cube.psf_slices:
+                n = psf.array.shape[0]
+                yy, xx = np.mgrid[:n, :n]
+                assert n % 2 == 1 and psf.pix_res == 0.004
+                assert np.isclose(psf.array.sum(), 1)
+                assert np.allclose([np.sum(psf.array * yy),
+                                    np.sum(psf.array * xx)], n // 2,
+                                   atol=1e-4)
+            assert cube.size == [psf.size for psf in cube.psf_slices]
+
+    def test_resampled_slices_are_reused_by_the_next_cube(self, tmpdir,
+                                                          monkeypatch):
+        monkeypatch.setattr(sim_psf, "__resample_cache__", {})
+        fname = _psf_file(tmpdir, pix_res=0.002)
+
+        cube = UserPSFCube(fname, [1.0, 2.5], size=41)
+        cube.resample(0.004)
+        first = cube[1]
+        assert len(sim_psf.__resample_cache__) == 1
+
+        cube = UserPSFCube(fname, [1.0, 2.5], size=41)
+        cube.resample(0.004)
+        assert cube[1] is not first and cube[1].array is first.array
+        assert not first.array.flags.writeable
+        assert len(sim_psf.__resample_cache__) == 1
+
+    def test_least_recently_used_slices_leave_the_cache(self, tmpdir,
+                                                        monkeypatch):
+        monkeypatch.setattr(sim_psf, "__resample_cache__", {})
+        # [MB] room for two resampled 21x21 float32 slices, but not three
+        monkeypatch.setattr(sim_psf, "_RESAMPLE_CACHE_SIZE", 4000 / 2**20)
+        cube = UserPSFCube(_psf_file(tmpdir, pix_res=0.002),
+                           [1.0, 1.5, 2.0], size=41)
+        cube.resample(0.004)
+
+        for i in [0, 1, 0, 2]:
+            cube._loaded.clear()
+            assert cube[i].array.shape == (21, 21)
+
+        exts = [key[2] for key in sim_psf.__resample_cache__]
+        assert exts == [0, 2]
+
+    def test_replaced_slices_are_resampled_in_memory(self, tmpdir):
+        cube = UserPSFCube(_psf_file(tmpdir, pix_res=0.002), [1.0, 2.5])
+        cube.psf_slices = list(cube.psf_slices)
+        cube.resample(0.004)
+
+        assert all(psf.pix_res == 0.004 for psf in cube.psf_slices)
+        assert cube.size == [psf.size for psf in cube.psf_slices]
+        assert cube.size != [65, 65]
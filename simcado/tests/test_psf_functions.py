@@ -0,0 +1,29 @@
+"""Unit tests for the functions in module simcado.psf"""
+
+import numpy as np
+
+from simcado import psf
+
+
+class TestSeeingPSF:
+    """Tests of function simcado.psf.seeing_psf"""
+
+    def test_kernel_is_made_once_and_copied_for_each_call(self):
+        hdu_a = psf.seeing_psf(fwhm=0.3, size=65, pix_res=0.01)
+        hdu_b = psf.seeing_psf(fwhm=0.3, size=65, pix_res=0.01,
+                               psf_type="Moffat")
+        hdu_a[0].data *= 2
+
+        shared = psf._seeing_psf_array(0.3, "moffat", 65, 0.01)
+        assert not shared.flags.writeable
+        assert np.allclose(hdu_b[0].data, shared)
+        assert np.allclose(hdu_a[0].data, 2 * shared)
+
+    def test_different_parameters_give_different_kernels(self):
+        moffat = psf.seeing_psf(fwhm=0.3, size=65, pix_res=0.01)[0].data
+        gauss = psf.seeing_psf(fwhm=0.3, size=65, pix_res=0.01,
+                               psf_type="gaussian")[0].data
+        wide = psf.seeing_psf(fwhm=0.5, size=65, pix_res=0.01)[0].data
+
+        assert not np.allclose(moffat, gauss)
+        assert wide.max() < moffat.max()
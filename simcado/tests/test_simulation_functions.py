@@ -0,0 +1,191 @@
+"""Unit tests for the functions in module simcado.simulation"""
+
+import os
+
+import pytest
+import numpy as np
+from astropy.stats import sigma_clipped_stats
+
+from simcado import simulation, source
+from simcado.commands import UserCommands
+from simcado.optics import OpticalTrain
+from simcado.detector import Detector
+from simcado.simulation import aperture_photometry, _sigma_clipped_stats, \
+    run_filters
+
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..",
+                                        "data"))
+needs_data = pytest.mark.skipif(not os.path.exists(DATA_DIR),
+                                reason="needs the SimCADO data files")
+
+
+def _small_fov_cmds(**kwargs):
+    """Commands for a 128x128 pixel chip with a narrow analytic PSF"""
+    cmds = UserCommands(sim_data_dir=DATA_DIR)
+    cmds.update({"SCOPE_PSF_FILE": None, "OBS_SEEING": 0.02,
+                 "SIM_PSF_SIZE": 64, "FPA_CHIP_LAYOUT": "tiny",
+                 "FPA_LINEARITY_CURVE": None, "FPA_USE_NOISE": "no",
+                 "ATMO_EC": "none", "ATMO_BG_MAGNITUDE": 13.6,
+                 "INST_FILTER_TC": "Ks", "OBS_NDIT": 1,
+                 "SIM_OPT_TRAIN_CACHE_DIR": None, "SIM_VERBOSE": "no"})
+    cmds.update(kwargs)
+    return cmds
+
+
+class TestAperturePhotometry:
+    """Tests of function simcado.simulation.aperture_photometry"""
+
+    def test_fluxes_of_point_sources_on_flat_background(self):
+        image = np.zeros((100, 100)) + 10
+        x, y = np.array([20, 50, 80]), np.array([30, 50, 70])
+        image[y, x] += [100, 200, 300]
+
+        flux, flux_err, bg, bg_std = aperture_photometry(image, x, y)
+
+        assert np.allclose(flux, [100, 200, 300])
+        assert np.allclose(bg, 10)
+        assert np.allclose(flux_err, np.sqrt(flux))
+
+    def test_image_stack_matches_single_images(self):
+        np.random.seed(42)
+        images = np.random.poisson(100, (3, 64, 64)).astype(np.float32)
+        x, y = [10, 32, 60], [10, 32, 60]
+
+        stack = aperture_photometry(images, x, y, r_ap=[2, 3, 4])
+
+        assert stack[0].shape == (3, 3)
+        for i, image in enumerate(images):
+            single = aperture_photometry(image, x, y, r_ap=[2, 3, 4])
+            for s_out, i_out in zip(stack, single):
+                assert np.allclose(s_out[i], i_out)
+
+
+class TestAnalyticETC:
+    """Tests of functions snr_analytic and limiting_mags_analytic"""
+
+    @staticmethod
+    def _fixed_rates(*args, **kwargs):
+        yield {"src": 1E10, "bg": 50., "n_pix": 81, "ron": 4.}
+
+    def test_limiting_mags_have_the_limiting_snr(self, monkeypatch):
+        monkeypatch.setattr(simulation, "_etc_rates_per_filter",
+                            self._fixed_rates)
+        exptimes, ndits = [1, 60, 3600], [1, 1, 60]
+
+        lim_mags = simulation.limiting_mags_analytic(exptimes, ndits=ndits,
+                                                     limiting_sigma=5)
+        snrs = [simulation.snr_analytic(t, m, ndits=n)[0, 0, 0]
+                for t, n, m in zip(exptimes, ndits, lim_mags[0])]
+
+        assert lim_mags.shape == (1, 3)
+        assert np.allclose(snrs, 5)
+
+    def test_snr_grows_with_sqrt_exptime_when_background_limited(self,
+                                                                  monkeypatch):
+        monkeypatch.setattr(simulation, "_etc_rates_per_filter",
+                            self._fixed_rates)
+
+        snrs = simulation.snr_analytic([1E4, 4E4], [30, 31])
+
+        assert snrs.shape == (1, 2, 2)
+        assert np.allclose(snrs[0, 1] / snrs[0, 0], 2, rtol=1E-3)
+
+    @needs_data
+    def test_matches_aperture_photometry_of_simulated_read_outs(self):
+        np.random.seed(42)
+        cmds = _small_fov_cmds(FPA_READOUT_MEDIAN=0)
+        opt_train, fpa = OpticalTrain(cmds), Detector(cmds, small_fov=False)
+        mags, exptime = [18., 21., 24.], 600.
+        stars = source.stars(["A0V"], mags, filter_name="Ks",
+                             x=[-0.15, 0, 0.15], y=[0, 0, 0])
+        stars.apply_optical_train(opt_train, fpa)
+
+        ladder = fpa.read_out_ladder([exptime] * 400, chips=0)
+        flux = aperture_photometry(ladder[1].data, stars.x_pix,
+                                   stars.y_pix)[0]
+        snr_analytic = simulation.snr_analytic(exptime, mags,
+                                               opt_train=opt_train)[0, 0]
+
+        # The mean flux of 400 read-outs is good to ~0.1%. The SNR of 400
+        # read-outs scatters by ~4% and the background measured in the
+        # annulus adds up to ~8% to the noise of the faint star
+        rates = simulation._etc_rates(opt_train)
+        assert np.allclose(flux.mean(axis=0),
+                           rates["src"] * exptime * 10**(-0.4 * np.array(mags)),
+                           rtol=0.01)
+        assert np.allclose(snr_analytic, flux.mean(axis=0) / flux.std(axis=0),
+                           rtol=0.15)
+
+
+class _FakeOpticalTrain:
+    def __init__(self):
+        self.cmds = {}
+        self.filter_name = None
+
+    def update(self, INST_FILTER_TC):
+        self.filter_name = INST_FILTER_TC
+        self.cmds["INST_FILTER_TC"] = INST_FILTER_TC
+
+
+class _FakeDetector:
+    def __init__(self):
+        self.cmds = {}
+
+    def read_out(self):
+        return self.filter_name
+
+
+class _FakeSource:
+    def apply_optical_train(self, opt_train, fpa, sub_pixel=False):
+        fpa.filter_name = opt_train.filter_name
+
+
+class TestRunFilters:
+    """Tests of function simcado.simulation.run_filters"""
+
+    def test_each_filter_gets_its_own_copies(self):
+        opt_train, fpa = _FakeOpticalTrain(), _FakeDetector()
+
+        out = run_filters(_FakeSource(), ["J", "H", "Ks"], cmds={},
+                          opt_train=opt_train, fpa=fpa, n_processes=1,
+                          return_internals=True)
+
+        assert [hdu for hdu, _ in out] == ["J", "H", "Ks"]
+        assert len(set(id(opt) for _, (_, opt, _) in out)) == 3
+        assert opt_train.filter_name is None and not hasattr(fpa,
+                                                             "filter_name")
+
+    @needs_data
+    @pytest.mark.parametrize("n_processes", [1, 2])
+    def test_headers_record_the_filter_of_each_image(self, n_processes):
+        cmds = _small_fov_cmds(INST_FILTER_TC="H", OBS_EXPTIME=60)
+        filter_before = cmds["INST_FILTER_TC"]
+        stars = source.stars(["A0V"], [18.], filter_name="Ks", x=[0], y=[0])
+
+        hdus = run_filters(stars, ["J", "Ks"], cmds=cmds, OBS_EXPTIME=30,
+                           n_processes=n_processes)
+
+        for hdu, filt in zip(hdus, ["J", "Ks"]):
+            header = hdu[0].header
+            assert header["INST_FILTER_TC"].endswith("TC_filter_" + filt +
+                                                     ".dat")
+            assert header["EXPTIME"] == 30
+        assert cmds["INST_FILTER_TC"] == filter_before
+        assert cmds["OBS_EXPTIME"] == 60
+
+    def test_one_source_per_filter_is_needed(self):
+        with pytest.raises(ValueError):
+            run_filters([_FakeSource()], ["J", "H"], cmds={},
+                        opt_train=_FakeOpticalTrain(), fpa=_FakeDetector())
+
+
+def test_sigma_clipped_stats_matches_astropy():
+    np.random.seed(42)
+    vals = np.random.normal(0, 1, (5, 200))
+    vals[:, :5] = 100
+
+    mean, median, std = _sigma_clipped_stats(vals)
+
+    for i, row in enumerate(vals):
+        ref = sigma_clipped_stats(row, sigma=3, maxiters=5)
+        assert np.allclose([mean[i], median[i], std[i]], ref)
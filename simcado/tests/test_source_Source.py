@@ -0,0 +1,128 @@
+"""Unit tests for class simcado.source.Source"""
+
+import pickle
+import time
+
+import numpy as np
+
+from simcado.source import Source, SourceBuilder, source_from_image
+
+# [B] x, y, ref and weight as float32, float32, int32 and float32. The
+# float64/int64 columns and the copies in x_orig, y_orig took 32-40 B
+BYTES_PER_SOURCE = 16
+
+# [s] a Source with 1E6 objects is built in ~0.02 s
+BUILD_TIME_BUDGET = 0.5
+
+
+def _basic_source(n, lam=None, spectra=None, **kwargs):
+    if lam is None:
+        lam = np.linspace(0.5, 2.5, 201)
+    if spectra is None:
+        spectra = np.ones((3, len(lam)))
+    x, y = np.linspace(-1, 1, n), np.linspace(1, -1, n)
+    return Source(lam=lam, spectra=spectra, x=x, y=y,
+                  ref=np.arange(n) % 3, weight=np.linspace(1, 2, n), **kwargs)
+
+
+class TestCompactColumns:
+    """Tests of the storage of the positions, references and weights"""
+
+    def test_columns_have_compact_types_and_no_copies(self):
+        n = 10**5
+        src = _basic_source(n)
+
+        assert src.x.dtype == np.float32 and src.y.dtype == np.float32
+        assert src.ref.dtype == np.int32 and src.weight.dtype == np.float32
+        assert src.x_orig is src.x and src.y_orig is src.y
+        nbytes = sum(arr.nbytes for arr in src._columns.values())
+        assert nbytes / n == BYTES_PER_SOURCE
+
+    def test_weight_type_can_be_chosen_and_assignments_are_converted(self):
+        src = _basic_source(10, weight_dtype=np.float64)
+        src.x, src.ref = [0] * 10, np.zeros(10)
+
+        assert src.weight.dtype == np.float64
+        assert src.x.dtype == np.float32 and src.ref.dtype == np.int32
+
+    def test_originals_are_kept_once_coordinates_change(self):
+        src = _basic_source(10)
+        x0 = np.copy(src.x)
+
+        src.shift(dx=1)
+        src.rotate(90)
+
+        assert np.allclose(src.x_orig, x0)
+        assert src.x.dtype == np.float32 and src.x_orig is not src.x
+        src.shift(dx=0.5, use_orig_xy=True)
+        assert np.allclose(src.x, x0 + 0.5)
+
+    def test_sources_pickled_with_plain_attributes_are_loaded(self):
+        src = _basic_source(10)
+        state = dict(src.__dict__)
+        columns = state.pop("_columns")
+        state.update({key: val.astype(float) for key, val in columns.items()})
+        state["x_orig"], state["y_orig"] = state["x"], state["y"]
+
+        new = Source.__new__(Source)
+        new.__setstate__(state)
+
+        assert new.x.dtype == np.float32 and np.allclose(new.x, src.x)
+        assert new.ref.dtype == np.int32 and np.allclose(new.x_orig, src.x)
+        assert np.allclose(pickle.loads(pickle.dumps(new)).weight, src.weight)
+
+    def test_building_a_large_catalogue_is_within_budget(self):
+        best = np.inf
+        for _ in range(3):
+            t0 = time.perf_counter()
+            _basic_source(10**6)
+            best = min(best, time.perf_counter() - t0)
+
+        assert best < BUILD_TIME_BUDGET
+
+
+class TestSourceBuilder:
+    """Tests of combining many Source objects with a SourceBuilder"""
+
+    def test_matches_adding_sources_one_by_one(self):
+        lam_1, lam_2 = np.linspace(0.5, 2.5, 201), np.linspace(0.3, 2.7, 97)
+        spec_1 = np.random.RandomState(1).uniform(1, 2, (3, len(lam_1)))
+        spec_2 = np.random.RandomState(2).uniform(1, 2, (3, len(lam_2)))
+        srcs = [_basic_source(10, lam, spec) for lam, spec in
+                [(lam_1, spec_1), (lam_2, spec_2), (lam_1, 2 * spec_1)]]
+
+        added = srcs[0] + srcs[1] + srcs[2]
+        built = SourceBuilder(srcs, merge_duplicates=False).build()
+
+        for key in ["x", "y", "ref", "weight", "spectra", "lam"]:
+            assert np.allclose(getattr(built, key), getattr(added, key))
+        assert np.allclose(added.spectra[3],
+                           np.interp(lam_1, lam_2, spec_2[0]) *
+                           spec_2[0].sum() /
+                           np.interp(lam_1, lam_2, spec_2[0]).sum())
+
+    def test_identical_spectra_are_kept_once(self):
+        builder = SourceBuilder()
+        for i in range(5):
+            builder += _basic_source(10, spectra=np.arange(1, 4)[:, None] *
+                                     np.ones((3, 201)))
+
+        src = builder.build()
+        unmerged = SourceBuilder(builder.sources,
+                                 merge_duplicates=False).build()
+
+        assert len(builder) == 5 and len(src.x) == 50
+        assert len(src.spectra) == 3 and len(unmerged.spectra) == 15
+        assert np.allclose(src.spectra[:, 0], [1, 2, 3])
+        assert np.allclose(src.photons_in_range(1, 2),
+                           unmerged.photons_in_range(1, 2))
+
+    def test_images_with_the_same_spectrum_share_it(self):
+        lam = np.linspace(0.5, 2.5, 201)
+        images = [np.eye(8), np.ones((8, 8))]
+        spectra = np.ones((2, len(lam)))
+
+        src = source_from_image(images, lam, spectra, plate_scale=0.004)
+
+        assert len(src.x) == 8 + 64 and len(src.spectra) == 1
+        assert np.all(src.ref == 0)
@@ -0,0 +1,42 @@
+"""Unit tests for class simcado.spectral.TransmissionCurve"""
+
+import numpy as np
+
+from simcado.spectral import TransmissionCurve
+
+
+class TestResample:
+    """Tests of TransmissionCurve.resample"""
+
+    def test_average_of_linear_curve_is_value_at_bin_centre(self):
+        lam = np.linspace(1, 2, 11)
+        tc = TransmissionCurve(lam=lam, val=lam - 1, use_default_lam=False)
+
+        tc.resample(np.arange(1.1, 1.91, 0.1))
+
+        assert np.allclose(tc.val, tc.lam - 1)
+
+    def test_average_matches_finely_sampled_curve(self):
+        lam = np.linspace(1, 2, 37)
+        val = np.sin(lam * 7)**2
+        tc = TransmissionCurve(lam=lam, val=val, use_default_lam=False)
+
+        tc.resample(0.01, use_edges=False)
+
+        x = np.linspace(1, 2, 100001)
+        y = np.interp(x, lam, val)
+        edges = np.append(tc.lam - 0.005, tc.lam[-1] + 0.005)
+        fine = [np.mean(y[(x >= e0) * (x < e1)])
+                for e0, e1 in zip(edges[1:-2], edges[2:-1])]
+        assert np.allclose(tc.val[1:-1], fine, rtol=1E-3)
+
+    def test_sum_conserves_total_and_zeroes_bins_outside_range(self):
+        lam = np.linspace(1, 2, 101)
+        val = np.ones(101)
+        tc = TransmissionCurve(lam=lam, val=val, use_default_lam=False)
+
+        tc.resample(np.arange(0.5, 2.5, 0.05), action="sum")
+
+        assert np.isclose(np.sum(tc.val), np.sum(val))
+        assert np.all(tc.val[tc.lam < 0.97] == 0)
+        assert np.all(tc.val[tc.lam > 2.03] == 0)
@@ -0,0 +1,31 @@
+"""Unit tests for the functions in module simcado.spectral"""
+
+import numpy as np
+from astropy import units as u
+from astropy import constants as c
+
+from simcado.spectral import _blackbody_photons
+
+
+class TestBlackbodyPhotons:
+    """Tests of function simcado.spectral._blackbody_photons"""
+
+    def test_matches_planck_formula_with_units(self):
+        lam, temp, lam_res = np.array([1., 2.2, 10.]), 0., 0.01
+        exparg = c.h * c.c / (c.k_B * (temp + 273.15) * u.K * lam * u.um)
+        intensity = 2 * c.h * c.c**2 / (lam * u.um)**5 / np.expm1(exparg.si)
+        ph = intensity * u.m**2 * lam_res * u.um * (1 * u.arcsec).to(u.rad)**2 \
+             / (c.h * c.c / (lam * u.um))
+
+        assert np.allclose(_blackbody_photons(lam, temp, lam_res),
+                           ph.to(u.rad**2 / u.s).value, rtol=1e-10)
+
+    def test_temperature_arrays_broadcast_over_wavelength(self):
+        lam, temps = np.linspace(0.5, 3, 50), np.array([-200, 0, 30])
+
+        grid = _blackbody_photons(lam, temps[:, None], 0.01)
+
+        assert grid.shape == (3, 50)
+        for temp, row in zip(temps, grid):
+            assert np.allclose(row, _blackbody_photons(lam, temp, 0.01))
+        assert np.all(np.isfinite(grid)) and np.all(np.diff(grid, axis=0) > 0)
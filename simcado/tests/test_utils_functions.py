@@ -1,5 +1,9 @@
 """Unit tests for module simcado.utils"""
 
+import os
+import json
+import time
+
 import pytest
 import numpy as np
 
@@ -8,6 +12,7 @@ from simcado.utils import parallactic_angle, deriv_polynomial2d
 from simcado.utils import find_file
 from simcado.utils import airmass2zendist
 from simcado.utils import zendist2airmass
+from simcado.utils import read_table
 
 
 class TestFindFile:
@@ -110,3 +115,86 @@ class TestDerivPolynomial2D:
 
         assert np.allclose(y_x, y_x_test)
         assert np.allclose(y_y, y_y_test)
+
+
+class TestReadTable:
+    """Tests of simcado.utils.read_table"""
+
+    @staticmethod
+    def _write(filename, text):
+        with open(filename, "w") as fp1:
+            fp1.write(text)
+
+    def test_cached_table_is_not_changed_by_caller(self, tmpdir, monkeypatch):
+        monkeypatch.setattr(sim.utils, "__sidecar_dir__", None)
+        filename = str(tmpdir.join("table.dat"))
+        self._write(filename, "lam val\n1.0 0.5\n2.0 0.7\n")
+
+        tbl = read_table(filename)
+        with pytest.raises(ValueError, match="read-only"):
+            tbl["val"][0] = 0
+        tbl["val"] = tbl["val"] * 0
+        tbl["new"] = 1
+        tbl.meta["comments"] = ["changed"]
+
+        new = read_table(filename)
+        assert np.all(new["val"] == [0.5, 0.7])
+        assert new.colnames == ["lam", "val"] and not new.meta
+
+    def test_changed_files_are_read_again(self, tmpdir, monkeypatch):
+        monkeypatch.setattr(sim.utils, "__sidecar_dir__", None)
+        filename = str(tmpdir.join("table.dat"))
+        self._write(filename, "lam val\n1.0 0.5\n")
+        read_table(filename)
+
+        self._write(filename, "lam val\n1.0 0.9\n3.0 1.0\n")
+
+        assert np.all(read_table(filename)["val"] == [0.9, 1.0])
+
+    def test_new_session_reads_sidecar(self, tmpdir, monkeypatch):
+        monkeypatch.setattr(sim.utils, "__sidecar_dir__",
+                            str(tmpdir.join("sidecars")))
+        filename = str(tmpdir.join("table.dat"))
+        self._write(filename, "# author : me\nlam val\n1.0 0.5\n")
+        tbl = read_table(filename)
+
+        monkeypatch.setattr(sim.utils, "__file_cache__", {})
+        monkeypatch.setattr(sim.utils.ioascii, "read", None)
+        tbl_sidecar = read_table(filename)
+
+        assert tbl_sidecar.colnames == tbl.colnames
+        assert np.all(tbl_sidecar["val"] == tbl["val"])
+        assert tbl_sidecar.meta == tbl.meta
+
+    def test_sidecar_columns_are_memory_mapped(self, tmpdir, monkeypatch):
+        monkeypatch.setattr(sim.utils, "__sidecar_dir__",
+                            str(tmpdir.join("sidecars")))
+        filename = str(tmpdir.join("table.dat"))
+        self._write(filename, "lam val\n1.0 0.5\n2.0 0.7\n")
+        read_table(filename)
+
+        monkeypatch.setattr(sim.utils, "__file_cache__", {})
+        tbl = read_table(filename)
+
+        array = tbl["val"]
+        while array is not None and not isinstance(array, np.memmap):
+            array = getattr(array, "base", None)
+        assert array is not None
+
+    def test_least_recently_used_sidecars_are_deleted(self, tmpdir,
+                                                      monkeypatch):
+        sidecar_dir = tmpdir.join("sidecars")
+        monkeypatch.setattr(sim.utils, "__sidecar_dir__", str(sidecar_dir))
+        # room for two sidecars of ~16 kB, but not for three
+        monkeypatch.setattr(sim.utils, "__sidecar_size__", 0.04)
+        rows = "".join("{} 1.0\n".format(i) for i in range(1000))
+        for i in range(3):
+            filename = str(tmpdir.join("table{}.dat".format(i)))
+            self._write(filename, "# n : {}\nlam val\n".format(i) + rows)
+            read_table(filename)
+            time.sleep(0.01)
+
+        assert len(sidecar_dir.listdir("*.npy")) == 2
+        metas = [json.loads(fname.read())["comments"]
+                 for fname in sidecar_dir.listdir("*.json")]
+        assert sorted(metas) == [["n : 1"], ["n : 2"]]
@@ -21,25 +21,62 @@ Helper functions for SimCADO
 #
 import os
 import sys
+import glob
 import inspect
-
-try:
-    import wget
-except ImportError:
-    print("Package wget is not available. simcado.get_extras() will not work.")
+import json
+import hashlib
+import tempfile
+import logging
+import warnings
+from copy import deepcopy
 
 import numpy as np
 from astropy import units as u
 from astropy.io import fits
 from astropy.io import ascii as ioascii
+from astropy.table import Table
+from astropy.utils.exceptions import AstropyWarning
+
+# turn off warnings - interesting for development, but not for runtime.
+# Set here as all modules that use astropy import utils
+warnings.simplefilter('ignore', category=AstropyWarning)
 
 __pkg_dir__ = os.path.dirname(inspect.getfile(inspect.currentframe()))
 
+# Parsed data files for the current session. See read_table()
+__file_cache__ = {}
+# Directory for the binary copies of parsed ASCII tables, e.g.
+# "~/.simcado/cache/tables". None (default) switches them off
+__sidecar_dir__ = None
+# [MB] The least recently used binary copies are deleted beyond this size
+__sidecar_size__ = 1000
+
 #__all__ = []
 #__all__ = ["unify", "parallactic_angle", "poissonify",
 #           "atmospheric_refraction", "nearest", "add_keyword"]
 
 
+def log_to_file(filename="simcado.log", level=logging.DEBUG):
+    """
+    Write the SimCADO log messages to a file
+
+    Importing SimCADO doesn't touch the disk, so the log is only written after
+    this has been called
+
+    Parameters
+    ----------
+    filename : str, optional
+        Default is "simcado.log". The file is overwritten
+    level : int, optional
+        Default is ``logging.DEBUG``
+
+    """
+    logging.basicConfig(filename=filename, filemode='w', level=level,
+                        format='%(asctime)s %(message)s',
+                        datefmt='%m/%d/%Y %I:%M:%S %p')
+    logging.info("SimCADO logging to " + filename)
+
+
 def msg(cmds, message, level=3):
     """
     Prints a message based on the level of verbosity given in cmds
@@ -326,6 +363,12 @@ def download_file(url, save_dir=os.path.join(__pkg_dir__, "data")):
     Download the extra data that aren't in the SimCADO package
     """
 
+    try:
+        import wget
+    except ImportError:
+        raise ImportError("Package wget is not available. "
+                          "simcado.get_extras() will not work.")
+
     local_filename = os.path.join(save_dir, url.split('/')[-1])
     try:
         temp_file = wget.download(url,
@@ -667,6 +710,185 @@ def find_file(filename, path=None, silent=False):
     return None
 
 
+def read_table(filename, **kwargs):
+    """
+    Read an ASCII table with :func:`astropy.io.ascii.read` only once
+
+    Parsed tables are kept for the rest of the session, keyed by the path and
+    the modification time of the file. The columns of the cached tables are
+    read-only and shared with every table returned for the same file.
+
+    If ``simcado.utils.__sidecar_dir__`` is set to a directory, the data of a
+    parsed file are also saved there as a binary ``.npy`` sidecar file. New
+    sessions then memory-map the sidecar instead of parsing the ASCII file
+    again. The sidecar files are switched off by default (``None``).
+
+    Parameters
+    ----------
+    filename : str
+        Path to the file. Strings that aren't paths to existing files (e.g.
+        inline tables) are passed straight on to ``ioascii.read``
+    **kwargs
+        Passed to ``ioascii.read``
+
+    Returns
+    -------
+    table : astropy.table.Table
+        A new table holding the read-only columns of the cached table. Columns
+        can be added or replaced, but copy a column before changing it in place
+
+    Examples
+    --------
+    ::
+
+        >>> from simcado.utils import read_table, find_file
+        >>> tbl = read_table(find_file("TC_filter_Ks.dat"))
+
+    """
+    if not isinstance(filename, str) or not os.path.isfile(filename):
+        return ioascii.read(filename, **kwargs)
+
+    key = _file_cache_key(filename, "ascii", **kwargs)
+    if key not in __file_cache__:
+        table = _read_table_with_sidecar(filename, key, **kwargs)
+        for col in table.itercols():
+            col.setflags(write=False)
+        __file_cache__[key] = table
+
+    table = Table(__file_cache__[key], copy=False)
+    table.meta = deepcopy(table.meta)
+
+    return table
+
+
+def read_fits_data(filename, ext=None):
+    """
+    Read the data of a FITS extension with :func:`astropy.io.fits.getdata`
+    only once
+
+    The data are kept for the rest of the session, keyed by the path and the
+    modification time of the file
+
+    Parameters
+    ----------
+    filename : str
+        Path to the FITS file
+    ext : int, str, optional
+        The extension. Default is None, i.e. the first extension with data
+
+    Returns
+    -------
+    data : np.ndarray, FITS_rec
+        A copy of the cached data, so it can be changed by the caller
+
+    """
+    key = _file_cache_key(filename, "fits", ext=ext)
+    if key not in __file_cache__:
+        if ext is None:
+            __file_cache__[key] = fits.getdata(filename)
+        else:
+            __file_cache__[key] = fits.getdata(filename, ext=ext)
+
+    return __file_cache__[key].copy()
+
+
+def _file_cache_key(filename, reader, **kwargs):
+    """Key for __file_cache__ made from the path, mtime and reader options"""
+    stat = os.stat(filename)
+    return (os.path.abspath(filename), stat.st_mtime_ns, stat.st_size,
+            reader, repr(sorted(kwargs.items())))
+
+
+def _read_table_with_sidecar(filename, key, **kwargs):
+    """
+    Read the sidecar of an ASCII table, or parse the table and write the
+    sidecar if there isn't one
+
+    The data go in a ``.npy`` file and the meta data (e.g. header comments) in
+    a ``.json`` file next to it. The columns of a table read from a sidecar
+    are memory-mapped views of the ``.npy`` file. The least recently used
+    sidecars are deleted when they take up more than ``__sidecar_size__`` [MB]
+    """
+    sidecar = None
+    if __sidecar_dir__ is not None:
+        sidecar = os.path.join(__sidecar_dir__,
+                               hashlib.sha1(repr(key).encode()).hexdigest())
+        if os.path.exists(sidecar + ".npy"):
+            try:
+                meta = None
+                if os.path.exists(sidecar + ".json"):
+                    with open(sidecar + ".json") as fp1:
+                        meta = json.load(fp1)
+                table = Table(np.load(sidecar + ".npy", mmap_mode="r"),
+                              meta=meta, copy=False)
+                # mark as recently used
+                os.utime(sidecar + ".npy")
+                return table
+            except (OSError, ValueError):
+                pass
+
+    table = ioascii.read(filename, **kwargs)
+
+    # Masked values don't survive a plain .npy file
+    if sidecar is not None and not table.has_masked_values:
+        try:
+            if not os.path.exists(__sidecar_dir__):
+                os.makedirs(__sidecar_dir__)
+            if table.meta:
+                _write_atomic(sidecar + ".json",
+                              json.dumps(table.meta).encode())
+            # the .npy file is written last, as it marks a complete sidecar
+            _write_atomic(sidecar + ".npy", table.as_array())
+        except (OSError, TypeError, ValueError):
+            pass
+        else:
+            sidecars = glob.glob(os.path.join(__sidecar_dir__, "*.npy"))
+            _evict_lru([fname[:-4] for fname in sidecars], __sidecar_size__,
+                       suffixes=(".npy", ".json"))
+
+    return table
+
+
+def _evict_lru(fnames, max_size, suffixes=("",)):
+    """
+    Delete the least recently used files until the rest take up less than
+    ``max_size`` [MB]
+
+    Each name in ``fnames`` stands for the files ``fname + suffix``, which are
+    deleted together. The time of last use is the modification time of the
+    file with the first suffix
+    """
+    def mtime(fname):
+        try:
+            return os.path.getmtime(fname + suffixes[0])
+        except OSError:
+            return 0
+
+    size = 0
+    for fname in sorted(fnames, key=mtime, reverse=True):
+        files = [fname + suffix for suffix in suffixes
+                 if os.path.exists(fname + suffix)]
+        size += sum(os.path.getsize(name) for name in files)
+        if size > max_size * 2**20:
+            for name in files:
+                try:
+                    os.remove(name)
+                except OSError:
+                    pass
+
+
+def _write_atomic(filename, data):
+    """Write bytes or an array to filename through a temporary file"""
+    fd, tmp_name = tempfile.mkstemp(dir=os.path.dirname(filename),
+                                    suffix=".tmp")
+    with os.fdopen(fd, "wb") as fp1:
+        if isinstance(data, bytes):
+            fp1.write(data)
+        else:
+            np.save(fp1, data)
+    os.replace(tmp_name, filename)
+
+
 def zendist2airmass(zendist):
     '''Convert zenith distance to airmass
 